@@ -0,0 +1,6 @@
+"""
+In-process load tests for the Ocipe API.
+
+seed builds synthetic accounts from recipes/test_data.py, scenarios lists the flows
+that get driven and runner times them. Run with `python manage.py bench_api`.
+"""
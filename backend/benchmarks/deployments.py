@@ -0,0 +1,118 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.db import close_old_connections, connections
+from django.test import AsyncClient, override_settings
+from django.urls import reverse
+
+from .runner import BenchClient, summarize
+
+# Same traffic against the two ways of serving the app: gunicorn sync workers (ocipe.wsgi,
+# ocipe.urls) and an ASGI event loop (ocipe.asgi, ocipe.urls_asgi)
+
+class SlowGeminiClient:
+    """Stands in for genai.Client, every extraction takes delay seconds, sync or async"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.models = SimpleNamespace(generate_content=self.generate_content)
+        self.aio = SimpleNamespace(models=SimpleNamespace(generate_content=self.agenerate_content))
+
+    def response(self):
+        recipe = {"name": "Bench", "meat_type": "Beef", "longevity": 2, "frequency": "weekday",
+                  "note": "", "state": "active", "ingredients": []}
+        part = SimpleNamespace(text=json.dumps(recipe))
+        return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+    def generate_content(self, model, contents, config):
+        time.sleep(self.delay)
+        return self.response()
+
+    async def agenerate_content(self, model, contents, config):
+        await asyncio.sleep(self.delay)
+        return self.response()
+
+def build_jobs(accounts, extractions, reads, rng):
+    """Extractions of never seen URLs mixed with fridge reads, each for a random account"""
+    jobs = [('extract', rng.choice(accounts)['token'], f'https://bench.invalid/recipe-{number}') for number in range(extractions)]
+    jobs += [('read', rng.choice(accounts)['token'], None) for _ in range(reads)]
+    rng.shuffle(jobs)
+    return jobs
+
+def _summaries(results, elapsed):
+    summaries = {}
+    for kind in ('extract', 'read'):
+        latencies = [latency for job_kind, latency, _ in results if job_kind == kind]
+        errors = sum(1 for job_kind, _, code in results if job_kind == kind and code >= 400)
+        summaries[kind] = summarize(latencies, [0] * len(latencies), errors, elapsed)
+    return summaries
+
+def run_sync(jobs, workers, concurrency):
+    """
+    concurrency clients against `workers` gunicorn sync workers: a request holds its worker
+    until the response is written, the others wait for a free one
+    """
+    worker_slots = threading.Semaphore(workers)
+    local = threading.local()
+
+    def send(job):
+        kind, token, url = job
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = BenchClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer ' + token)
+        started = time.perf_counter()
+        with worker_slots:
+            try:
+                if kind == 'extract':
+                    response = client.post(reverse('generate-recipe-from-url'), {'url': url}, format='json')
+                else:
+                    response = client.get(reverse('fridge-list'))
+            finally:
+                # What the end of a request does in a worker, persistent connections (CONN_MAX_AGE) stay open
+                close_old_connections()
+        return kind, time.perf_counter() - started, response.status_code
+
+    with override_settings(ROOT_URLCONF='ocipe.urls'):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(send, jobs))
+        return _summaries(results, time.perf_counter() - started)
+
+def run_async(jobs, concurrency):
+    """concurrency clients against one ASGI event loop, like a single uvicorn worker"""
+    async def run():
+        client = AsyncClient()
+        in_flight = asyncio.Semaphore(concurrency)
+
+        async def send(job):
+            kind, token, url = job
+            headers = {'Authorization': 'Bearer ' + token}
+            async with in_flight:
+                started = time.perf_counter()
+                # What ASGIHandler does per request: its sync work gets its own thread
+                async with ThreadSensitiveContext():
+                    try:
+                        if kind == 'extract':
+                            response = await client.post(
+                                reverse('generate-recipe-from-url'), {'url': url},
+                                content_type='application/json', headers=headers, secure=True,
+                            )
+                        else:
+                            response = await client.get(reverse('fridge-list'), headers=headers, secure=True)
+                    finally:
+                        # The request's thread goes away, and its connections with it
+                        await sync_to_async(connections.close_all)()
+                return kind, time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*[send(job) for job in jobs])
+        return _summaries(results, time.perf_counter() - started)
+
+    with override_settings(ROOT_URLCONF='ocipe.urls_asgi'):
+        return asyncio.run(run())
@@ -0,0 +1,82 @@
+import time
+
+from rest_framework.test import APIClient
+
+from monitoring.middleware import QueryRecorder, RequestMetricsMiddleware
+
+class BenchClient(APIClient):
+    # Production traffic is HTTPS, so it never gets SECURE_SSL_REDIRECT's 301
+    def generic(self, *args, **kwargs):
+        kwargs.setdefault('secure', True)
+        return super().generic(*args, **kwargs)
+
+def percentile(values, fraction):
+    """Nearest rank percentile of already sorted values"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, round(fraction * len(values)) - 1))]
+
+def summarize(latencies, queries, errors, elapsed):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        "requests": count,
+        "errors": errors,
+        "requests_per_second": count / elapsed if elapsed else None,
+        "p50_ms": percentile(latencies, 0.50) * 1000 if count else None,
+        "p95_ms": percentile(latencies, 0.95) * 1000 if count else None,
+        "p99_ms": percentile(latencies, 0.99) * 1000 if count else None,
+        "mean_ms": sum(latencies) / count * 1000 if count else None,
+        "queries_per_request": sum(queries) / count if count else None,
+    }
+
+def run_scenario(scenario, accounts, requests, rng, warmup=0):
+    """Send warmup + requests requests, each for a random account, and summarize the timed ones"""
+    client = BenchClient()
+    latencies = []
+    queries = []
+    errors = 0
+    started = time.perf_counter()
+    for number in range(warmup + requests):
+        if number == warmup:
+            started = time.perf_counter()
+        account = rng.choice(accounts)
+        client.credentials(HTTP_AUTHORIZATION='Bearer ' + account['token'])
+        recorder = QueryRecorder()
+        wrapped = RequestMetricsMiddleware.install(recorder)
+        request_started = time.perf_counter()
+        try:
+            response = scenario(client, account, rng)
+        finally:
+            RequestMetricsMiddleware.uninstall(wrapped)
+        latency = time.perf_counter() - request_started
+        if number < warmup:
+            continue
+        latencies.append(latency)
+        queries.append(recorder.count)
+        if response.status_code >= 400:
+            errors += 1
+    return summarize(latencies, queries, errors, time.perf_counter() - started)
+
+# Summary fields compared against a baseline, all lower is better
+LATENCY_FIELDS = ('p50_ms', 'p95_ms', 'p99_ms')
+
+def compare(results, baseline, latency_threshold=0.25, query_threshold=0.0):
+    """
+    Regressions of results against a baseline run, as messages. Latency may grow by
+    latency_threshold (a fraction) and queries per request by query_threshold.
+    """
+    regressions = []
+    for name, summary in results['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if before is None:
+            continue
+        for field in LATENCY_FIELDS:
+            if before.get(field) and summary[field] > before[field] * (1 + latency_threshold):
+                regressions.append(f"{name} {field}: {before[field]:.1f} -> {summary[field]:.1f}")
+        if before.get('queries_per_request') is not None and \
+                summary['queries_per_request'] > before['queries_per_request'] * (1 + query_threshold):
+            regressions.append(
+                f"{name} queries_per_request: {before['queries_per_request']:.1f} -> {summary['queries_per_request']:.1f}"
+            )
+    return regressions
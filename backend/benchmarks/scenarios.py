@@ -0,0 +1,37 @@
+from django.urls import reverse
+
+from .seed import PANTRY
+
+# Each scenario sends one request for an account dict from seed.seed_accounts
+
+def list_recipes(client, account, rng):
+    return client.get(reverse('recipe-view-create-destroy'))
+
+def ingredient_search(client, account, rng):
+    return client.get(reverse('recipe-view-create-destroy'), {'ingredients': ','.join(rng.sample(PANTRY, 3))})
+
+def recipe_stats(client, account, rng):
+    return client.get(reverse('get-recipe-nerd-stats'))
+
+def grocery_aggregation(client, account, rng):
+    recipe_ids = rng.sample(account['recipe_ids'], min(5, len(account['recipe_ids'])))
+    return client.get(reverse('grocery-ingredient-preview'), {'recipe_ids': ','.join(map(str, recipe_ids))})
+
+def fridge_read(client, account, rng):
+    return client.get(reverse('fridge-list'))
+
+def grocery_toggle(client, account, rng):
+    item_id = rng.choice(account['grocery_item_ids'])
+    return client.patch(
+        reverse('grocery-list-item-update-delete', args=[item_id]),
+        {'isChecked': rng.random() < 0.5}, format='json',
+    )
+
+SCENARIOS = {
+    'list_recipes': list_recipes,
+    'ingredient_search': ingredient_search,
+    'recipe_stats': recipe_stats,
+    'grocery_aggregation': grocery_aggregation,
+    'fridge_read': fridge_read,
+    'grocery_toggle': grocery_toggle,
+}
@@ -0,0 +1,75 @@
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from rest_framework_simplejwt.tokens import AccessToken
+
+from recipes.bulk import create_recipes
+from recipes.test_data import recipes as SAMPLE_RECIPES
+from fridge.models import Fridge, FridgeIngredient
+from grocery.models import GroceryList, GroceryListItem, History
+
+# The sample ingredients plus common ones, enough for 20 distinct per recipe
+PANTRY = sorted({ingredient['name'] for recipe in SAMPLE_RECIPES for ingredient in recipe['ingredients']} | {
+    'garlic', 'ginger', 'shallot', 'fish sauce', 'oyster sauce', 'rice', 'rice noodles', 'pork belly',
+    'beef brisket', 'tofu', 'bok choy', 'carrot', 'potato', 'onion', 'chili', 'lime', 'coriander',
+    'basil', 'lemongrass', 'coconut milk', 'star anise', 'cinnamon', 'pepper', 'salt', 'butter',
+    'milk', 'flour', 'tomato', 'cucumber', 'bean sprouts', 'shiitake', 'sesame oil', 'vinegar',
+})
+QUANTITIES = ['200g', '500g', '1kg', '1 tbsp', '2 tbsp', '1 tsp', '1/2 cup', '1', '2', '4', 'a pinch', '']
+GROUPS = ['meat', 'vegetables', 'sauce', 'dairy', 'pantry']
+STATES = ['active', 'active', 'active', 'used']
+
+def generate_recipe(rng, number):
+    """A sample recipe renamed, with 5 to 20 ingredients drawn from PANTRY"""
+    base = rng.choice(SAMPLE_RECIPES)
+    return dict(
+        base,
+        name=f"{base['name']} {number}",
+        state=rng.choice(STATES),
+        ingredients=[
+            {"name": name, "quantity": rng.choice(QUANTITIES)}
+            for name in rng.sample(PANTRY, rng.randint(5, 20))
+        ],
+    )
+
+def seed_accounts(users=1000, recipes_per_user=20, fridge_size=15, grocery_size=10, seed=0, prefix='bench'):
+    """
+    Create users with recipes, a filled fridge, a grocery list and some history.
+    Returns one dict per user with what the scenarios need to address its data.
+    """
+    rng = random.Random(seed)
+    # Hashing once: make_password per user would dominate seeding
+    password = make_password('bench')
+    created = User.objects.bulk_create([User(username=f"{prefix}{i}", password=password) for i in range(users)])
+    fridges = Fridge.objects.bulk_create([Fridge(user=user) for user in created])
+    grocery_lists = GroceryList.objects.bulk_create([GroceryList(user=user) for user in created])
+
+    accounts = []
+    fridge_rows = []
+    grocery_rows = []
+    history_rows = []
+    for user, fridge, grocery_list in zip(created, fridges, grocery_lists):
+        recipes = create_recipes(user.id, [generate_recipe(rng, number) for number in range(recipes_per_user)])
+        ingredients = list({ri.ingredient_id: ri.ingredient for recipe in recipes for ri in recipe.recipeingredient_set.all()}.values())
+        fridge_rows += [
+            FridgeIngredient(fridge=fridge, ingredient=ingredient, group=rng.choice(GROUPS))
+            for ingredient in rng.sample(ingredients, min(fridge_size, len(ingredients)))
+        ]
+        items = [GroceryListItem(grocery=grocery_list, item=rng.choice(PANTRY), isChecked=rng.random() < 0.3) for _ in range(grocery_size)]
+        grocery_rows += items
+        recipe_ids = [recipe.id for recipe in recipes]
+        history_rows.append(History(user=user, recipes=rng.sample(recipe_ids, min(3, len(recipe_ids)))))
+        accounts.append({
+            "user": user,
+            "token": str(AccessToken.for_user(user)),
+            "recipe_ids": recipe_ids,
+            "grocery_items": items,
+        })
+
+    FridgeIngredient.objects.bulk_create(fridge_rows, batch_size=1000)
+    GroceryListItem.objects.bulk_create(grocery_rows, batch_size=1000)
+    History.objects.bulk_create(history_rows, batch_size=1000)
+    for account in accounts:
+        account['grocery_item_ids'] = [item.id for item in account.pop('grocery_items')]
+    return accounts
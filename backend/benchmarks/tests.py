@@ -0,0 +1,33 @@
+import random
+from django.test import SimpleTestCase, TestCase
+from .runner import percentile, run_scenario, compare
+from .scenarios import SCENARIOS
+from .seed import seed_accounts, generate_recipe
+
+class BenchmarkReportTests(SimpleTestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(50, percentile(values, 0.50))
+        self.assertEqual(95, percentile(values, 0.95))
+        self.assertEqual(100, percentile(values, 1.0))
+        self.assertEqual(7, percentile([7], 0.99))
+
+    def test_compare_flags_regressions_past_threshold(self):
+        baseline = {'scenarios': {'fridge_read': {'p50_ms': 2.0, 'p95_ms': 4.0, 'p99_ms': 8.0, 'queries_per_request': 2.0}}}
+        results = {'scenarios': {'fridge_read': {'p50_ms': 2.4, 'p95_ms': 5.1, 'p99_ms': 8.0, 'queries_per_request': 3.0}}}
+        self.assertEqual(
+            ['fridge_read p95_ms: 4.0 -> 5.1', 'fridge_read queries_per_request: 2.0 -> 3.0'],
+            compare(results, baseline, latency_threshold=0.25),
+        )
+        self.assertEqual([], compare(results, baseline, latency_threshold=0.5, query_threshold=0.5))
+
+class BenchmarkScenarioTests(TestCase):
+    def test_every_scenario_runs_against_seeded_accounts(self):
+        accounts = seed_accounts(users=2, recipes_per_user=3, fridge_size=3, grocery_size=3)
+        rng = random.Random(0)
+        self.assertTrue(all(5 <= len(generate_recipe(rng, i)['ingredients']) <= 20 for i in range(50)))
+        for name, scenario in SCENARIOS.items():
+            summary = run_scenario(scenario, accounts, requests=3, rng=random.Random(0))
+            self.assertEqual(0, summary['errors'], name)
+            self.assertEqual(3, summary['requests'])
+            self.assertGreater(summary['queries_per_request'], 0)
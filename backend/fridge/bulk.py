@@ -0,0 +1,65 @@
+from django.db import transaction
+
+from recipes.bulk import resolve_ingredients
+from ocipe.cache import bump_version
+from sync.changes import record_changes
+from sync.models import FRIDGE_INGREDIENT
+from .models import Fridge, FridgeIngredient
+
+ADD = 'add'
+MOVE = 'move'
+DELETE = 'delete'
+
+@transaction.atomic
+def apply_fridge_operations(user_id, operations):
+    """
+    Apply validated add/move/delete operations in a fixed number of queries.
+    Returns one result per operation, in order.
+    """
+    fridge = Fridge.objects.get(user_id=user_id)
+    ingredient_map = resolve_ingredients(user_id, [op['name'] for op in operations if op['op'] == ADD])
+    existing = {
+        fi.id: fi
+        for fi in FridgeIngredient.objects.filter(
+            fridge=fridge, id__in=[op['id'] for op in operations if op['op'] != ADD]
+        )
+    }
+
+    results = []
+    added = []
+    moved = {}
+    deleted = set()
+    for op in operations:
+        if op['op'] == ADD:
+            fridge_ingredient = FridgeIngredient(fridge=fridge, ingredient=ingredient_map[op['name']], group=op['group'])
+            added.append(fridge_ingredient)
+            results.append({"op": ADD, "status": "ok", "item": fridge_ingredient})
+            continue
+
+        fridge_ingredient = existing.get(op['id'])
+        if fridge_ingredient is None or op['id'] in deleted:
+            results.append({"op": op['op'], "id": op['id'], "status": "error", "error": "Not found."})
+        elif op['op'] == MOVE:
+            fridge_ingredient.group = op['group']
+            moved[fridge_ingredient.id] = fridge_ingredient
+            results.append({"op": MOVE, "id": op['id'], "status": "ok"})
+        else:
+            deleted.add(op['id'])
+            moved.pop(op['id'], None)
+            results.append({"op": DELETE, "id": op['id'], "status": "ok"})
+
+    FridgeIngredient.objects.bulk_create(added)
+    FridgeIngredient.objects.bulk_update(moved.values(), ['group'])
+    if deleted:
+        FridgeIngredient.objects.filter(fridge=fridge, id__in=deleted).delete()
+    record_changes(
+        user_id, FRIDGE_INGREDIENT,
+        upserts=[fi.id for fi in added] + list(moved), deletes=deleted,
+    )
+    bump_version('fridge', user_id)
+
+    for result in results:
+        item = result.pop('item', None)
+        if item is not None:
+            result['id'] = item.id
+    return results
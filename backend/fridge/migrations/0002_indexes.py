@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fridge', '0001_initial'),
+        ('recipes', '0006_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fridgeingredient',
+            index=models.Index(fields=['fridge', 'group'], name='fridgeingr_fridge_group'),
+        ),
+    ]
@@ -10,4 +10,9 @@ class Fridge(models.Model):
 class FridgeIngredient(models.Model):
     fridge = models.ForeignKey(Fridge, on_delete=models.CASCADE)
     ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE)
-    group = models.CharField(max_length=30)
\ No newline at end of file
+    group = models.CharField(max_length=30)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["fridge", "group"], name="fridgeingr_fridge_group"),
+        ]
\ No newline at end of file
@@ -1,6 +1,10 @@
 from rest_framework import serializers
+from django.db import transaction
 from .models import Fridge, FridgeIngredient, Ingredient
-from collections import OrderedDict
+from .snapshot import fridge_snapshot
+from ocipe.cache import bump_version
+from sync.changes import record_changes
+from sync.models import FRIDGE_INGREDIENT
 
 class FridgeSerializer(serializers.ModelSerializer):
     ingredient_list = serializers.SerializerMethodField(read_only=True)
@@ -11,21 +15,8 @@ class FridgeSerializer(serializers.ModelSerializer):
         read_only_fields = ['user']
 
     def get_ingredient_list(self, obj):
-        # Get all FridgeIngredient objects for this fridge
-        fridge_ingredients = FridgeIngredient.objects.filter(fridge=obj).order_by('-group', 'id')
-        # Serialize as a list of dicts by group
-        grouped = OrderedDict()
-        for fi in fridge_ingredients:
-            group = fi.group
-            if group not in grouped:
-                grouped[group] = []
-            grouped[group].append(
-                {
-                    "id": fi.id,
-                    "name": fi.ingredient.name,
-                }
-            )
-        return grouped
+        # Cached grouped snapshot, see fridge.snapshot
+        return fridge_snapshot(obj.user_id)
     
 class FridgeIngredientSerializer(serializers.ModelSerializer):
     name = serializers.CharField(write_only=True)
@@ -36,26 +27,46 @@ class FridgeIngredientSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'group']
 
     def create(self, validated_data):
-        user = self.context['request'].user
+        user_id = self.context['request'].user.id
         name = validated_data['name']
         group = validated_data['group']
 
-        # user fridge
-        fridge = Fridge.objects.get(user=user)
-        # Ingredient
-        ingredient, _ = Ingredient.objects.get_or_create(name=name, user=user)
+        with transaction.atomic():
+            # user fridge
+            fridge = Fridge.objects.get(user_id=user_id)
+            # Ingredient
+            ingredient, _ = Ingredient.objects.get_or_create(name=name, user_id=user_id)
 
-        return FridgeIngredient.objects.create(
-            fridge=fridge, ingredient=ingredient, group=group
-        )
+            fridge_ingredient = FridgeIngredient.objects.create(
+                fridge=fridge, ingredient=ingredient, group=group
+            )
+            record_changes(user_id, FRIDGE_INGREDIENT, upserts=[fridge_ingredient.id])
+            bump_version('fridge', user_id)
+        return fridge_ingredient
     
     def update(self, instance, validated_data):
-        user = self.context['request'].user
+        user_id = self.context['request'].user.id
         name = validated_data.get('name', instance.ingredient.name)
         group = validated_data.get('group', instance.group)
-        # Get or create the ingredient
-        ingredient, _ = Ingredient.objects.get_or_create(name=name, user=user)
-        instance.ingredient = ingredient
-        instance.group = group
-        instance.save()
-        return instance
\ No newline at end of file
+        with transaction.atomic():
+            # Get or create the ingredient
+            ingredient, _ = Ingredient.objects.get_or_create(name=name, user_id=user_id)
+            instance.ingredient = ingredient
+            instance.group = group
+            instance.save()
+            record_changes(user_id, FRIDGE_INGREDIENT, upserts=[instance.id])
+            bump_version('fridge', user_id)
+        return instance
+
+class FridgeOperationSerializer(serializers.Serializer):
+    op = serializers.ChoiceField(choices=['add', 'move', 'delete'])
+    id = serializers.IntegerField(required=False)
+    name = serializers.CharField(required=False, max_length=50)
+    group = serializers.CharField(required=False, max_length=30)
+
+    def validate(self, data):
+        required = {'add': ['name', 'group'], 'move': ['id', 'group'], 'delete': ['id']}[data['op']]
+        missing = {field: "This field is required." for field in required if field not in data}
+        if missing:
+            raise serializers.ValidationError(missing)
+        return data
@@ -0,0 +1,48 @@
+from django.core.cache import cache
+from ocipe.cache import versioned_key, aversioned_key
+from ocipe.routers import primary_reads
+from .models import FridgeIngredient
+
+SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
+def _snapshot_rows(user_id):
+    # Grouped fridge view in one query, groups ordered like the original '-group', 'id'
+    return FridgeIngredient.objects.filter(
+        fridge__user_id=user_id
+    ).order_by('-group', 'id').values_list('id', 'group', 'ingredient__name')
+
+def _group(rows):
+    grouped = {}
+    for id, group, name in rows:
+        grouped.setdefault(group, []).append(
+            {
+                "id": id,
+                "name": name,
+            }
+        )
+    return grouped
+
+def build_fridge_snapshot(user_id):
+    return _group(_snapshot_rows(user_id))
+
+def fridge_snapshot(user_id):
+    """Grouped fridge contents, cached until a fridge write bumps the user's fridge version"""
+    key = versioned_key('fridge', user_id, 'snapshot')
+    snapshot = cache.get(key)
+    if snapshot is None:
+        with primary_reads():
+            snapshot = build_fridge_snapshot(user_id)
+        cache.set(key, snapshot, SNAPSHOT_TIMEOUT)
+    return snapshot
+
+async def afridge_snapshot(user_id):
+    key = await aversioned_key('fridge', user_id, 'snapshot')
+    snapshot = await cache.aget(key)
+    if snapshot is None:
+        with primary_reads():
+            snapshot = _group([row async for row in _snapshot_rows(user_id)])
+        await cache.aset(key, snapshot, SNAPSHOT_TIMEOUT)
+    return snapshot
+
+def fridge_ingredient_names(user_id):
+    return {item['name'] for items in fridge_snapshot(user_id).values() for item in items}
@@ -1,11 +1,16 @@
-from ocipe.tests import AuthenticatedAPITestCase
+from ocipe.tests import AuthenticatedAPITestCase, QueryBudgetTestCase
 from rest_framework.test import APIClient
 from django.urls import reverse
 from rest_framework import status
 from .models import FridgeIngredient
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import override_settings
+from asgiref.sync import async_to_sync
 
 class FridgeTests(AuthenticatedAPITestCase):
     def setUp(self):
+        super().setUp()
         self.token = self.register_and_authenticate()
         self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.token)
         self.unauthenticated_user = APIClient()
@@ -77,6 +82,70 @@ class FridgeTests(AuthenticatedAPITestCase):
         self.assertEqual(2, len(meat_group))
 
 
+    def test_view_all_ingredients_conditional(self):
+        url = reverse('create-fridge-ingredient')
+        response = self.client.post(url, {'name': 'Beef', 'group': 'meat'})
+        list_url = reverse('fridge-list')
+        etag = self.client.get(list_url)['ETag']
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, self.client.get(list_url, HTTP_IF_NONE_MATCH=etag).status_code)
+
+        update_url = reverse('update-delete-fridge-ingredient', args=[response.data['id']])
+        self.client.put(update_url, {'name': 'Beef', 'group': 'frozen'})
+        response = self.client.get(list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('frozen', response.data['ingredient_list'])
+
+    def test_view_all_ingredients_from_snapshot(self):
+        url = reverse('create-fridge-ingredient')
+        self.client.post(url, {'name': 'Beef', 'group': 'meat'})
+        list_url = reverse('fridge-list')
+        self.client.get(list_url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(list_url)
+        self.assertEqual(['Beef'], [i['name'] for i in response.data['ingredient_list']['meat']])
+        self.assertFalse([q for q in queries if 'fridge_' in q['sql']])
+
+        # Group writes invalidate the snapshot
+        self.client.put(reverse('update-fridge-ingredient-group', args=['meat']), {'new_group': 'frozen'})
+        response = self.client.get(list_url)
+        self.assertEqual(['frozen'], list(response.data['ingredient_list']))
+        self.client.delete(reverse('update-fridge-ingredient-group', args=['frozen']))
+        response = self.client.get(list_url)
+        self.assertEqual({}, response.data['ingredient_list'])
+
+    def test_bulk_fridge_operations(self):
+        url = reverse('create-fridge-ingredient')
+        beef = self.client.post(url, {'name': 'Beef', 'group': 'meat'}).data['id']
+        fish_sauce = self.client.post(url, {'name': 'Fish sauce', 'group': 'sauce'}).data['id']
+
+        bulk_url = reverse('bulk-fridge-ingredient')
+        operations = [
+            {'op': 'add', 'name': 'Beef', 'group': 'frozen'},
+            {'op': 'add', 'name': 'Sugar', 'group': 'condiment'},
+            {'op': 'move', 'id': beef, 'group': 'frozen'},
+            {'op': 'delete', 'id': fish_sauce},
+            {'op': 'delete', 'id': 999999},
+            {'op': 'move', 'id': beef},
+        ]
+        with CaptureQueriesContext(connection) as few:
+            response = self.client.post(bulk_url, {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual(['ok', 'ok', 'ok', 'ok', 'error', 'error'], [r['status'] for r in results])
+        self.assertIn('group', results[5]['error'])
+
+        ingre_list = self.client.get(reverse('fridge-list')).data['ingredient_list']
+        self.assertEqual(['frozen', 'condiment'], list(ingre_list))
+        self.assertEqual([beef, results[0]['id']], [i['id'] for i in ingre_list['frozen']])
+        self.assertFalse(FridgeIngredient.objects.filter(id=fish_sauce).exists())
+
+        # Query count does not grow with the number of operations
+        many = [{'op': 'add', 'name': f'Spice {i}', 'group': 'spices'} for i in range(20)]
+        many += [{'op': 'move', 'id': beef, 'group': 'meat'}, {'op': 'delete', 'id': results[1]['id']}]
+        with CaptureQueriesContext(connection) as lots:
+            self.client.post(bulk_url, {'operations': many}, format='json')
+        self.assertEqual(len(few), len(lots))
+
     def test_update_a_ingredient_by_id(self):
         url = reverse('create-fridge-ingredient')
 
@@ -155,3 +224,62 @@ class FridgeTests(AuthenticatedAPITestCase):
         self.assertTrue(
             FridgeIngredient.objects.filter(id=ids[2]).exists()
         )
+
+
+    @override_settings(ROOT_URLCONF='ocipe.urls_asgi')
+    def test_async_fridge_list(self):
+        url = reverse('fridge-list')
+        headers = {'Authorization': 'Bearer ' + self.token}
+        for data in [{'name': 'Chicken thighs', 'group': 'meat'}, {'name': 'Fish sauce', 'group': 'sauce'}]:
+            self.client.post(reverse('create-fridge-ingredient'), data)
+        with self.settings(ROOT_URLCONF='ocipe.urls'):
+            expected = self.client.get(url)
+
+        response = async_to_sync(self.async_client.get)(url, headers=headers)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(expected.data, response.json())
+        self.assertEqual(expected['ETag'], response['ETag'])
+
+        # Writes still bump the version the async read is keyed by
+        self.client.post(reverse('create-fridge-ingredient'), {'name': 'Beef', 'group': 'meat'})
+        response = async_to_sync(self.async_client.get)(url, headers={**headers, 'If-None-Match': expected['ETag']})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(['Chicken thighs', 'Beef'], [i['name'] for i in response.json()['ingredient_list']['meat']])
+        self.assertEqual(status.HTTP_401_UNAUTHORIZED, async_to_sync(self.async_client.get)(url).status_code)
+
+
+class FridgeQueryBudgetTests(QueryBudgetTestCase):
+    urlconf = 'fridge.urls'
+
+    def test_every_route_has_a_budget(self):
+        self.assertEveryRouteBudgeted()
+
+    def test_budget_fridge_list(self):
+        url = reverse('fridge-list')
+        self.assertConstantQueries(lambda account: self.client.get(url))
+
+    def test_budget_create_fridge_ingredient(self):
+        url = reverse('create-fridge-ingredient')
+        self.assertConstantQueries(lambda account: self.client.post(url, {'name': 'Chicken', 'group': 'meat'}))
+
+    def test_budget_bulk_fridge_ingredient(self):
+        url = reverse('bulk-fridge-ingredient')
+        self.assertConstantQueries(lambda account: self.client.post(url, {'operations': [
+            {'op': 'add', 'name': 'lemongrass', 'group': 'herbs'},
+            {'op': 'add', 'name': 'egg', 'group': 'dairy'},
+            {'op': 'move', 'id': account.fridge_ingredient_ids[0], 'group': 'herbs'},
+            {'op': 'delete', 'id': account.fridge_ingredient_ids[1]},
+        ]}, format='json'))
+
+    def test_budget_update_delete_fridge_ingredient(self):
+        url = lambda account: reverse('update-delete-fridge-ingredient', args=[account.fridge_ingredient_ids[0]])
+        self.assertConstantQueries(lambda account: self.client.get(url(account)))
+        self.assertConstantQueries(lambda account: self.client.put(url(account), {'name': 'Beef', 'group': 'meat'}))
+        self.assertConstantQueries(lambda account: self.client.patch(url(account), {'group': 'sauce'}))
+        self.assertConstantQueries(lambda account: self.client.delete(url(account)))
+
+    def test_budget_update_fridge_ingredient_group(self):
+        url = reverse('update-fridge-ingredient-group', args=['meat'])
+        self.assertConstantQueries(lambda account: self.client.put(url, {'new_group': 'protein'}))
+        url = reverse('update-fridge-ingredient-group', args=['sauce'])
+        self.assertConstantQueries(lambda account: self.client.delete(url))
@@ -4,6 +4,7 @@ from . import views
 urlpatterns = [
     path('', views.FridgeList.as_view(), name="fridge-list"),
     path('ingredient/', views.FridgeIngredientCreate.as_view(), name='create-fridge-ingredient'),
+    path('ingredient/bulk/', views.FridgeIngredientBulk.as_view(), name='bulk-fridge-ingredient'),
     path('ingredient/<int:id>/', views.FridgeIngredientUpdateDestroy.as_view(), name='update-delete-fridge-ingredient'),
     path('ingredient/group/<str:group_name>', views.FridgeGroupUpdate.as_view(), name='update-fridge-ingredient-group')
 ]
\ No newline at end of file
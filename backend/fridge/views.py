@@ -1,16 +1,32 @@
-from rest_framework import generics, permissions
+from rest_framework import generics, permissions, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from django.db import transaction
 
-from .serializers import FridgeSerializer, FridgeIngredientSerializer
+from .serializers import FridgeSerializer, FridgeIngredientSerializer, FridgeOperationSerializer
+from .bulk import apply_fridge_operations
 from .models import Fridge, FridgeIngredient
+from ocipe.cache import bump_version, conditional_get, async_conditional_get
+from ocipe.asyncviews import AsyncAPIView
+from django.http import JsonResponse
+from sync.changes import record_changes
+from sync.models import FRIDGE_INGREDIENT
+from .snapshot import fridge_snapshot, afridge_snapshot
 
 class FridgeList(generics.RetrieveAPIView):
     serializer_class = FridgeSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        return Fridge.objects.get(user=self.request.user)
+        return Fridge.objects.get(user_id=self.request.user.id)
+
+    @conditional_get('fridge')
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        # The snapshot is keyed by user, so a cache hit needs no Fridge lookup
+        return Response({"ingredient_list": fridge_snapshot(request.user.id)})
     
 
 # GET, UPDATE, DELETE
@@ -20,7 +36,13 @@ class FridgeIngredientUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
     lookup_field = "id"
 
     def get_queryset(self):
-        return FridgeIngredient.objects.filter(fridge__user=self.request.user)
+        return FridgeIngredient.objects.filter(fridge__user_id=self.request.user.id)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            record_changes(self.request.user.id, FRIDGE_INGREDIENT, deletes=[instance.id])
+            instance.delete()
+            bump_version('fridge', self.request.user.id)
     
 # POST
 class FridgeIngredientCreate(generics.CreateAPIView):
@@ -28,7 +50,37 @@ class FridgeIngredientCreate(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return FridgeIngredient.objects.filter(fridge__user=self.request.user)
+        return FridgeIngredient.objects.filter(fridge__user_id=self.request.user.id)
+    
+# POST many add/move/delete operations in one transaction
+class FridgeIngredientBulk(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    max_operations = 500
+
+    def post(self, request):
+        operations = request.data.get('operations')
+        if not operations:
+            return Response({"error": "Missing operations in request body"}, status=status.HTTP_400_BAD_REQUEST)
+        elif not isinstance(operations, list) or len(operations) > self.max_operations:
+            return Response(
+                {"detail": f"Expected a list of at most {self.max_operations} operations."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Invalid operations are reported in place, the valid ones are applied
+        results = [None] * len(operations)
+        valid = []
+        for index, operation in enumerate(operations):
+            serializer = FridgeOperationSerializer(data=operation)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                results[index] = {"status": "error", "error": serializer.errors}
+
+        applied = apply_fridge_operations(request.user.id, [data for _, data in valid])
+        for (index, _), result in zip(valid, applied):
+            results[index] = result
+        return Response({"results": results}, status=status.HTTP_200_OK)
     
 # UPDATE group
 class FridgeGroupUpdate(APIView):
@@ -39,14 +91,31 @@ class FridgeGroupUpdate(APIView):
         if not new_group:
             return Response({"error": "new_group is required"}, status=400)
         # Rename group
-        FridgeIngredient.objects.filter(fridge__user=self.request.user, group=group_name).update(group=new_group)
+        with transaction.atomic():
+            ids = list(FridgeIngredient.objects.filter(fridge__user_id=self.request.user.id, group=group_name).values_list('id', flat=True))
+            FridgeIngredient.objects.filter(id__in=ids).update(group=new_group)
+            record_changes(request.user.id, FRIDGE_INGREDIENT, upserts=ids)
+            bump_version('fridge', request.user.id)
 
         return Response(status=200)
     
     def delete(self, request, group_name):
-        FridgeIngredient.objects.filter(
-            fridge__user=self.request.user,
-            group=group_name
-        ).delete()
+        with transaction.atomic():
+            ids = list(FridgeIngredient.objects.filter(
+                fridge__user_id=self.request.user.id,
+                group=group_name
+            ).values_list('id', flat=True))
+            FridgeIngredient.objects.filter(id__in=ids).delete()
+            record_changes(request.user.id, FRIDGE_INGREDIENT, deletes=ids)
+            bump_version('fridge', request.user.id)
+
+        return Response(status=200)
+
+
+# ASGI mode (ocipe/urls_asgi.py): same body as FridgeList, from the async cache and ORM
+class AsyncFridgeList(AsyncAPIView):
+    sync_view = FridgeList
 
-        return Response(status=200)
\ No newline at end of file
+    @async_conditional_get('fridge')
+    async def get(self, request):
+        return JsonResponse({"ingredient_list": await afridge_snapshot(request.user.id)})
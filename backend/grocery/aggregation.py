@@ -0,0 +1,178 @@
+import re
+from collections import Counter
+from functools import lru_cache
+from fractions import Fraction
+
+from django.db.models import Case, IntegerField, Min, Sum, Value, When
+
+from recipes.models import RecipeIngredient
+from fridge.snapshot import fridge_ingredient_names
+
+# unit -> (family, factor to the family's base unit)
+UNITS = {
+    'mg': ('g', Fraction(1, 1000)),
+    'g': ('g', 1), 'gr': ('g', 1), 'gram': ('g', 1), 'grams': ('g', 1),
+    'kg': ('g', 1000), 'kgs': ('g', 1000), 'kilogram': ('g', 1000), 'kilograms': ('g', 1000),
+    'ml': ('ml', 1), 'millilitre': ('ml', 1), 'milliliter': ('ml', 1),
+    'l': ('ml', 1000), 'litre': ('ml', 1000), 'liter': ('ml', 1000), 'litres': ('ml', 1000), 'liters': ('ml', 1000),
+    'tsp': ('tsp', 1), 'teaspoon': ('tsp', 1), 'teaspoons': ('tsp', 1),
+    'tbsp': ('tsp', 3), 'tbs': ('tsp', 3), 'tablespoon': ('tsp', 3), 'tablespoons': ('tsp', 3),
+    'cup': ('tsp', 48), 'cups': ('tsp', 48),
+    '': ('count', 1), 'x': ('count', 1), 'pc': ('count', 1), 'pcs': ('count', 1),
+    'piece': ('count', 1), 'pieces': ('count', 1),
+}
+
+UNICODE_FRACTIONS = {'½': '1/2', '¼': '1/4', '¾': '3/4', '⅓': '1/3', '⅔': '2/3'}
+
+QUANTITY_RE = re.compile(
+    r'^(?:(?P<whole>\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:[.,]\d+)?)(?:\s+(?P<num>\d+)/(?P<den>\d+))?|(?P<fnum>\d+)\s*/\s*(?P<fden>\d+))'
+    r'\s*(?P<unit>[^\W\d_]+)?\.?$'
+)
+
+# '1,000' and '1,000.5' group thousands, '1,5' is a decimal comma
+THOUSANDS_RE = re.compile(r'^\d{1,3}(?:,\d{3})+(?:\.\d+)?$')
+
+def _decimal(text):
+    if THOUSANDS_RE.match(text):
+        return Fraction(text.replace(',', ''))
+    return Fraction(text.replace(',', '.'))
+
+# Recipes reuse a small set of quantity strings, so parse each one once
+@lru_cache(maxsize=4096)
+def parse_quantity(text):
+    """'200g' -> (200, 'g'), '1 1/2 tbsp' -> (9/2, 'tsp'), None when it isn't a plain amount"""
+    text = text.strip().lower()
+    for symbol, fraction in UNICODE_FRACTIONS.items():
+        text = text.replace(symbol, f' {fraction}')
+    match = QUANTITY_RE.match(text.strip())
+    if not match:
+        return None
+    if match['whole']:
+        amount = _decimal(match['whole'])
+        # Mixed number, '1 1/2'
+        num, den = match['num'], match['den']
+    else:
+        amount = Fraction(0)
+        num, den = match['fnum'], match['fden']
+    if num:
+        if int(den) == 0:
+            return None
+        amount += Fraction(int(num), int(den))
+    unit = match['unit'] or ''
+    family, factor = UNITS.get(unit, (unit, 1))
+    amount *= factor
+    # Whole amounts, most of them, are summed as ints: Fraction arithmetic is much slower
+    return (amount.numerator if amount.denominator == 1 else amount), family
+
+def _number(amount):
+    if amount.denominator == 1:
+        return str(amount.numerator)
+    return f"{float(amount):.2f}".rstrip('0').rstrip('.')
+
+def _ratio(amount, divisor):
+    # Stays an int when it divides evenly, like the amounts themselves
+    if isinstance(amount, int) and amount % divisor == 0:
+        return amount // divisor
+    return Fraction(amount, divisor)
+
+def format_amount(amount, family):
+    if family == 'g':
+        return f"{_number(_ratio(amount, 1000))}kg" if amount >= 1000 else f"{_number(amount)}g"
+    if family == 'ml':
+        return f"{_number(_ratio(amount, 1000))}l" if amount >= 1000 else f"{_number(amount)}ml"
+    if family == 'tsp':
+        cups = _ratio(amount, 48)
+        if cups >= 1 and cups.denominator in (1, 2, 4):
+            return f"{_number(cups)} cup"
+        tbsp = _ratio(amount, 3)
+        if tbsp >= 1 and tbsp.denominator in (1, 2):
+            return f"{_number(tbsp)} tbsp"
+        return f"{_number(amount)} tsp"
+    if family == 'count':
+        return _number(amount)
+    return f"{_number(amount)} {family}"
+
+
+class QuantityTotal:
+    """Running total for one ingredient: numeric sums per unit family, unparseable text kept with its count"""
+
+    def __init__(self):
+        self.amounts = {}
+        self.texts = Counter()
+        # Dict as an ordered set of (kind, key)
+        self.order = {}
+
+    def add(self, quantity, times=1):
+        quantity = (quantity or '').strip()
+        if not quantity:
+            return
+        parsed = parse_quantity(quantity)
+        if parsed is None:
+            key = ('text', quantity)
+            self.texts[quantity] += times
+        else:
+            amount, family = parsed
+            key = ('amount', family)
+            self.amounts[family] = self.amounts.get(family, 0) + amount * times
+        self.order[key] = None
+
+    def format(self):
+        parts = []
+        for kind, value in self.order:
+            if kind == 'amount':
+                parts.append(format_amount(self.amounts[value], value))
+            elif self.texts[value] == 1:
+                parts.append(value)
+            else:
+                parts.append(f"{self.texts[value]} x {value}")
+        return " + ".join(parts)
+
+
+def aggregate_quantities(rows):
+    """rows: (name, quantity, times) with each distinct pair once, in order of first appearance"""
+    totals = {}
+    for name, quantity, times in rows:
+        total = totals.get(name)
+        if total is None:
+            total = totals[name] = QuantityTotal()
+        total.add(quantity, times)
+    return {name: total.format() for name, total in totals.items()}
+
+def quantity_rows(user_id, recipe_counts):
+    """One grouped query: each (name, quantity) pair of the picked recipes with how many times it is needed"""
+    by_count = {}
+    for recipe_id, count in recipe_counts.items():
+        by_count.setdefault(count, []).append(recipe_id)
+    # A recipe picked n times counts its rows n times, most selections have a single n
+    times = Sum(Case(
+        *[When(recipe_id__in=ids, then=Value(count)) for count, ids in by_count.items()],
+        default=Value(0),
+        output_field=IntegerField()
+    ))
+    # Owned through the recipe, so the plan starts from the picked ids rather than every ingredient of the user
+    return RecipeIngredient.objects.filter(
+        recipe__id__in=recipe_counts.keys(),
+        recipe__user_id=user_id
+    ).values('ingredient__name', 'quantity').annotate(
+        times=times, first=Min('id')
+    ).order_by('first').values_list('ingredient__name', 'quantity', 'times')
+
+def build_grocery_list(user_id, recipe_ids):
+    """Split the aggregated ingredients of the picked recipes into what to buy and what is already in the fridge"""
+    quantities = aggregate_quantities(quantity_rows(user_id, Counter(recipe_ids)))
+
+    # Read from the cached fridge snapshot
+    in_fridge = fridge_ingredient_names(user_id)
+
+    grocery_list = []
+    others = []
+    for name, quantity in quantities.items():
+        item = {
+            "name": name,
+            "quantity": quantity
+        }
+        if name not in in_fridge:
+            grocery_list.append(item)
+        else:
+            others.append(item)
+    return grocery_list, others
@@ -0,0 +1,48 @@
+from django.db import transaction
+
+from recipes.bulk import resolve_ingredients
+from fridge.models import Fridge, FridgeIngredient
+from ocipe.cache import bump_version
+from sync.changes import record_changes
+from sync.models import FRIDGE_INGREDIENT, GROCERY_LIST_ITEM
+from .models import GroceryListItem
+
+@transaction.atomic
+def checkout_grocery_list(user_id, group):
+    """
+    Move every checked grocery list item into the fridge under group.
+    A fixed number of queries whatever the length of the list.
+    """
+    # Registration creates the fridge, users made another way (admin, shell) may have none
+    fridge, _ = Fridge.objects.get_or_create(user_id=user_id)
+    checked = list(
+        GroceryListItem.objects.select_for_update().filter(
+            grocery__user_id=user_id, isChecked=True
+        ).order_by('id').values_list('id', 'item')
+    )
+    if not checked:
+        return {"moved": [], "skipped": []}
+
+    # Same item twice on the list ends up once in the fridge
+    names = list(dict.fromkeys(item.strip() for _, item in checked if item.strip()))
+    ingredient_map = resolve_ingredients(user_id, names)
+    in_fridge = set(
+        FridgeIngredient.objects.filter(
+            fridge=fridge, ingredient__in=ingredient_map.values()
+        ).values_list('ingredient_id', flat=True)
+    )
+
+    moved = [name for name in names if ingredient_map[name].id not in in_fridge]
+    skipped = [name for name in names if ingredient_map[name].id in in_fridge]
+    added = FridgeIngredient.objects.bulk_create([
+        FridgeIngredient(fridge=fridge, ingredient=ingredient_map[name], group=group)
+        for name in moved
+    ])
+    checked_ids = [id for id, _ in checked]
+    GroceryListItem.objects.filter(id__in=checked_ids).delete()
+    record_changes(user_id, FRIDGE_INGREDIENT, upserts=[fi.id for fi in added])
+    record_changes(user_id, GROCERY_LIST_ITEM, deletes=checked_ids)
+
+    bump_version('fridge', user_id)
+    bump_version('grocery_list', user_id)
+    return {"moved": moved, "skipped": skipped}
@@ -0,0 +1,90 @@
+import random
+import time
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from grocery.aggregation import aggregate_quantities, quantity_rows
+from recipes.models import Recipe, Ingredient, RecipeIngredient
+
+QUANTITIES = ['200g', '1kg', '2 tbsp', '1 tsp', '4', '1/2 cup', '1 large', 'a pinch', '']
+
+
+def legacy_aggregate(user_id, recipe_counts):
+    # The row per ingredient query and string concatenation GroceryIngredientRetrieve used before grocery.aggregation
+    rows = RecipeIngredient.objects.filter(
+        recipe__id__in=recipe_counts.keys(),
+        ingredient__user_id=user_id
+    ).order_by('id').values_list('recipe_id', 'ingredient__name', 'quantity')
+    quantities = {}
+    for recipe_id, name, quantity in rows:
+        for _ in range(recipe_counts[recipe_id]):
+            if name not in quantities:
+                quantities[name] = quantity
+            elif quantity:
+                quantities[name] += " + " + quantity
+    return quantities
+
+def grouped_aggregate(user_id, recipe_counts):
+    return aggregate_quantities(quantity_rows(user_id, recipe_counts))
+
+
+class Command(BaseCommand):
+    help = "Benchmark grocery aggregation on a large synthetic recipe selection, seeded into a throwaway test database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=500)
+        parser.add_argument('--ingredients', type=int, default=15, help="Ingredients per recipe")
+        parser.add_argument('--names', type=int, default=300, help="Distinct ingredient names")
+        parser.add_argument('--repeat', type=int, default=4, help="Times each recipe is picked")
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        # Never seeds the configured database, only its test_ copy
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def seed(self, options):
+        rng = random.Random(options['seed'])
+        user = User.objects.create(username='bench')
+        ingredients = Ingredient.objects.bulk_create([
+            Ingredient(user=user, name=f"ingredient {number}") for number in range(options['names'])
+        ])
+        recipes = Recipe.objects.bulk_create([
+            Recipe(user=user, name=f"recipe {number}", meat_type='none', longevity=1, frequency='weekly', state='active')
+            for number in range(options['recipes'])
+        ])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, quantity=rng.choice(QUANTITIES))
+            for recipe in recipes
+            for ingredient in rng.sample(ingredients, min(options['ingredients'], len(ingredients)))
+        ], batch_size=1000)
+        return user.id, Counter({recipe.id: options['repeat'] for recipe in recipes})
+
+    def run(self, options):
+        user_id, recipe_counts = self.seed(options)
+        self.stdout.write(
+            f"{options['recipes'] * options['ingredients']} rows, "
+            f"{options['recipes']} recipes picked {options['repeat']}x each"
+        )
+        for label, aggregate in [('aggregation', grouped_aggregate), ('legacy concat', legacy_aggregate)]:
+            timings = []
+            for _ in range(options['runs']):
+                started = time.perf_counter()
+                result = aggregate(user_id, recipe_counts)
+                timings.append(time.perf_counter() - started)
+            longest = max(len(quantity) for quantity in result.values())
+            self.stdout.write(
+                f"{label:>14}: best {min(timings) * 1000:.1f}ms, "
+                f"median {sorted(timings)[len(timings) // 2] * 1000:.1f}ms, longest quantity {longest} chars"
+            )
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grocery', '0002_grocerylist_grocerylistitem'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='grocerylistitem',
+            index=models.Index(fields=['grocery', '-id'], name='grocerylistitem_grocery_id'),
+        ),
+        migrations.AddIndex(
+            model_name='history',
+            index=models.Index(fields=['user', '-created_at'], name='history_user_created_at'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grocery', '0003_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='grocerylistitem',
+            name='grocerylistitem_grocery_id',
+        ),
+        migrations.CreateModel(
+            name='AppliedGroceryBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('device', models.CharField(blank=True, max_length=64)),
+                ('seq', models.BigIntegerField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'device', 'seq'), name='appliedgrocerybatch_user_device_seq')],
+            },
+        ),
+        migrations.AddField(
+            model_name='grocerylistitem',
+            name='position',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='grocerylistitem',
+            index=models.Index(fields=['grocery', 'position', '-id'], name='grocerylistitem_position'),
+        ),
+    ]
@@ -7,11 +7,35 @@ class History(models.Model):
     recipes = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-created_at"], name="history_user_created_at"),
+        ]
+
 
 class GroceryList(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
 
+class AppliedGroceryBatch(models.Model):
+    # (device, seq) of each batch GroceryListBatchUpdate applied, a retried batch finds its row.
+    # Per user rather than per list, so clearing the list doesn't let old batches replay
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    device = models.CharField(max_length=64, blank=True)
+    seq = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "device", "seq"], name="appliedgrocerybatch_user_device_seq"),
+        ]
+
 class GroceryListItem(models.Model):
     grocery = models.ForeignKey(GroceryList, on_delete=models.CASCADE, related_name="items")
     item = models.CharField(max_length=50)
     isChecked = models.BooleanField(default=False)
+    # 0 until the user reorders the list, new items then stay on top
+    position = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["grocery", "position", "-id"], name="grocerylistitem_position"),
+        ]
@@ -17,3 +17,17 @@ class GroceryListSerializer(serializers.ModelSerializer):
     class Meta:
         model = GroceryList
         fields = ['id', 'items']
+
+
+class GroceryListItemChangeSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    isChecked = serializers.BooleanField()
+
+class GroceryListBatchSerializer(serializers.Serializer):
+    # Client-side operation sequence number of the device, makes retried batches idempotent
+    seq = serializers.IntegerField(min_value=1, required=False)
+    device = serializers.CharField(max_length=64, required=False, allow_blank=True, default='')
+    changes = GroceryListItemChangeSerializer(many=True, required=False, default=list)
+    delete = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    # Item ids in their new display order
+    order = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
@@ -1,12 +1,25 @@
-from ocipe.tests import AuthenticatedAPITestCase
+from ocipe.tests import AuthenticatedAPITestCase, QueryBudgetTestCase, ReplicaTestCase
+from ocipe import routers
 from rest_framework.test import APIClient
 from django.urls import reverse
 from rest_framework import status
 from recipes.test_data import recipes
-from recipes.models import Recipe
+from recipes.models import Recipe, Ingredient, RecipeIngredient
+from fridge.models import Fridge
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from asgiref.sync import async_to_sync
+import json
+from fractions import Fraction
+from .models import History, GroceryListItem
+from .aggregation import parse_quantity, QuantityTotal, aggregate_quantities
 
 class GroceryTests(AuthenticatedAPITestCase):
     def setUp(self):
+        super().setUp()
         self.token = self.register_and_authenticate()
         self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.token)
         self.unauthenticated_user = APIClient()
@@ -48,6 +61,166 @@ class GroceryTests(AuthenticatedAPITestCase):
         used = Recipe.objects.filter(user__username=self.username, state='used')
         self.assertEqual(len(used), 2)
 
+    def test_get_grocery_list_sums_repeated_recipes(self):
+        url = reverse('grocery-ingredient-retrieve')
+        response = self.client.post(url, {'recipe_ids': [self.ids[0]] * 4 + [self.ids[2]]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        quantities = {i['name']: i['quantity'] for i in response.data['grocery_list'] + response.data['others']}
+        self.assertEqual('800g', quantities['minced pork'])
+        self.assertEqual('17', quantities['egg'])
+        self.assertEqual('8 tbsp', quantities['bot canh'])
+
+    def test_get_grocery_list_query_count(self):
+        url = reverse('grocery-ingredient-retrieve')
+        # Warm the fridge contents cache
+        self.client.post(url, {'recipe_ids': [self.ids[1]]}, format='json')
+        with CaptureQueriesContext(connection) as one_recipe:
+            self.client.post(url, {'recipe_ids': [self.ids[1]]}, format='json')
+        with CaptureQueriesContext(connection) as three_recipes:
+            self.client.post(url, {'recipe_ids': self.ids * 3}, format='json')
+        self.assertEqual(len(one_recipe), len(three_recipes))
+
+    def test_preview_grocery_list_does_not_write(self):
+        url = reverse('grocery-ingredient-preview')
+        response = self.client.get(url, {'recipe_ids': f'{self.ids[2]},{self.ids[2]}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        g_list = {i['name']: i['quantity'] for i in response.data['grocery_list']}
+        self.assertEqual('4 tbsp', g_list['mirin'])
+        self.assertFalse(History.objects.filter(user__username=self.username).exists())
+        self.assertFalse(Recipe.objects.filter(user__username=self.username, state='used').exists())
+
+        # Fridge contents are cached until the fridge changes
+        self.client.post(reverse('create-fridge-ingredient'), {'name': 'mirin', 'group': 'sauce'})
+        response = self.client.get(url, {'recipe_ids': str(self.ids[2])})
+        self.assertIn('mirin', [i['name'] for i in response.data['others']])
+
+        response = self.client.get(url, {'recipe_ids': 'a,b'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_commit_grocery_plan(self):
+        url = reverse('grocery-plan-commit')
+        response = self.client.post(url, {'recipe_ids': self.chosen_id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.chosen_id, response.data['recipes'])
+        self.assertEqual(1, History.objects.filter(user__username=self.username).count())
+        self.assertEqual(2, Recipe.objects.filter(user__username=self.username, state='used').count())
+
+    def test_grocery_list_conditional(self):
+        url = reverse('grocery-list')
+        self.client.post(url, {'items': 'milk\nbread'})
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code)
+
+        item_id = GroceryListItem.objects.get(item='milk').id
+        self.client.patch(reverse('grocery-list-item-update-delete', args=[item_id]), {'isChecked': True})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue([i for i in response.data if i['item'] == 'milk'][0]['isChecked'])
+
+    @override_settings(ROOT_URLCONF='ocipe.urls_asgi')
+    def test_async_grocery_list(self):
+        url = reverse('grocery-list')
+        headers = {'Authorization': 'Bearer ' + self.token}
+        # Writes on the async route go through GroceryListRetrieveCreate
+        self.client.post(url, {'items': 'milk\nbread'})
+        with self.settings(ROOT_URLCONF='ocipe.urls'):
+            expected = self.client.get(url)
+
+        response = async_to_sync(self.async_client.get)(url, headers=headers)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(['bread', 'milk'], [i['item'] for i in response.json()])
+        self.assertEqual(json.loads(json.dumps(expected.data)), response.json())
+        response = async_to_sync(self.async_client.get)(url, headers={**headers, 'If-None-Match': response['ETag']})
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+
+    def test_grocery_list_batch_update(self):
+        url = reverse('grocery-list')
+        self.client.post(url, {'items': 'milk\nbread\neggs\nrice'})
+        ids = {i.item: i.id for i in GroceryListItem.objects.all()}
+
+        batch_url = reverse('grocery-list-batch-update')
+        batch = {
+            'seq': 1,
+            'changes': [{'id': ids['milk'], 'isChecked': True}, {'id': ids['bread'], 'isChecked': True}],
+            'delete': [ids['eggs']],
+            'order': [ids['milk'], ids['rice'], ids['bread']],
+        }
+        response = self.client.post(batch_url, batch, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['applied'])
+        self.assertEqual(1, response.data['deleted'])
+        self.client.post(url, {'items': 'salt'})
+
+        items = self.client.get(url).data
+        self.assertEqual(['salt', 'milk', 'rice', 'bread'], [i['item'] for i in items])
+        self.assertEqual([False, True, False, True], [i['isChecked'] for i in items])
+
+        # Retrying the same batch does nothing
+        GroceryListItem.objects.filter(id=ids['milk']).update(isChecked=False)
+        response = self.client.post(batch_url, batch, format='json')
+        self.assertFalse(response.data['applied'])
+        self.assertFalse(GroceryListItem.objects.get(id=ids['milk']).isChecked)
+
+        response = self.client.post(batch_url, {'changes': [{'id': ids['milk']}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_grocery_list_batch_update_per_device(self):
+        url = reverse('grocery-list')
+        batch_url = reverse('grocery-list-batch-update')
+        self.client.post(url, {'items': 'milk\nbread'})
+        ids = {i.item: i.id for i in GroceryListItem.objects.all()}
+
+        phone = {'device': 'phone', 'seq': 5, 'changes': [{'id': ids['milk'], 'isChecked': True}]}
+        self.assertTrue(self.client.post(batch_url, phone, format='json').data['applied'])
+        # Another device's lower seq is its own batch, not a retry
+        tablet = {'device': 'tablet', 'seq': 1, 'changes': [{'id': ids['bread'], 'isChecked': True}]}
+        self.assertTrue(self.client.post(batch_url, tablet, format='json').data['applied'])
+        self.assertTrue(GroceryListItem.objects.get(id=ids['bread']).isChecked)
+
+        # Clearing the list keeps the applied batches, a late retry stays a no-op
+        self.client.delete(url)
+        self.client.post(url, {'items': 'rice'})
+        rice = GroceryListItem.objects.get(item='rice')
+        replay = dict(tablet, delete=[rice.id])
+        self.assertFalse(self.client.post(batch_url, replay, format='json').data['applied'])
+        self.assertTrue(GroceryListItem.objects.filter(id=rice.id).exists())
+
+    def test_grocery_list_checkout(self):
+        url = reverse('grocery-list')
+        self.client.post(url, {'items': 'mirin\negg\nmirin\nbread\nrice'})
+        GroceryListItem.objects.filter(item__in=['mirin', 'egg', 'rice']).update(isChecked=True)
+
+        checkout_url = reverse('grocery-list-checkout')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(checkout_url, {'group': 'pantry'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(['mirin', 'rice'], response.data['moved'])
+        # egg was already in the fridge
+        self.assertEqual(['egg'], response.data['skipped'])
+        self.assertEqual(['bread'], [i['item'] for i in self.client.get(url).data])
+        pantry = self.client.get(reverse('fridge-list')).data['ingredient_list']['pantry']
+        self.assertEqual(['mirin', 'rice'], [i['name'] for i in pantry])
+
+        # Longer list, same number of queries
+        self.client.post(url, {'items': '\n'.join(f'item {i}' for i in range(30)) + '\nsugar'})
+        GroceryListItem.objects.update(isChecked=True)
+        with CaptureQueriesContext(connection) as more_queries:
+            self.client.post(checkout_url, {'group': 'pantry'})
+        self.assertEqual(len(queries), len(more_queries))
+        self.assertFalse(GroceryListItem.objects.filter(isChecked=True).exists())
+
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, self.client.post(checkout_url, {}).status_code)
+
+    def test_grocery_list_checkout_without_fridge(self):
+        url = reverse('grocery-list')
+        self.client.post(url, {'items': 'mirin'})
+        GroceryListItem.objects.update(isChecked=True)
+        Fridge.objects.filter(user__username=self.username).delete()
+
+        response = self.client.post(reverse('grocery-list-checkout'), {'group': 'pantry'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(['mirin'], response.data['moved'])
+
     def test_get_grocery_history(self):
         url = reverse('grocery-ingredient-retrieve')
         datas = [
@@ -69,3 +242,126 @@ class GroceryTests(AuthenticatedAPITestCase):
         most_recent = response.data[0]['recipes']
         self.assertIn(str(self.ids[1]), most_recent)
         self.assertIn('Chicken thighs', most_recent[f"{self.ids[1]}"])
+
+
+class GroceryReplicaTests(ReplicaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.token = self.register_and_authenticate()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.token)
+        self.ids = [self.client.post(reverse('recipe-view-create-destroy'), recipe, format='json').data['id'] for recipe in recipes]
+        self.replicate(User, Ingredient, Recipe, RecipeIngredient)
+        self.user_id = User.objects.get(username=self.username).id
+        cache.delete(routers._pin_key(self.user_id))
+
+    def test_grocery_plan_stays_on_primary(self):
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            response = self.client.post(reverse('grocery-ingredient-retrieve'), {'recipe_ids': self.ids[:2]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(0, len(replica_queries))
+        self.assertEqual(1, History.objects.using('default').count())
+        self.assertEqual(0, History.objects.using('replica').count())
+
+        # The recipes it marked used are read back from the primary
+        self.assertTrue(routers.is_pinned(self.user_id))
+        response = self.client.get(reverse('recipe-view-create-destroy'))
+        self.assertEqual(2, len([recipe for recipe in response.data if recipe['state'] == 'used']))
+
+    def test_preview_reads_replica(self):
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            response = self.client.get(reverse('grocery-ingredient-preview'), {'recipe_ids': ','.join(map(str, self.ids[:2]))})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreater(len(replica_queries), 0)
+
+
+class QuantityAggregationTests(SimpleTestCase):
+    def test_parse_quantity(self):
+        self.assertEqual((200, 'g'), parse_quantity('200g'))
+        self.assertEqual((1500, 'g'), parse_quantity('1.5 kg'))
+        self.assertEqual((1500, 'g'), parse_quantity('1,5 kg'))
+        self.assertEqual((1000, 'g'), parse_quantity('1,000g'))
+        self.assertEqual((1250500, 'ml'), parse_quantity('1,250.5 l'))
+        self.assertEqual((6, 'tsp'), parse_quantity('2tbsp'))
+        self.assertEqual((Fraction(1, 2), 'tsp'), parse_quantity('1/2 tsp'))
+        self.assertEqual((72, 'tsp'), parse_quantity('1 1/2 cups'))
+        self.assertEqual((4, 'count'), parse_quantity('4'))
+        self.assertEqual((1, 'large'), parse_quantity('1 large'))
+        self.assertIsNone(parse_quantity('a pinch'))
+        self.assertIsNone(parse_quantity('2-3'))
+
+    def test_quantity_total_normalizes_units(self):
+        total = QuantityTotal()
+        for quantity in ['600g', '200g', '0.2kg', '1 tbsp', '1 tsp', '2 tsp']:
+            total.add(quantity)
+        self.assertEqual('1kg + 2 tbsp', total.format())
+
+    def test_quantity_total_keeps_text_with_multiplicity(self):
+        total = QuantityTotal()
+        total.add('a pinch', 3)
+        total.add('1 large', 2)
+        total.add('')
+        self.assertEqual('3 x a pinch + 2 large', total.format())
+
+    def test_aggregate_quantities(self):
+        rows = [('egg', '2', 2), ('egg', '1', 3), ('salt', '', 2), ('soy sauce', '2 tbsp', 3)]
+        self.assertEqual(
+            {'egg': '7', 'salt': '', 'soy sauce': '6 tbsp'},
+            aggregate_quantities(rows)
+        )
+
+
+class GroceryQueryBudgetTests(QueryBudgetTestCase):
+    urlconf = 'grocery.urls'
+
+    def test_every_route_has_a_budget(self):
+        self.assertEveryRouteBudgeted()
+
+    def test_budget_grocery_ingredient_retrieve(self):
+        url = reverse('grocery-ingredient-retrieve')
+        self.assertConstantQueries(lambda account: self.client.post(url, {'recipe_ids': account.recipe_ids[:3]}, format='json'))
+
+    def test_budget_grocery_ingredient_preview(self):
+        url = reverse('grocery-ingredient-preview')
+        self.assertConstantQueries(lambda account: self.client.get(
+            url, {'recipe_ids': ','.join(str(id) for id in account.recipe_ids[:3] * 2)}
+        ))
+
+    def test_budget_grocery_plan_commit(self):
+        url = reverse('grocery-plan-commit')
+        self.assertConstantQueries(lambda account: self.client.post(url, {'recipe_ids': account.recipe_ids[:3]}, format='json'))
+
+    def test_budget_recipe_history_list(self):
+        url = reverse('recipe-history-list')
+        self.assertConstantQueries(lambda account: self.client.get(url))
+        self.assertConstantQueries(lambda account: self.client.delete(url))
+
+    def test_budget_recent_history_list(self):
+        url = reverse('recent-history-list')
+        self.assertConstantQueries(lambda account: self.client.get(url))
+
+    def test_budget_grocery_list(self):
+        url = reverse('grocery-list')
+        self.assertConstantQueries(lambda account: self.client.get(url))
+        self.assertConstantQueries(lambda account: self.client.post(url, {'items': 'milk'}))
+        self.assertConstantQueries(lambda account: self.client.post(url, {'items': 'milk\nbread\neggs'}))
+        self.assertConstantQueries(lambda account: self.client.delete(url))
+
+    def test_budget_grocery_list_batch_update(self):
+        url = reverse('grocery-list-batch-update')
+        self.assertConstantQueries(lambda account: self.client.post(url, {
+            'seq': 1,
+            'changes': [{'id': id, 'isChecked': True} for id in account.grocery_item_ids[:3]],
+            'delete': account.grocery_item_ids[3:5],
+            'order': account.grocery_item_ids[5:8],
+        }, format='json'))
+
+    def test_budget_grocery_list_checkout(self):
+        url = reverse('grocery-list-checkout')
+        self.assertConstantQueries(lambda account: self.client.post(url, {'group': 'pantry'}))
+
+    def test_budget_grocery_list_item_update_delete(self):
+        url = lambda account: reverse('grocery-list-item-update-delete', args=[account.grocery_item_ids[0]])
+        self.assertConstantQueries(lambda account: self.client.get(url(account)))
+        self.assertConstantQueries(lambda account: self.client.put(url(account), {'item': 'oat milk', 'isChecked': True}))
+        self.assertConstantQueries(lambda account: self.client.patch(url(account), {'isChecked': False}))
+        self.assertConstantQueries(lambda account: self.client.delete(url(account)))
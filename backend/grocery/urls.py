@@ -4,8 +4,12 @@ from . import views
 urlpatterns = [
     # All recipes
     path('', views.GroceryIngredientRetrieve.as_view(), name="grocery-ingredient-retrieve"),
+    path('preview/', views.GroceryIngredientPreview.as_view(), name="grocery-ingredient-preview"),
+    path('commit/', views.GroceryPlanCommit.as_view(), name="grocery-plan-commit"),
     path('history/', views.HistoryList.as_view(), name="recipe-history-list"),
     path('history/recent/', views.MostRecentHistoryList.as_view(), name="recent-history-list"),
     path('list/', views.GroceryListRetrieveCreate.as_view(), name="grocery-list"),
+    path('list/batch/', views.GroceryListBatchUpdate.as_view(), name="grocery-list-batch-update"),
+    path('list/checkout/', views.GroceryListCheckout.as_view(), name="grocery-list-checkout"),
     path('list/<int:id>/', views.GroceryListItemUpdateDestroy.as_view(), name="grocery-list-item-update-delete"),
 ]
\ No newline at end of file
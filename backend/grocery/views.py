@@ -1,12 +1,36 @@
 from rest_framework.views import APIView
 from rest_framework import status, generics, permissions
 from rest_framework.response import Response
+from django.db import transaction
 
-from recipes.models import Recipe, RecipeIngredient, Ingredient
-from fridge.models import Fridge, FridgeIngredient
-from .models import GroceryListItem, History, GroceryList
-from .serializers import HistorySerializer, GroceryListSerializer, GroceryListItemSerializer
-from collections import Counter
+from recipes.models import Recipe
+from .models import GroceryListItem, History, GroceryList, AppliedGroceryBatch
+from .serializers import HistorySerializer, GroceryListSerializer, GroceryListItemSerializer, GroceryListBatchSerializer
+from .aggregation import build_grocery_list
+from .checkout import checkout_grocery_list
+from ocipe.cache import bump_version, conditional_get, async_conditional_get
+from ocipe.asyncviews import AsyncAPIView
+from django.http import JsonResponse
+from sync.changes import record_changes
+from sync.models import RECIPE, GROCERY_LIST_ITEM, HISTORY
+
+def commit_grocery_plan(user_id, recipe_ids):
+    # History row and state flip land together or not at all
+    with transaction.atomic():
+        # Save recipes to history
+        history = History.objects.create(user_id=user_id, recipes=recipe_ids)
+        # Update those recipe state to 'used'
+        used_ids = list(Recipe.objects.filter(user_id=user_id, id__in=recipe_ids).values_list('id', flat=True))
+        Recipe.objects.filter(id__in=used_ids).update(state='used')
+        record_changes(user_id, HISTORY, upserts=[history.id])
+        record_changes(user_id, RECIPE, upserts=used_ids)
+        bump_version('recipes', user_id)
+    return history
+
+def invalid_recipe_ids(recipe_ids):
+    return not isinstance(recipe_ids, list) or not recipe_ids or not all(
+        isinstance(recipe_id, int) and not isinstance(recipe_id, bool) for recipe_id in recipe_ids
+    )
 
 class GroceryIngredientRetrieve(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -18,55 +42,30 @@ class GroceryIngredientRetrieve(APIView):
         if not isinstance(recipe_ids, list) or not recipe_ids:
             return Response({'error': 'recipe_ids must be a non-empty list.'}, status=status.HTTP_400_BAD_REQUEST)
         
-        user = self.request.user
-        fridge = Fridge.objects.get(user=user)  
+        user_id = self.request.user.id
+        groceryList, others = build_grocery_list(user_id, recipe_ids)
+        commit_grocery_plan(user_id, recipe_ids)
         
-
-        # All ingredients needed for given recipeIds
-        recipeIngredients = RecipeIngredient.objects.filter(
-            recipe__id__in=recipe_ids,
-            ingredient__user=user
+        return Response(
+            {
+             'grocery_list': groceryList,
+             'others': others
+            }
         )
 
-        # Count to allow repeated recipe has x times its ingredients
-        recipe_ids_counts = Counter(recipe_ids)
-        # Aggregated the quantity from multiple recipes    
-        ingredients_quantities = {}
-        for ri in recipeIngredients:
-            name = ri.ingredient.name
-            quantity = ri.quantity
-            repeat_count = recipe_ids_counts[ri.recipe_id]
-            for _ in range(repeat_count):
-                if name not in ingredients_quantities:
-                    ingredients_quantities[name] = quantity
-                elif quantity:
-                    ingredients_quantities[name] += " + " + quantity
-
-        # Fridge ingredients
-        fridgeIngredients = FridgeIngredient.objects.filter(fridge=fridge)
-        fridgeIngredientSet = set(fi.ingredient.name for fi in fridgeIngredients)
-
-        # Grocery list
-        groceryList = []
-        others = []
-
-        for name, agg_quantity in ingredients_quantities.items():
-            item = {
-                "name": name,
-                "quantity": agg_quantity
-            }
-            if name not in fridgeIngredientSet:
-                groceryList.append(item) 
-            else:
-                others.append(item)
-            
+# GET ?recipe_ids=1,2,2 — aggregation only, nothing is written
+class GroceryIngredientPreview(APIView):
+    permission_classes = [permissions.IsAuthenticated]
 
-        # Save recipes to history
-        History.objects.create(user=user, recipes=recipe_ids)
+    def get(self, request):
+        try:
+            recipe_ids = [int(recipe_id) for recipe_id in request.query_params.get('recipe_ids', '').split(',') if recipe_id.strip()]
+        except ValueError:
+            recipe_ids = None
+        if invalid_recipe_ids(recipe_ids):
+            return Response({'error': 'recipe_ids must be a comma separated list of ids.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Update those recipe state to 'used'
-        Recipe.objects.filter(id__in=recipe_ids).update(state='used')
-        
+        groceryList, others = build_grocery_list(request.user.id, recipe_ids)
         return Response(
             {
              'grocery_list': groceryList,
@@ -74,23 +73,38 @@ class GroceryIngredientRetrieve(APIView):
             }
         )
 
+# POST the picked recipes: saves history and marks them used
+class GroceryPlanCommit(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        recipe_ids = request.data.get('recipe_ids', [])
+        if invalid_recipe_ids(recipe_ids):
+            return Response({'error': 'recipe_ids must be a non-empty list.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        history = commit_grocery_plan(request.user.id, recipe_ids)
+        return Response(HistorySerializer(history).data, status=status.HTTP_201_CREATED)
+
 class MostRecentHistoryList(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class =  HistorySerializer
 
     def get_queryset(self):
-        return History.objects.filter(user=self.request.user).order_by('-created_at')[:1]
+        return History.objects.filter(user_id=self.request.user.id).order_by('-created_at')[:1]
         
 class HistoryList(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class =  HistorySerializer
 
     def get_queryset(self):
-        return History.objects.filter(user=self.request.user).order_by('-created_at')
+        return History.objects.filter(user_id=self.request.user.id).order_by('-created_at')
 
     # DELETE
     def delete(self, request, *args, **kwargs):
-        History.objects.filter(user=request.user).delete()
+        with transaction.atomic():
+            ids = list(History.objects.filter(user_id=request.user.id).values_list('id', flat=True))
+            History.objects.filter(id__in=ids).delete()
+            record_changes(request.user.id, HISTORY, deletes=ids)
         return Response(status=status.HTTP_204_NO_CONTENT)
     
 
@@ -101,14 +115,15 @@ class GroceryListView(generics.ListAPIView):
     serializer_class = GroceryListSerializer
 
     def get_queryset(self):
-        return GroceryList.objects.filter(user=self.request.user)
+        return GroceryList.objects.filter(user_id=self.request.user.id)
     
 class GroceryListRetrieveCreate(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
+    @conditional_get('grocery_list')
     def get(self, request):
-        grocery_list, _ = GroceryList.objects.get_or_create(user=self.request.user)
-        items = grocery_list.items.order_by("-id")
+        grocery_list, _ = GroceryList.objects.get_or_create(user_id=self.request.user.id)
+        items = grocery_list.items.order_by("position", "-id")
         serializer = GroceryListItemSerializer(items, many=True)
         return Response(serializer.data)
     
@@ -121,31 +136,142 @@ class GroceryListRetrieveCreate(APIView):
         
         item_names = [line.strip() for line in items_string.strip().split('\n') if line.strip()]
 
-        grocery_list, _ = GroceryList.objects.get_or_create(user=self.request.user)
+        with transaction.atomic():
+            grocery_list, _ = GroceryList.objects.get_or_create(user_id=self.request.user.id)
 
-        # One item
-        if len(item_names) == 1:
-            new_item = GroceryListItem.objects.create(
-                grocery=grocery_list,
-                item=item_names[0]
-            )
-            return Response({"id": new_item.id})
-        
-        # Bulk create
-        GroceryListItem.objects.bulk_create([
-            GroceryListItem(grocery=grocery_list, item=name)
-            for name in item_names
-        ])
+            # One item
+            if len(item_names) == 1:
+                new_item = GroceryListItem.objects.create(
+                    grocery=grocery_list,
+                    item=item_names[0]
+                )
+                record_changes(request.user.id, GROCERY_LIST_ITEM, upserts=[new_item.id])
+                bump_version('grocery_list', request.user.id)
+                return Response({"id": new_item.id})
+
+            # Bulk create
+            new_items = GroceryListItem.objects.bulk_create([
+                GroceryListItem(grocery=grocery_list, item=name)
+                for name in item_names
+            ])
+            record_changes(request.user.id, GROCERY_LIST_ITEM, upserts=[item.id for item in new_items])
+            bump_version('grocery_list', request.user.id)
         return Response(status.HTTP_201_CREATED)
     
     def delete(self, request):
-        GroceryList.objects.filter(user=request.user).delete()
+        with transaction.atomic():
+            ids = list(GroceryListItem.objects.filter(grocery__user_id=request.user.id).values_list('id', flat=True))
+            GroceryList.objects.filter(user_id=request.user.id).delete()
+            record_changes(request.user.id, GROCERY_LIST_ITEM, deletes=ids)
+            bump_version('grocery_list', request.user.id)
         return Response(status=status.HTTP_204_NO_CONTENT)
     
+# POST a batch of check/uncheck changes, deletions and a new order
+class GroceryListBatchUpdate(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    # Applied batches remembered per device
+    kept_batches = 1000
+
+    def post(self, request):
+        serializer = GroceryListBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        seq = data.get('seq')
+
+        with transaction.atomic():
+            grocery_list, _ = GroceryList.objects.select_for_update().get_or_create(user_id=request.user.id)
+            if seq is not None:
+                _, first_time = AppliedGroceryBatch.objects.get_or_create(
+                    user_id=request.user.id, device=data['device'], seq=seq
+                )
+                if not first_time:
+                    # Already applied, the client is retrying
+                    return Response({"applied": False, "seq": seq})
+                # Devices retry their recent batches, not ones this far back
+                AppliedGroceryBatch.objects.filter(
+                    user_id=request.user.id, device=data['device'], seq__lte=seq - self.kept_batches
+                ).delete()
+
+            ids = {change['id'] for change in data['changes']} | set(data['order'])
+            items = {item.id: item for item in grocery_list.items.filter(id__in=ids - set(data['delete']))}
+
+            checked = []
+            for change in data['changes']:
+                item = items.get(change['id'])
+                if item is not None:
+                    item.isChecked = change['isChecked']
+                    checked.append(item)
+            GroceryListItem.objects.bulk_update(checked, ['isChecked'])
+
+            # Reordered items start at 1 so items added later stay on top
+            ordered = []
+            for position, item_id in enumerate(dict.fromkeys(data['order']), start=1):
+                item = items.get(item_id)
+                if item is not None:
+                    item.position = position
+                    ordered.append(item)
+            GroceryListItem.objects.bulk_update(ordered, ['position'])
+
+            deleted_ids = []
+            if data['delete']:
+                deleted_ids = list(grocery_list.items.filter(id__in=data['delete']).values_list('id', flat=True))
+                GroceryListItem.objects.filter(id__in=deleted_ids).delete()
+            record_changes(
+                request.user.id, GROCERY_LIST_ITEM,
+                upserts=[item.id for item in checked + ordered], deletes=deleted_ids,
+            )
+            bump_version('grocery_list', request.user.id)
+
+        return Response({
+            "applied": True,
+            "seq": seq,
+            "updated": len(checked),
+            "reordered": len(ordered),
+            "deleted": len(deleted_ids),
+        })
+
+# POST: checked items go into the fridge and leave the list
+class GroceryListCheckout(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        group = str(request.data.get('group', '')).strip()
+        if not group:
+            return Response({'error': 'group is required'}, status=status.HTTP_400_BAD_REQUEST)
+        elif len(group) > 30:
+            return Response({'error': 'group must be at most 30 characters'}, status=status.HTTP_400_BAD_REQUEST)
+
+        result = checkout_grocery_list(request.user.id, group)
+        return Response({"group": group, **result}, status=status.HTTP_200_OK)
+
 class GroceryListItemUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = GroceryListItemSerializer
     lookup_field = "id"
 
     def get_queryset(self):
-        return GroceryListItem.objects.filter(grocery__user=self.request.user).order_by('id')
\ No newline at end of file
+        return GroceryListItem.objects.filter(grocery__user_id=self.request.user.id).order_by('id')
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            item = serializer.save()
+            record_changes(self.request.user.id, GROCERY_LIST_ITEM, upserts=[item.id])
+            bump_version('grocery_list', self.request.user.id)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            record_changes(self.request.user.id, GROCERY_LIST_ITEM, deletes=[instance.id])
+            instance.delete()
+            bump_version('grocery_list', self.request.user.id)
+
+
+# ASGI mode (ocipe/urls_asgi.py): GET of the grocery list, writes stay on GroceryListRetrieveCreate
+class AsyncGroceryList(AsyncAPIView):
+    sync_view = GroceryListRetrieveCreate
+
+    @async_conditional_get('grocery_list')
+    async def get(self, request):
+        grocery_list, _ = await GroceryList.objects.aget_or_create(user_id=request.user.id)
+        items = [item async for item in grocery_list.items.order_by("position", "-id")]
+        return JsonResponse(GroceryListItemSerializer(items, many=True).data, safe=False)
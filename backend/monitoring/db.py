@@ -0,0 +1,23 @@
+from django.db import connections
+
+from .metrics import counters
+
+def count_connect(sender, connection, **kwargs):
+    # connection_created: a new connection, or a checkout from the pool when DB_POOL is on
+    counters.inc(f"db.{connection.alias}.connects")
+
+def pool_stats(connection):
+    """psycopg_pool statistics of a connection's pool, None without pooling"""
+    # Only the postgresql backend has a pool, and only with OPTIONS['pool']
+    pool = getattr(connection, 'pool', None)
+    return pool.get_stats() if pool is not None else None
+
+def connection_state(alias):
+    connection = connections[alias]
+    return {
+        "vendor": connection.vendor,
+        "conn_max_age": connection.settings_dict['CONN_MAX_AGE'],
+        "health_checks": connection.settings_dict['CONN_HEALTH_CHECKS'],
+        "connects": counters.snapshot().get(f"db.{alias}.connects", 0),
+        "pool": pool_stats(connection),
+    }
@@ -0,0 +1,105 @@
+import json
+import random
+import subprocess
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from benchmarks.runner import run_scenario, compare
+from benchmarks.scenarios import SCENARIOS
+from benchmarks.seed import seed_accounts
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database with synthetic accounts, drive the main API flows "
+        "in-process and report latency percentiles, requests/s and queries per request"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=20, help="Recipes per user")
+        parser.add_argument('--requests', type=int, default=300, help="Timed requests per scenario")
+        parser.add_argument('--warmup', type=int, default=20, help="Untimed requests per scenario")
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS), help="Comma separated subset of scenarios")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Write the results as JSON to this file")
+        parser.add_argument('--baseline', help="JSON results of an earlier run to compare against")
+        parser.add_argument('--latency-threshold', type=float, default=0.25, help="Allowed latency growth, 0.25 is 25%%")
+        parser.add_argument('--query-threshold', type=float, default=0.0, help="Allowed queries per request growth")
+        parser.add_argument('--keepdb', action='store_true', help="Reuse the test database between runs")
+
+    def handle(self, *args, **options):
+        names = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+        unknown = set(names) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+
+        # Never seeds the configured database, only its test_ copy
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            results = self.run(names, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if baseline is not None:
+            regressions = compare(results, baseline, options['latency_threshold'], options['query_threshold'])
+            if regressions:
+                raise CommandError("Regressions against baseline:\n" + "\n".join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regressions against baseline"))
+
+    def run(self, names, options):
+        cache.clear()
+        started = time.perf_counter()
+        accounts = seed_accounts(users=options['users'], recipes_per_user=options['recipes'], seed=options['seed'])
+        self.stdout.write(f"Seeded {len(accounts)} users in {time.perf_counter() - started:.1f}s")
+
+        rng = random.Random(options['seed'])
+        scenarios = {
+            name: run_scenario(SCENARIOS[name], accounts, options['requests'], rng, warmup=options['warmup'])
+            for name in names
+        }
+        return {
+            "commit": current_commit(),
+            "database": connection.vendor,
+            "created_at": timezone.now().isoformat(),
+            "options": {key: options[key] for key in ('users', 'recipes', 'requests', 'warmup', 'seed')},
+            "scenarios": scenarios,
+        }
+
+    def report(self, results):
+        self.stdout.write(
+            f"{'scenario':<20} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'errors':>7}"
+        )
+        for name, summary in results['scenarios'].items():
+            self.stdout.write(
+                f"{name:<20} {summary['requests_per_second']:>8.1f} {summary['p50_ms']:>8.2f} "
+                f"{summary['p95_ms']:>8.2f} {summary['p99_ms']:>8.2f} "
+                f"{summary['queries_per_request']:>8.1f} {summary['errors']:>7}"
+            )
@@ -0,0 +1,78 @@
+import json
+import random
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from benchmarks.deployments import SlowGeminiClient, build_jobs, run_sync, run_async
+from benchmarks.seed import seed_accounts
+from recipes import extraction, gemini
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the sync (gunicorn sync workers) and ASGI deployments under a slow Gemini "
+        "upstream: recipe extractions mixed with fridge reads, sent by concurrent clients"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--extractions', type=int, default=100)
+        parser.add_argument('--reads', type=int, default=200, help="Fridge reads sent alongside the extractions")
+        parser.add_argument('--upstream-delay', type=float, default=0.5, help="Seconds per Gemini call")
+        parser.add_argument('--workers', type=int, default=4, help="Sync workers of the WSGI deployment")
+        parser.add_argument('--concurrency', type=int, default=50, help="Concurrent clients")
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Write the results as JSON to this file")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        original_factory = gemini.client_factory
+        upstream = SlowGeminiClient(options['upstream_delay'])
+        gemini.set_client_factory(lambda: upstream)
+        try:
+            results = self.run(options)
+        finally:
+            gemini.set_client_factory(original_factory)
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def run(self, options):
+        cache.clear()
+        accounts = seed_accounts(users=options['users'], recipes_per_user=5, seed=options['seed'])
+        jobs = build_jobs(accounts, options['extractions'], options['reads'], random.Random(options['seed']))
+
+        deployments = {}
+        for name, run in (
+            ('sync', lambda: run_sync(jobs, options['workers'], options['concurrency'])),
+            ('asgi', lambda: run_async(jobs, options['concurrency'])),
+        ):
+            # Every extraction goes upstream, in both runs
+            extraction.recipe_cache.clear()
+            deployments[name] = run()
+        return {
+            "database": connection.vendor,
+            "options": {key: options[key] for key in ('extractions', 'reads', 'upstream_delay', 'workers', 'concurrency')},
+            "deployments": deployments,
+        }
+
+    def report(self, results):
+        self.stdout.write(
+            f"{'deployment':<12} {'requests':<9} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}"
+        )
+        for name, summaries in results['deployments'].items():
+            for kind, summary in summaries.items():
+                self.stdout.write(
+                    f"{name:<12} {kind:<9} {summary['requests_per_second']:>8.1f} {summary['p50_ms']:>9.1f} "
+                    f"{summary['p95_ms']:>9.1f} {summary['p99_ms']:>9.1f} {summary['errors']:>7}"
+                )
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from monitoring.metrics import request_stats
+from monitoring.middleware import RequestMetricsMiddleware
+
+
+def make_view(queries):
+    def view(request):
+        with connection.cursor() as cursor:
+            for _ in range(queries):
+                cursor.execute("SELECT 1")
+        return HttpResponse("ok")
+    return view
+
+
+class Command(BaseCommand):
+    help = "Measure the per-request overhead of RequestMetricsMiddleware"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--queries', type=int, default=5, help="Queries run by the benchmarked view")
+        parser.add_argument('--runs', type=int, default=5)
+
+    def handle(self, *args, **options):
+        view = make_view(options['queries'])
+        request = RequestFactory().get('/bench/')
+        request.resolver_match = None
+        handlers = [('plain', view), ('instrumented', RequestMetricsMiddleware(view))]
+
+        best = {}
+        for label, handler in handlers:
+            timings = []
+            for _ in range(options['runs']):
+                started = time.perf_counter()
+                for _ in range(options['requests']):
+                    handler(request)
+                timings.append((time.perf_counter() - started) / options['requests'])
+            best[label] = min(timings)
+            self.stdout.write(f"{label:>12}: {best[label] * 1e6:.1f}us per request")
+        request_stats.reset()
+
+        overhead = best['instrumented'] - best['plain']
+        self.stdout.write(
+            f"overhead {overhead * 1e6:.1f}us per request ({overhead / best['plain'] * 100:.1f}%), "
+            f"{options['queries']} queries each"
+        )
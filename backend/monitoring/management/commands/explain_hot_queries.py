@@ -0,0 +1,107 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from recipes.models import Recipe, Ingredient, RecipeIngredient
+from fridge.models import Fridge, FridgeIngredient
+from grocery.models import History, GroceryList, GroceryListItem
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed throwaway data and print the EXPLAIN plan of every hot lookup "
+        "without and with the composite indexes. Everything is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--rows', type=int, default=200, help="Rows per user for each table")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                user = self.seed(options['users'], options['rows'])
+                queries = self.hot_queries(user)
+
+                self.stdout.write(self.style.MIGRATE_HEADING("== Before (composite indexes dropped)"))
+                self.run_ddl('remove_sql')
+                self.explain(queries)
+
+                self.stdout.write(self.style.MIGRATE_HEADING("== After"))
+                self.run_ddl('create_sql')
+                self.explain(queries)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, user_count, rows):
+        User.objects.bulk_create([
+            User(username=f'explain-{i}') for i in range(user_count)
+        ])
+        users = list(User.objects.filter(username__startswith='explain-'))
+        fridges = Fridge.objects.bulk_create([Fridge(user=user) for user in users])
+        groceries = GroceryList.objects.bulk_create([GroceryList(user=user) for user in users])
+        for user, fridge, grocery in zip(users, fridges, groceries):
+            ingredients = Ingredient.objects.bulk_create([
+                Ingredient(user=user, name=f'ingredient {i}') for i in range(rows)
+            ])
+            recipes = Recipe.objects.bulk_create([
+                Recipe(
+                    user=user, name=f'recipe {i}', meat_type='beef', longevity=1,
+                    frequency='weekday', state='active' if i % 3 else 'used', ingredient_count=1
+                )
+                for i in range(rows)
+            ])
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(recipe=recipe, ingredient=ingredient, quantity='1')
+                for recipe, ingredient in zip(recipes, ingredients)
+            ])
+            FridgeIngredient.objects.bulk_create([
+                FridgeIngredient(fridge=fridge, ingredient=ingredient, group=f'group {i % 5}')
+                for i, ingredient in enumerate(ingredients)
+            ])
+            History.objects.bulk_create([History(user=user, recipes=[]) for _ in range(rows)])
+            GroceryListItem.objects.bulk_create([
+                GroceryListItem(grocery=grocery, item=f'item {i}') for i in range(rows)
+            ])
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        return users[-1]
+
+    def hot_queries(self, user):
+        return {
+            "Ingredient(user, name)": Ingredient.objects.filter(user=user, name='ingredient 1'),
+            "Recipe(user, state)": Recipe.objects.filter(user=user, state='active'),
+            "FridgeIngredient(fridge, group)": FridgeIngredient.objects.filter(fridge__user=user, group='group 1'),
+            "History(user, created_at)": History.objects.filter(user=user).order_by('-created_at')[:1],
+            "GroceryListItem(grocery, position, id)": GroceryListItem.objects.filter(grocery__user=user).order_by('position', '-id'),
+            "RecipeIngredient(ingredient, recipe)": RecipeIngredient.objects.filter(
+                ingredient__user=user, ingredient__name__in=['ingredient 1', 'ingredient 2']
+            ).values('recipe'),
+        }
+
+    def run_ddl(self, method):
+        # Only used to render statements, entering it is not allowed inside atomic() on SQLite
+        schema_editor = connection.schema_editor()
+        schema_editor.deferred_sql = []
+        statements = []
+        for model in [Recipe, Ingredient, RecipeIngredient, FridgeIngredient, History, GroceryListItem]:
+            for index in model._meta.indexes:
+                statements.append(getattr(index, method)(model, schema_editor))
+            # SQLite builds unique constraints into the table definition, they can't be dropped alone
+            for constraint in model._meta.constraints if connection.vendor != 'sqlite' else []:
+                statements.append(getattr(constraint, method)(model, schema_editor))
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(str(statement))
+            cursor.execute("ANALYZE")
+
+    def explain(self, queries):
+        for name, queryset in queries.items():
+            self.stdout.write(self.style.SUCCESS(name))
+            self.stdout.write(queryset.explain())
+            self.stdout.write("")
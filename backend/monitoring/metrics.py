@@ -0,0 +1,92 @@
+import threading
+from bisect import bisect_left
+from collections import defaultdict, deque
+
+class Counters:
+    """Process-local counters, read by the monitoring endpoints"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = defaultdict(int)
+
+    def inc(self, name, amount=1):
+        with self._lock:
+            self._values[name] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+counters = Counters()
+
+# Upper bounds in seconds, Prometheus style cumulative buckets plus +Inf
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class ViewStats:
+    def __init__(self, ring_size):
+        self.count = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.duration = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.response_bytes = 0
+        # Most recent (duration, queries, db_time, response_bytes) samples
+        self.recent = deque(maxlen=ring_size)
+
+class RequestStats:
+    """Per view latency histogram, DB and response size totals, bounded to a fixed size per view"""
+
+    def __init__(self, ring_size=256, slow_size=50):
+        self._lock = threading.Lock()
+        self._ring_size = ring_size
+        self._views = {}
+        # Slowest requests seen, with their SQL
+        self.slow = deque(maxlen=slow_size)
+
+    def record(self, view, duration, queries, db_time, response_bytes):
+        bucket = bisect_left(LATENCY_BUCKETS, duration)
+        with self._lock:
+            stats = self._views.get(view)
+            if stats is None:
+                stats = self._views[view] = ViewStats(self._ring_size)
+            stats.count += 1
+            stats.buckets[bucket] += 1
+            stats.duration += duration
+            stats.queries += queries
+            stats.db_time += db_time
+            stats.response_bytes += response_bytes
+            stats.recent.append((duration, queries, db_time, response_bytes))
+
+    def record_slow(self, sample):
+        with self._lock:
+            self.slow.append(sample)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                view: {
+                    "count": stats.count,
+                    "buckets": list(stats.buckets),
+                    "duration": stats.duration,
+                    "queries": stats.queries,
+                    "db_time": stats.db_time,
+                    "response_bytes": stats.response_bytes,
+                    "recent": list(stats.recent),
+                }
+                for view, stats in self._views.items()
+            }
+
+    def slow_requests(self):
+        with self._lock:
+            return list(self.slow)
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+            self.slow.clear()
+
+request_stats = RequestStats()
@@ -0,0 +1,112 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from .metrics import request_stats
+
+logger = logging.getLogger(__name__)
+
+# Statements kept per request for the slow request log
+MAX_SAMPLED_QUERIES = 50
+
+class QueryRecorder:
+    """execute_wrapper counting and timing every query, also without DEBUG"""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.time += elapsed
+            if len(self.statements) < MAX_SAMPLED_QUERIES:
+                self.statements.append((elapsed, sql))
+
+class RequestMetricsMiddleware:
+    """Records latency, DB queries, DB time and response size per view into monitoring.metrics.request_stats"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Keeps an ASGI middleware chain async, sync views are then wrapped once by the handler
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        wrapped = self.install(recorder)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.uninstall(wrapped)
+        self.record(request, response, start, recorder)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        # Connections are per thread: the ORM work of an async request runs in its
+        # thread-sensitive worker, so the recorder goes on that thread's connections
+        wrapped = await sync_to_async(self.install)(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(self.uninstall)(wrapped)
+        self.record(request, response, start, recorder)
+        return response
+
+    @staticmethod
+    def install(recorder):
+        # Same as connection.execute_wrapper(), without a context manager per alias
+        wrapped = connections.all()
+        for connection in wrapped:
+            connection.execute_wrappers.append(recorder)
+        return wrapped
+
+    @staticmethod
+    def uninstall(wrapped):
+        for connection in wrapped:
+            connection.execute_wrappers.pop()
+
+    def record(self, request, response, start, recorder):
+        duration = time.perf_counter() - start
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        size = 0 if response.streaming else len(response.content)
+        request_stats.record(view, duration, recorder.count, recorder.time, size)
+
+        if duration >= getattr(settings, 'SLOW_REQUEST_SECONDS', 0.5):
+            self.sample_slow(request, view, response, duration, recorder)
+
+    def sample_slow(self, request, view, response, duration, recorder):
+        # Slowest statements first
+        statements = sorted(recorder.statements, key=lambda statement: statement[0], reverse=True)
+        request_stats.record_slow({
+            "view": view,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration": duration,
+            "queries": recorder.count,
+            "db_time": recorder.time,
+            "sql": [{"time": elapsed, "sql": sql} for elapsed, sql in statements],
+        })
+        logger.warning(
+            "Slow request %s %s (%s) %.3fs, %d queries in %.3fs\n%s",
+            request.method, request.path, view, duration, recorder.count, recorder.time,
+            "\n".join(f"{elapsed * 1000:.1f}ms {sql}" for elapsed, sql in statements[:10]),
+        )
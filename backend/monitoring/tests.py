@@ -1,3 +1,85 @@
-from django.test import TestCase
+from ocipe.tests import AuthenticatedAPITestCase
+from django.urls import reverse
+from django.test import override_settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.backends.signals import connection_created
+from types import SimpleNamespace
+from unittest import mock
+from .metrics import counters, request_stats
 
-# Create your tests here.
+class MonitoringTests(AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        counters.reset()
+        request_stats.reset()
+        self.token = self.register_and_authenticate()
+        User.objects.filter(username=self.username).update(is_staff=True)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.token)
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_endpoints_need_staff_or_metrics_token(self):
+        User.objects.filter(username=self.username).update(is_staff=False)
+        for name in ['db-connections', 'cache-stats', 'prometheus-metrics', 'request-samples']:
+            self.assertEqual(403, self.client.get(reverse(name)).status_code)
+            self.assertEqual(200, self.client.get(reverse(name), HTTP_X_METRICS_TOKEN='scrape-secret').status_code)
+        self.client.credentials()
+        self.assertEqual(403, self.client.get(reverse('request-samples'), HTTP_X_METRICS_TOKEN='wrong').status_code)
+        self.assertEqual(403, self.client.get(reverse('request-samples')).status_code)
+        self.assertEqual(200, self.client.get(reverse('check-health')).status_code)
+        self.assertEqual(200, self.client.get(reverse('db_ping')).status_code)
+
+    def test_cache_stats_counts_etag_hits(self):
+        url = reverse('recipe-view-create-destroy')
+        etag = self.client.get(url)['ETag']
+        self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        response = self.client.get(reverse('cache-stats'))
+        self.assertEqual(1, response.json()['etag.recipes.miss'])
+        self.assertEqual(2, response.json()['etag.recipes.hit'])
+
+
+    def test_request_metrics_per_view(self):
+        self.client.post(reverse('grocery-list'), {'items': 'milk\nbread'})
+        self.client.get(reverse('grocery-list'))
+        self.client.get(reverse('grocery-list'))
+
+        stats = request_stats.snapshot()['grocery-list']
+        self.assertEqual(3, stats['count'])
+        self.assertEqual(3, len(stats['recent']))
+        self.assertGreater(stats['queries'], 0)
+        self.assertGreater(stats['response_bytes'], 0)
+
+        response = self.client.get(reverse('prometheus-metrics'))
+        self.assertEqual(200, response.status_code)
+        body = response.content.decode()
+        self.assertIn('ocipe_request_duration_seconds_bucket{view="grocery-list",le="+Inf"} 3', body)
+        self.assertIn('ocipe_request_duration_seconds_count{view="grocery-list"} 3', body)
+        self.assertIn('ocipe_request_db_queries_total{view="grocery-list"}', body)
+
+    @override_settings(SLOW_REQUEST_SECONDS=0)
+    def test_slow_requests_keep_their_sql(self):
+        with self.assertLogs('monitoring.middleware', level='WARNING'):
+            self.client.get(reverse('grocery-list'))
+
+        response = self.client.get(reverse('request-samples'))
+        slow = response.json()['slow'][-1]
+        self.assertEqual('grocery-list', slow['view'])
+        self.assertEqual(slow['queries'], len(slow['sql']))
+        self.assertIn('grocery-list', response.json()['views'])
+
+    def test_db_connections_reports_reuse_and_pool(self):
+        connection_created.send(sender=connection.__class__, connection=connection)
+        state = self.client.get(reverse('db-connections')).json()['default']
+        self.assertEqual(1, state['connects'])
+        self.assertEqual(connection.settings_dict['CONN_MAX_AGE'], state['conn_max_age'])
+        self.assertIsNone(state['pool'])
+
+        pool = SimpleNamespace(get_stats=lambda: {'pool_size': 4, 'pool_available': 3, 'requests_waiting': 0})
+        with mock.patch.object(connection, 'pool', pool, create=True):
+            state = self.client.get(reverse('db-connections')).json()['default']
+            body = self.client.get(reverse('prometheus-metrics')).content.decode()
+        self.assertEqual(3, state['pool']['pool_available'])
+        self.assertIn('ocipe_db_pool{alias="default",stat="pool_size"} 4', body)
+        self.assertIn('ocipe_events_total{name="db.default.connects"} 1', body)
@@ -4,4 +4,8 @@ from . import views
 urlpatterns = [
     path("healthz/", views.health, name="check-health"),
     path("db/", views.db_ping, name="db_ping"),
+    path("db/connections/", views.db_connections, name="db-connections"),
+    path("cache/", views.cache_stats, name="cache-stats"),
+    path("metrics/", views.prometheus_metrics, name="prometheus-metrics"),
+    path("requests/", views.request_samples, name="request-samples"),
 ]
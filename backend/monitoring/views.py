@@ -1,11 +1,114 @@
-from django.http import HttpResponse
-from django.db import connection
+import hmac
+from functools import wraps
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.db import connection, connections
+from rest_framework.exceptions import APIException
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from .db import connection_state, pool_stats
+from .metrics import counters, request_stats, LATENCY_BUCKETS
+
+def _is_staff(request):
+    # Admin session, or a JWT of a staff user (loaded from the DB, the claims don't carry is_staff)
+    if request.user.is_authenticated:
+        return request.user.is_staff
+    try:
+        user_auth = JWTAuthentication().authenticate(request)
+    except APIException:
+        return False
+    return user_auth is not None and user_auth[0].is_staff
+
+def _has_metrics_token(request):
+    # For scrapers: METRICS_TOKEN in an X-Metrics-Token header
+    token = request.headers.get('X-Metrics-Token')
+    return bool(settings.METRICS_TOKEN and token) and hmac.compare_digest(token, settings.METRICS_TOKEN)
+
+def staff_or_metrics_token(view):
+    """Metrics carry SQL, view names and connection details: staff and scrapers only"""
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if not (_has_metrics_token(request) or _is_staff(request)):
+            return JsonResponse({"error": "Staff user or metrics token required"}, status=403)
+        return view(request, *args, **kwargs)
+    return wrapped
 
 def health(request):
     return HttpResponse({"status": "ok"})
 
 def db_ping(request):
+    # Public, uptime probes call it
     with connection.cursor() as cursor:
         cursor.execute("SELECT 1;")
         result = cursor.fetchone()
-    return HttpResponse({"db": result[0]})
\ No newline at end of file
+    return HttpResponse({"db": result[0]})
+
+@staff_or_metrics_token
+def db_connections(request):
+    # Reuse settings, connects so far and pool state of every alias of this process
+    return JsonResponse({alias: connection_state(alias) for alias in connections})
+
+@staff_or_metrics_token
+def cache_stats(request):
+    # ETag hit/miss counters of this process, keyed "etag.<resource>.<hit|miss>"
+    return JsonResponse(counters.snapshot())
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+@staff_or_metrics_token
+def prometheus_metrics(request):
+    # Request histograms and counters of this process in Prometheus text format
+    stats = request_stats.snapshot()
+    lines = [
+        "# HELP ocipe_request_duration_seconds Request latency per view",
+        "# TYPE ocipe_request_duration_seconds histogram",
+    ]
+    for view, view_stats in sorted(stats.items()):
+        label = f'view="{_label(view)}"'
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), view_stats['buckets']):
+            cumulative += count
+            lines.append(f'ocipe_request_duration_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+        lines.append(f"ocipe_request_duration_seconds_sum{{{label}}} {view_stats['duration']}")
+        lines.append(f"ocipe_request_duration_seconds_count{{{label}}} {view_stats['count']}")
+
+    for name, key, help_text in [
+        ("ocipe_request_db_queries_total", "queries", "Database queries per view"),
+        ("ocipe_request_db_seconds_total", "db_time", "Time spent in the database per view"),
+        ("ocipe_response_bytes_total", "response_bytes", "Response body bytes per view"),
+    ]:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        for view, view_stats in sorted(stats.items()):
+            lines.append(f'{name}{{view="{_label(view)}"}} {view_stats[key]}')
+
+    lines.append("# HELP ocipe_db_pool Connection pool statistics per database alias")
+    lines.append("# TYPE ocipe_db_pool gauge")
+    for alias in connections:
+        for stat, value in sorted((pool_stats(connections[alias]) or {}).items()):
+            lines.append(f'ocipe_db_pool{{alias="{_label(alias)}",stat="{_label(stat)}"}} {value}')
+
+    lines.append("# HELP ocipe_events_total Process counters such as ETag hits and db.<alias>.connects")
+    lines.append("# TYPE ocipe_events_total counter")
+    for name, value in sorted(counters.snapshot().items()):
+        lines.append(f'ocipe_events_total{{name="{_label(name)}"}} {value}')
+    return HttpResponse("\n".join(lines) + "\n", content_type="text/plain; version=0.0.4; charset=utf-8")
+
+@staff_or_metrics_token
+def request_samples(request):
+    # Percentiles over each view's recent requests, and the slowest requests with their SQL
+    views = {}
+    for view, view_stats in request_stats.snapshot().items():
+        durations = sorted(sample[0] for sample in view_stats['recent'])
+        views[view] = {
+            "count": view_stats['count'],
+            "p50": _percentile(durations, 0.5),
+            "p95": _percentile(durations, 0.95),
+            "p99": _percentile(durations, 0.99),
+            "avg_queries": view_stats['queries'] / view_stats['count'],
+        }
+    return JsonResponse({"views": views, "slow": request_stats.slow_requests()})
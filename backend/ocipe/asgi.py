@@ -5,6 +5,13 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Serve it with uvicorn workers instead of the gunicorn sync workers of ocipe.wsgi:
+
+    gunicorn ocipe.asgi:application -k uvicorn_worker.UvicornWorker
+
+The Gemini extraction and the fridge, recipe list and grocery list reads then run
+as async views (ocipe/urls_asgi.py), a slow upstream no longer holds a worker.
 """
 
 import os
@@ -12,5 +19,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ocipe.settings')
+os.environ.setdefault('DJANGO_ASGI', 'true')
 
 application = get_asgi_application()
@@ -0,0 +1,81 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views import View
+from rest_framework import exceptions, status
+from rest_framework.settings import api_settings
+
+# DRF views are sync only. Under ASGI (see ocipe/asgi.py) the I/O-bound routes are served by
+# these plain Django async views instead, everything they don't handle goes to the DRF view.
+
+def error_response(exc):
+    detail = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+    response = JsonResponse(detail, status=exc.status_code, safe=False)
+    auth_header = getattr(exc, 'auth_header', None)
+    if auth_header:
+        response['WWW-Authenticate'] = auth_header
+    return response
+
+def request_data(request):
+    """Request body as a dict for JSON, form and multipart requests"""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            raise exceptions.ParseError()
+        return data if isinstance(data, dict) else {}
+    return request.POST
+
+
+class AsyncAPIView(View):
+    """
+    Async view with the DRF views' authentication classes (JWT_STATELESS picks them in settings)
+    and IsAuthenticated. Methods without an async handler run the sync DRF view in
+    sync_view in a thread, so a route keeps all its methods when it is swapped in.
+    """
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    sync_view = None
+
+    def get_authenticators(self):
+        return [auth() for auth in self.authentication_classes]
+
+    async def authenticate(self, request, authenticators):
+        # First authenticator that recognises the request wins, like rest_framework.request.Request
+        for authenticator in authenticators:
+            if hasattr(authenticator, 'aauthenticate'):
+                user_auth = await authenticator.aauthenticate(request)
+            else:
+                user_auth = await sync_to_async(authenticator.authenticate)(request)
+            if user_auth is not None:
+                return user_auth
+        return None
+
+    async def dispatch(self, request, *args, **kwargs):
+        handler = getattr(self, request.method.lower(), None)
+        if handler is None or request.method == 'OPTIONS' or not self.handles(request):
+            if self.sync_view is None:
+                return self.http_method_not_allowed(request, *args, **kwargs)
+            return await sync_to_async(self.sync_view.as_view())(request, *args, **kwargs)
+
+        authenticators = self.get_authenticators()
+        try:
+            user_auth = await self.authenticate(request, authenticators)
+            if user_auth is None:
+                raise exceptions.NotAuthenticated()
+            request.user, request.auth = user_auth
+            return await handler(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                # As APIView.handle_exception: 401 with the first authenticator's challenge, else 403
+                auth_header = authenticators[0].authenticate_header(request) if authenticators else None
+                if auth_header:
+                    exc.auth_header = auth_header
+                    exc.status_code = status.HTTP_401_UNAUTHORIZED
+                else:
+                    exc.status_code = status.HTTP_403_FORBIDDEN
+            return error_response(exc)
+
+    def handles(self, request):
+        # Lets a view keep the requests its async handler doesn't cover on the DRF view
+        return True
@@ -0,0 +1,83 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+# Backstop for changes that skip User.save(), e.g. queryset.update(is_active=False),
+# and for other processes when CACHES is per process
+USER_STATE_CACHE_TIMEOUT = 60
+
+def _user_state_key(user_id):
+    return f"auth:user_state:{user_id}"
+
+def _user_state_query(user_id):
+    # Always the primary: a lagging replica would refuse new users and cache old password digests
+    return get_user_model().objects.using(DEFAULT_DB_ALIAS).filter(
+        **{api_settings.USER_ID_FIELD: user_id}
+    ).values_list('is_active', 'password')
+
+def _user_state(row):
+    # False caches a missing user too
+    return (row[0], get_md5_hash_password(row[1])) if row else False
+
+def get_user_state(user_id):
+    """(is_active, password digest) for the user, None if it no longer exists; cached"""
+    key = _user_state_key(user_id)
+    state = cache.get(key)
+    if state is None:
+        state = _user_state(_user_state_query(user_id).first())
+        cache.set(key, state, USER_STATE_CACHE_TIMEOUT)
+    return state or None
+
+async def aget_user_state(user_id):
+    key = _user_state_key(user_id)
+    state = await cache.aget(key)
+    if state is None:
+        state = _user_state(await _user_state_query(user_id).afirst())
+        await cache.aset(key, state, USER_STATE_CACHE_TIMEOUT)
+    return state or None
+
+def forget_user_state(sender, instance, **kwargs):
+    # post_save / post_delete of the user: deactivation and password changes apply right away
+    cache.delete(_user_state_key(getattr(instance, api_settings.USER_ID_FIELD)))
+
+class CachedTokenUserAuthentication(JWTStatelessUserAuthentication):
+    """
+    JWT authentication without loading auth_user: request.user is a TokenUser built from
+    the signed claims, so views only rely on request.user.id. Deleted or deactivated users,
+    and tokens issued before a password change, are still refused through get_user_state.
+    Tokens without the password digest claim (issued before it was added) are accepted.
+    """
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        self.check_user_state(get_user_state(user.id), validated_token)
+        return user
+
+    async def aauthenticate(self, request):
+        """authenticate() for the async views, only the user state lookup touches cache/DB"""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        user = super().get_user(validated_token)
+        self.check_user_state(await aget_user_state(user.id), validated_token)
+        return user, validated_token
+
+    def check_user_state(self, state, validated_token):
+        if state is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        is_active, password_digest = state
+        if api_settings.CHECK_USER_IS_ACTIVE and not is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        token_digest = validated_token.get(api_settings.REVOKE_TOKEN_CLAIM)
+        if token_digest is not None and token_digest != password_digest:
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
@@ -0,0 +1,118 @@
+import hashlib
+import time
+from functools import wraps
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+from monitoring.metrics import counters
+from .routers import reads_from_replica
+
+# Per-user version stamps: cached results are keyed by the current version,
+# so bumping it on write makes every older entry unreachable.
+# Whatever is stored under a version is read from the primary (routers.primary_reads),
+# a replica may not have reached that version yet.
+
+def _version_key(resource, user_id):
+    return f"version:{resource}:{user_id}"
+
+def get_version(resource, user_id):
+    key = _version_key(resource, user_id)
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so an evicted counter never reuses an older version
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+async def aget_version(resource, user_id):
+    key = _version_key(resource, user_id)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), timeout=None)
+        version = await cache.aget(key)
+    return version
+
+def _incr(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+
+def bump_version(resource, user_id):
+    key = _version_key(resource, user_id)
+    _incr(key)
+    # Bump again once committed so a read racing the transaction can't keep stale data cached
+    transaction.on_commit(lambda: _incr(key))
+
+def versioned_key(resource, user_id, name):
+    return f"{resource}:{name}:{user_id}:{get_version(resource, user_id)}"
+
+async def aversioned_key(resource, user_id, name):
+    return f"{resource}:{name}:{user_id}:{await aget_version(resource, user_id)}"
+
+def _etag(resource, request, version):
+    # Same user, same version and same query string -> same body
+    digest = hashlib.sha1(
+        f"{resource}:{request.user.id}:{version}:{request.get_full_path()}".encode()
+    ).hexdigest()
+    return f'"{digest}"'
+
+def resource_etag(resource, request):
+    return _etag(resource, request, get_version(resource, request.user.id))
+
+async def aresource_etag(resource, request):
+    return _etag(resource, request, await aget_version(resource, request.user.id))
+
+def _etag_matches(etag, request):
+    if_none_match = request.headers.get('If-None-Match')
+    return bool(if_none_match) and (etag in parse_etags(if_none_match) or if_none_match.strip() == '*')
+
+def _tag(response, etag):
+    # A body read from the replica may predate the version the ETag stands for
+    if response.status_code == status.HTTP_304_NOT_MODIFIED or not reads_from_replica():
+        response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+
+def conditional_get(resource):
+    """
+    Decorate a view's get(): answers 304 from the version stamp alone when
+    If-None-Match matches, before any queryset or serializer runs.
+    """
+    def decorator(get):
+        @wraps(get)
+        def wrapper(self, request, *args, **kwargs):
+            etag = resource_etag(resource, request)
+            if _etag_matches(etag, request):
+                counters.inc(f"etag.{resource}.hit")
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                counters.inc(f"etag.{resource}.miss")
+                response = get(self, request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+            _tag(response, etag)
+            return response
+        return wrapper
+    return decorator
+
+def async_conditional_get(resource):
+    """conditional_get() for the async views: plain Django responses, async cache calls"""
+    def decorator(get):
+        @wraps(get)
+        async def wrapper(self, request, *args, **kwargs):
+            etag = await aresource_etag(resource, request)
+            if _etag_matches(etag, request):
+                counters.inc(f"etag.{resource}.hit")
+                response = HttpResponseNotModified()
+            else:
+                counters.inc(f"etag.{resource}.miss")
+                response = await get(self, request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+            _tag(response, etag)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,130 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import jwt
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework_simplejwt.settings import api_settings
+
+from .authentication import CachedTokenUserAuthentication
+
+# Read replica (settings.DATABASES['replica'], set up from POSTGRES_REPLICA_HOST).
+# ReplicaRoutingMiddleware decides per request where reads go, ReplicaRouter applies it.
+
+REPLICA = 'replica'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Alias for the reads of the current request, None (the primary) outside of a request
+_read_alias = ContextVar('read_alias', default=None)
+
+def reads_from_replica():
+    return _read_alias.get() == REPLICA
+
+@contextmanager
+def primary_reads():
+    """
+    Reads inside go to the primary. For results kept under the current version stamp:
+    a lagging replica would have them cached, or ETagged, stale until the next write
+    """
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+def _pin_key(user_id):
+    return f"db:pinned:{user_id}"
+
+def pin_to_primary(user_id):
+    # Longer than the replication lag, so the user reads their own writes on every device
+    cache.set(_pin_key(user_id), True, settings.REPLICA_PIN_SECONDS)
+
+def is_pinned(user_id):
+    return cache.get(_pin_key(user_id)) is not None
+
+def token_user_id(request):
+    """
+    user_id claim of the bearer token, without verifying it: it only picks a database,
+    the view still authenticates the request
+    """
+    authenticator = CachedTokenUserAuthentication()
+    header = authenticator.get_header(request)
+    raw_token = authenticator.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        return None
+    try:
+        claims = jwt.decode(raw_token, options={"verify_signature": False})
+    except jwt.InvalidTokenError:
+        return None
+    return claims.get(api_settings.USER_ID_CLAIM)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        # Explicit, or saving an instance read from the replica would go back there
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA}:
+            return True
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Safe-method requests read from the replica, unless their user wrote within
+    REPLICA_PIN_SECONDS. Other methods read and write on the primary, then pin their user.
+    Does nothing when no replica is configured.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if REPLICA not in connections.settings:
+            return self.get_response(request)
+
+        user_id = token_user_id(request)
+        safe = request.method in SAFE_METHODS
+        token = _read_alias.set(REPLICA if safe and not (user_id is not None and is_pinned(user_id)) else None)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+        if not safe and user_id is not None and self.authenticated(response):
+            pin_to_primary(user_id)
+        return response
+
+    async def __acall__(self, request):
+        if REPLICA not in connections.settings:
+            return await self.get_response(request)
+
+        user_id = token_user_id(request)
+        safe = request.method in SAFE_METHODS
+        pinned = user_id is not None and await cache.aget(_pin_key(user_id)) is not None
+        token = _read_alias.set(REPLICA if safe and not pinned else None)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+        if not safe and user_id is not None and self.authenticated(response):
+            await cache.aset(_pin_key(user_id), True, settings.REPLICA_PIN_SECONDS)
+        return response
+
+    @staticmethod
+    def authenticated(response):
+        # A forged or expired token can't pin anyone
+        return response.status_code not in (401, 403)
@@ -16,6 +16,8 @@ from dotenv import load_dotenv
 from urllib.parse import urlparse
 from datetime import timedelta
 import sys
+import importlib.util
+from django.core.exceptions import ImproperlyConfigured
 
 load_dotenv()
 
@@ -47,9 +49,12 @@ INSTALLED_APPS = [
     'fridge',
     'grocery',
     'monitoring',
+    'sync',
 ]
 
 MIDDLEWARE = [
+    'monitoring.middleware.RequestMetricsMiddleware',
+    'ocipe.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -71,7 +76,10 @@ CSRF_COOKIE_SECURE = True
 
 CORS_ALLOW_CREDENTIALS = True
 
-ROOT_URLCONF = 'ocipe.urls'
+# Set by ocipe/asgi.py: async views for the I/O-bound routes, see ocipe/urls_asgi.py
+ASGI_MODE = os.getenv("DJANGO_ASGI", "false").lower() == "true"
+
+ROOT_URLCONF = 'ocipe.urls_asgi' if ASGI_MODE else 'ocipe.urls'
 
 TEMPLATES = [
     {
@@ -90,6 +98,13 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'ocipe.wsgi.application'
 
+def _conn_max_age(value):
+    return None if value.lower() == "none" else int(value)
+
+# Persistent connections outlive a request only in the thread that served it, under ASGI
+# every request runs in a new thread, so there DB_POOL=true is the way to reuse connections
+DB_POOL = os.getenv("DB_POOL", "false").lower() == "true"
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -98,9 +113,58 @@ DATABASES = {
         'PASSWORD': os.getenv("POSTGRES_PASSWORD"),
         'HOST': os.getenv("POSTGRES_HOST"),
         'PORT': 5432,
+        # Reuse a connection for DB_CONN_MAX_AGE seconds ("none": no limit) instead of a new
+        # TCP/TLS handshake per request, checked with a ping before reuse after a request ends
+        'CONN_MAX_AGE': _conn_max_age(os.getenv("DB_CONN_MAX_AGE", "0" if ASGI_MODE or DB_POOL else "60")),
+        'CONN_HEALTH_CHECKS': os.getenv("DB_CONN_HEALTH_CHECKS", "true").lower() == "true",
+        'OPTIONS': {},
+    }
+}
+
+if DB_POOL:
+    # Connection pool per process, connections go back to the pool after each request and
+    # CONN_MAX_AGE stays 0. Needs psycopg 3 with psycopg_pool, requirements.txt only has psycopg2
+    if importlib.util.find_spec("psycopg") is None or importlib.util.find_spec("psycopg_pool") is None:
+        raise ImproperlyConfigured('DB_POOL=true needs psycopg 3 and psycopg_pool: pip install "psycopg[binary,pool]"')
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.getenv("DB_POOL_MIN_SIZE", 2)),
+        'max_size': int(os.getenv("DB_POOL_MAX_SIZE", 10)),
+        'timeout': float(os.getenv("DB_POOL_TIMEOUT", 10)),
+    }
+
+# Optional read replica of the same database: safe-method requests read from it, see ocipe/routers.py
+if os.getenv("POSTGRES_REPLICA_HOST"):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.getenv("POSTGRES_REPLICA_HOST"),
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        # Test runs use the default test database for it, ReplicaTestCase gives it its own
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['ocipe.routers.ReplicaRouter']
+
+# After a write its user reads from the primary for this long, keep it above the replication lag
+REPLICA_PIN_SECONDS = float(os.getenv("REPLICA_PIN_SECONDS", 5))
+
+
+# Cache shared by the per-user versioned caches (ocipe/cache.py) and the extraction jobs (recipes/jobs.py)
+# Local memory by default, set CACHE_BACKEND/CACHE_LOCATION to a shared backend
+# (e.g. django.core.cache.backends.redis.RedisCache) when running several gunicorn workers:
+# job status polls and rate limits need it, `manage.py check --deploy` fails without it (recipes.E001)
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv("CACHE_BACKEND", 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv("CACHE_LOCATION", 'ocipe'),
     }
 }
 
+# Requests slower than this get their SQL logged and kept by monitoring.middleware
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", 0.5))
+
+# Sent as X-Metrics-Token by scrapers of /api/monitoring/, staff users need none. Unset: staff only
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -148,8 +212,12 @@ REST_FRAMEWORK = {
         'rest_framework.renderers.JSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
     ],
+    # Stateless by default: request.user is built from the token claims, no auth_user query
+    # per request (see ocipe/authentication.py). JWT_STATELESS=false loads the User again
     'DEFAULT_AUTHENTICATION_CLASSES' : [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'ocipe.authentication.CachedTokenUserAuthentication'
+        if os.getenv("JWT_STATELESS", "true").lower() == "true"
+        else 'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend']
 }
@@ -158,4 +226,7 @@ SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=5), # 30 for when testing, for security keep at 5
     "REFRESH_TOKEN_LIFETIME": timedelta(days=30), # 7 for dev, 1 for 
     "ROTATE_REFRESH_TOKENS": False,
+    # New tokens carry a digest of the password hash, CachedTokenUserAuthentication refuses
+    # them after a password change. Not CHECK_REVOKE_TOKEN: it refuses tokens without the claim
+    "TOKEN_OBTAIN_SERIALIZER": "users.serializers.RevocableTokenObtainPairSerializer",
 }
\ No newline at end of file
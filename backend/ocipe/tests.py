@@ -1,7 +1,47 @@
 from rest_framework.test import APITestCase
-from django.urls import reverse
+from django.test import SimpleTestCase
+from django.urls import reverse, get_resolver
+from django.core.cache import cache
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken
+from types import SimpleNamespace
+import re
+
+# String and number literals, then the IN (...) lists they leave
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+IN_LIST_RE = re.compile(r"IN \((?:\?, )*\?\)")
+
+def _batch(sql):
+    """(shape, rows): the statement without its values, and how many rows or ids it carries"""
+    head, values = sql.split(' VALUES ', 1) if sql.startswith('INSERT') and ' VALUES ' in sql else (sql, None)
+    if values is not None:
+        return LITERAL_RE.sub('?', head), values.count('), (') + 1
+    shape = LITERAL_RE.sub('?', sql)
+    lists = IN_LIST_RE.findall(shape)
+    return IN_LIST_RE.sub('IN (...)', shape), max((lst.count('?') for lst in lists), default=1)
+
+def statement_count(statements):
+    """
+    Statements run, a bulk statement split in batches counting once: a statement continues
+    the previous one when it has the same shape and the previous carried several rows.
+    Single row statements always count, so a query per row still shows.
+    """
+    count = 0
+    previous = None
+    for sql in statements:
+        shape, rows = _batch(sql)
+        if previous is None or shape != previous[0] or previous[1] == 1:
+            count += 1
+        previous = (shape, rows)
+    return count
 
 class AuthenticatedAPITestCase(APITestCase):
+    def setUp(self):
+        # Versioned caches outlive the rolled back test transaction
+        cache.clear()
+
     def register_and_authenticate(self, test_user_number=1):
         self.username=f'testuser{test_user_number}' 
         self.password=f'testpass{test_user_number}'
@@ -12,4 +52,173 @@ class AuthenticatedAPITestCase(APITestCase):
         token_url = reverse('token_obtain_pair')
         response = self.client.post(token_url, {'username': self.username, 'password': self.password})
         tokens = response.data['access']
-        return tokens
\ No newline at end of file
+        return tokens
+
+class ReplicaTestCase(AuthenticatedAPITestCase):
+    """
+    Gives the 'replica' alias a test database of its own next to default, so tests see
+    what a lagging replica serves. Nothing is copied over until replicate() is called.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        default = connections['default'].settings_dict
+        # SQLite gets an in-memory database per alias, the others a test_<name>_replica
+        test_name = None if connections['default'].vendor == 'sqlite' else f"{default['NAME']}_replica"
+
+        # Set up here rather than by the test runner, which only knows the configured aliases
+        cls.configured_replica = connections.settings.get('replica')
+        cls.close_replica()
+        connections.settings['replica'] = {**default, 'TEST': {**default['TEST'], 'NAME': test_name, 'MIRROR': None}}
+        connections['replica'].creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        cls.databases = {'default', 'replica'}
+        try:
+            super().setUpClass()
+        except Exception:
+            cls.drop_replica()
+            raise
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.drop_replica()
+
+    @classmethod
+    def drop_replica(cls):
+        connections['replica'].creation.destroy_test_db(verbosity=0)
+        cls.close_replica()
+        if cls.configured_replica is None:
+            del connections.settings['replica']
+        else:
+            connections.settings['replica'] = cls.configured_replica
+
+    @classmethod
+    def close_replica(cls):
+        # Forget this thread's connection, the next one is made from the current settings
+        if hasattr(connections._connections, 'replica'):
+            connections['replica'].close()
+            del connections['replica']
+
+    def replicate(self, *models):
+        """Bring the replica's copy of models up to date with default"""
+        for model in models:
+            model.objects.using('replica').all().delete()
+            model.objects.using('replica').bulk_create(model.objects.using('default').all())
+
+
+class QueryBudgetTestCase(AuthenticatedAPITestCase):
+    """
+    Seeds one account per size in SIZES, then checks an endpoint runs the same number
+    of queries for every one of them. Subclasses name a test_budget_<url name> per
+    route of their urlconf, see assertEveryRouteBudgeted.
+    Backend independent: the batches Django splits a bulk statement into, e.g. under
+    SQLite's 999 variable limit, count as one statement, see statement_count.
+    """
+    SIZES = (10, 100, 1000)
+    urlconf = None
+    # SQL listed per failure, the rest is elided
+    MAX_REPORTED_QUERIES = 60
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.accounts = [cls.seed_account(number, size) for number, size in enumerate(cls.SIZES)]
+
+    @classmethod
+    def seed_account(cls, number, size):
+        # Imported here so ocipe.tests stays importable on its own
+        from recipes.bulk import create_recipes
+        from recipes.test_data import recipes
+        from fridge.models import Fridge, FridgeIngredient
+        from grocery.models import GroceryList, GroceryListItem, History
+
+        user = User.objects.create_user(username=f'budget{number}', password='budget')
+        fridge = Fridge.objects.create(user=user)
+        grocery_list = GroceryList.objects.create(user=user)
+        created = create_recipes(user.id, [
+            dict(
+                recipes[i % len(recipes)],
+                name=f"{recipes[i % len(recipes)]['name']} {i}",
+                ingredients=recipes[i % len(recipes)]['ingredients'] + [{"name": f"extra {i}", "quantity": "1"}],
+            )
+            for i in range(size)
+        ])
+        ingredients = [ri.ingredient for recipe in created for ri in recipe.recipeingredient_set.all()]
+        fridge_ingredients = FridgeIngredient.objects.bulk_create([
+            FridgeIngredient(fridge=fridge, ingredient=ingredient, group='meat' if i % 2 else 'sauce')
+            for i, ingredient in enumerate(dict.fromkeys(ingredients[:size]))
+        ])
+        items = GroceryListItem.objects.bulk_create([
+            GroceryListItem(grocery=grocery_list, item=f"item {i}", isChecked=i % 2 == 0)
+            for i in range(size)
+        ])
+        recipe_ids = [recipe.id for recipe in created]
+        History.objects.bulk_create([
+            History(user=user, recipes=recipe_ids[i:i + 3]) for i in range(0, size, 10)
+        ])
+        return SimpleNamespace(
+            user=user, size=size, recipe_ids=recipe_ids,
+            fridge_ingredient_ids=[fi.id for fi in fridge_ingredients],
+            grocery_item_ids=[item.id for item in items],
+        )
+
+    def authenticate(self, account):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(AccessToken.for_user(account.user)))
+
+    def assertConstantQueries(self, request, prepare=None, batched=()):
+        """
+        request(account) sends one request for the account and returns the response.
+        Runs it for every seeded account, each with a cold cache. When given,
+        prepare(account) runs first, outside the count, and request gets its result too.
+        Statements starting with one of batched aren't counted: Django splits them
+        into batches itself, e.g. QuerySet.delete() deletes 100 rows per DELETE.
+        """
+        runs = []
+        for account in self.accounts:
+            self.authenticate(account)
+            cache.clear()
+            args = (account,) if prepare is None else (account, prepare(account))
+            with CaptureQueriesContext(connection) as queries:
+                response = request(*args)
+            self.assertLess(
+                response.status_code, 400,
+                f"{response.request['REQUEST_METHOD']} {response.request['PATH_INFO']} "
+                f"failed for {account.size} recipes: {getattr(response, 'data', response.content)}"
+            )
+            runs.append((account, queries.captured_queries))
+
+        counts = [
+            statement_count(query['sql'] for query in captured if not query['sql'].startswith(tuple(batched)))
+            for _, captured in runs
+        ]
+        if len(set(counts)) > 1:
+            self.fail(self.budget_report(response, runs))
+        return counts[0]
+
+    def budget_report(self, response, runs):
+        lines = [f"{response.request['REQUEST_METHOD']} {response.request['PATH_INFO']} query count grows with data:"]
+        lines += [f"  {account.size} recipes: {len(captured)} queries" for account, captured in runs]
+        account, captured = max(runs, key=lambda run: len(run[1]))
+        lines.append(f"SQL for {account.size} recipes:")
+        lines += [f"  {i}. {query['sql']}" for i, query in enumerate(captured[:self.MAX_REPORTED_QUERIES], start=1)]
+        if len(captured) > self.MAX_REPORTED_QUERIES:
+            lines.append(f"  ... {len(captured) - self.MAX_REPORTED_QUERIES} more")
+        return "\n".join(lines)
+
+    def assertEveryRouteBudgeted(self):
+        names = [pattern.name for pattern in get_resolver(self.urlconf).url_patterns]
+        missing = [name for name in names if not hasattr(self, 'test_budget_' + name.replace('-', '_'))]
+        self.assertEqual([], missing, f"Routes of {self.urlconf} without a query budget test")
+
+
+class StatementCountTests(SimpleTestCase):
+    def test_batches_of_one_statement_count_once(self):
+        insert = "INSERT INTO \"log\" (\"user_id\", \"seq\") VALUES ({0}, {0}), ({0}, {1})"
+        self.assertEqual(1, statement_count([insert.format(1, 2), insert.format(3, 4)]))
+        delete = "DELETE FROM \"item\" WHERE \"item\".\"id\" IN ({0}, {1})"
+        self.assertEqual(2, statement_count([delete.format(1, 2), delete.format(3, 4), 'SELECT 1']))
+
+    def test_a_query_per_row_still_counts(self):
+        select = "SELECT \"name\" FROM \"ingredient\" WHERE \"ingredient\".\"id\" = {0}"
+        self.assertEqual(3, statement_count([select.format(i) for i in range(3)]))
+        insert = "INSERT INTO \"item\" (\"name\") VALUES ('item {0}')"
+        self.assertEqual(3, statement_count([insert.format(i) for i in range(3)]))
@@ -5,5 +5,6 @@ urlpatterns = [
     path('api/user/', include("users.urls")),
     path('api/fridge/', include("fridge.urls")),
     path('api/grocery/', include("grocery.urls")),
-    path('api/monitoring/', include("monitoring.urls"))
+    path('api/monitoring/', include("monitoring.urls")),
+    path('api/sync/', include("sync.urls")),
 ]
@@ -0,0 +1,15 @@
+from django.urls import path
+
+from fridge.views import AsyncFridgeList
+from grocery.views import AsyncGroceryList
+from recipes.views import AsyncRecipeList, AsyncGeminiURLView
+from .urls import urlpatterns as sync_urlpatterns
+
+# ROOT_URLCONF under ASGI: the I/O-bound routes resolve to their async views first,
+# same paths and names, every other route is the sync DRF view from ocipe.urls
+urlpatterns = [
+    path('api/recipes/', AsyncRecipeList.as_view(), name="recipe-view-create-destroy"),
+    path('api/recipes/genai/', AsyncGeminiURLView.as_view(), name="generate-recipe-from-url"),
+    path('api/fridge/', AsyncFridgeList.as_view(), name="fridge-list"),
+    path('api/grocery/list/', AsyncGroceryList.as_view(), name="grocery-list"),
+] + sync_urlpatterns
@@ -0,0 +1,102 @@
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from ocipe.cache import bump_version
+from sync.changes import record_changes
+from sync.models import RECIPE, RECIPE_INGREDIENT
+from .models import Recipe, Ingredient, RecipeIngredient, ingredient_list_prefetch
+
+
+def normalize_ingredient_name(name):
+    return str(name).lower()
+
+def resolve_ingredients(user_id, names):
+    """Map each name to the user's Ingredient: one lookup, then one bulk insert for the missing ones"""
+    names = set(names)
+    ingredient_map = {
+        ingredient.name: ingredient
+        for ingredient in Ingredient.objects.filter(user_id=user_id, name__in=names)
+    }
+
+    missing = [name for name in names if name not in ingredient_map]
+    if missing:
+        # A concurrent request may have inserted some of them, so skip conflicts and read them back
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=name, user_id=user_id) for name in missing], ignore_conflicts=True
+        )
+        ingredient_map.update(
+            (ingredient.name, ingredient)
+            for ingredient in Ingredient.objects.filter(user_id=user_id, name__in=missing)
+        )
+    return ingredient_map
+
+def _build_recipe_ingredients(recipes, ingredients_per_recipe, user_id):
+    ingredient_map = resolve_ingredients(user_id, (
+        normalize_ingredient_name(data['name'])
+        for ingredients_data in ingredients_per_recipe
+        for data in ingredients_data
+    ))
+    return [
+        RecipeIngredient(
+            recipe=recipe,
+            ingredient=ingredient_map[normalize_ingredient_name(data['name'])],
+            quantity=data.get('quantity', '')
+        )
+        for recipe, ingredients_data in zip(recipes, ingredients_per_recipe)
+        for data in ingredients_data
+    ]
+
+@transaction.atomic
+def create_recipes(user_id, recipes_data):
+    """Create many recipes with their ingredients in a fixed number of queries"""
+    recipes_data = [dict(data) for data in recipes_data]
+    ingredients_per_recipe = [data.pop('ingredients', []) for data in recipes_data]
+    for data, ingredients_data in zip(recipes_data, ingredients_per_recipe):
+        data.pop('user_id', None)
+        data['ingredient_count'] = len(ingredients_data)
+
+    recipes = Recipe.objects.bulk_create([Recipe(user_id=user_id, **data) for data in recipes_data])
+    recipe_ingredients = RecipeIngredient.objects.bulk_create(
+        _build_recipe_ingredients(recipes, ingredients_per_recipe, user_id)
+    )
+    record_changes(user_id, RECIPE, upserts=[recipe.id for recipe in recipes])
+    record_changes(user_id, RECIPE_INGREDIENT, upserts=[ri.id for ri in recipe_ingredients])
+    bump_version('recipes', user_id)
+    # Ready for serialization without one query per recipe
+    prefetch_related_objects(recipes, ingredient_list_prefetch())
+    return recipes
+
+@transaction.atomic
+def update_recipe(recipe, fields, ingredients_data=None):
+    """Save the given fields and, unless ingredients_data is None, swap the recipe's ingredient rows for it"""
+    for attr, value in fields.items():
+        setattr(recipe, attr, value)
+    if ingredients_data is not None:
+        old_ids = list(recipe.recipeingredient_set.values_list('id', flat=True))
+        RecipeIngredient.objects.filter(id__in=old_ids).delete()
+        recipe.ingredient_count = len(ingredients_data)
+        recipe_ingredients = RecipeIngredient.objects.bulk_create(
+            _build_recipe_ingredients([recipe], [ingredients_data], recipe.user_id)
+        )
+        record_changes(
+            recipe.user_id, RECIPE_INGREDIENT,
+            upserts=[ri.id for ri in recipe_ingredients], deletes=old_ids,
+        )
+    recipe.save()
+    # Once per update, whatever changed
+    record_changes(recipe.user_id, RECIPE, upserts=[recipe.id])
+    bump_version('recipes', recipe.user_id)
+    return recipe
+
+@transaction.atomic
+def delete_recipes(user_id, recipes):
+    """Delete a queryset of recipes, leaving tombstones for them and their ingredient rows"""
+    recipe_ids = list(recipes.values_list('id', flat=True))
+    recipe_ingredient_ids = list(
+        RecipeIngredient.objects.filter(recipe_id__in=recipe_ids).values_list('id', flat=True)
+    )
+    # Through the collector, so cascades and signals of models added later still apply
+    Recipe.objects.filter(id__in=recipe_ids).delete()
+    record_changes(user_id, RECIPE_INGREDIENT, deletes=recipe_ingredient_ids)
+    record_changes(user_id, RECIPE, deletes=recipe_ids)
+    bump_version('recipes', user_id)
+    return len(recipe_ids)
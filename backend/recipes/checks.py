@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Caches that live inside one process: each worker would see its own jobs only
+PER_PROCESS_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+@register(Tags.caches, deploy=True)
+def check_shared_job_cache(app_configs, **kwargs):
+    """Extraction jobs (recipes/jobs.py) are polled from any worker, so their cache has to be shared"""
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend not in PER_PROCESS_CACHES:
+        return []
+    return [Error(
+        f"The default cache ({backend}) is per process, extraction job status and rate limits "
+        "are lost between workers.",
+        hint="Set CACHE_BACKEND/CACHE_LOCATION to a shared cache such as Redis, Memcached or the "
+             "database cache. A single worker process can silence this with SILENCED_SYSTEM_CHECKS.",
+        id='recipes.E001',
+    )]
@@ -0,0 +1,194 @@
+import asyncio
+import copy
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from . import gemini
+
+TRACKING_PARAMS = {'fbclid', 'gclid', 'dclid', 'msclkid', 'mc_cid', 'mc_eid', 'igshid', 'ref', 'ref_src'}
+
+class InvalidURL(ValueError):
+    pass
+
+def normalize_url(url):
+    """Cache key for a recipe page: scheme/host/path plus the non-tracking query params"""
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError as error:
+        # Non-numeric or out of range port, bad IPv6 host
+        raise InvalidURL(f"Invalid url: {error}") from error
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if port and (scheme, port) not in (('http', 80), ('https', 443)):
+        host = f'{host}:{port}'
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith('utm_') and key.lower() not in TRACKING_PARAMS
+    )
+    return urlunsplit((scheme, host, parts.path or '/', urlencode(query), ''))
+
+
+class ExtractionCache:
+    """Thread-safe TTL cache with least recently used eviction"""
+
+    def __init__(self, maxsize, ttl, timer=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= self.timer():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (self.timer() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share the result of the first one. A caller that
+    waits longer than its timeout gives up and drops the call, later callers start a new one.
+    """
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, timeout=None):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+
+        if not leader:
+            if not call.done.wait(timeout):
+                self._forget(key, call)
+                raise TimeoutError(f"Extraction took longer than {timeout}s")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            self._forget(key, call)
+            call.done.set()
+        return call.result
+
+    def _forget(self, key, call):
+        with self._lock:
+            # A newer call may have taken the key since this one was dropped
+            if self._calls.get(key) is call:
+                del self._calls[key]
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines on one event loop"""
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, fn):
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = asyncio.ensure_future(fn())
+            call.add_done_callback(lambda _: self._calls.pop(key, None))
+        # A cancelled caller doesn't cancel the call the others are waiting on
+        return await asyncio.shield(call)
+
+
+recipe_cache = ExtractionCache(
+    maxsize=int(os.getenv('GEMINI_CACHE_SIZE', 512)),
+    ttl=int(os.getenv('GEMINI_CACHE_TTL', 60 * 60 * 24)),
+)
+_single_flight = SingleFlight()
+_async_single_flight = AsyncSingleFlight()
+
+def extract_recipe(url, timeout=None):
+    """
+    Parsed recipe JSON for a URL, from cache or one shared upstream call.
+    TimeoutError when that takes longer than timeout seconds.
+    """
+    key = normalize_url(url)
+    data = recipe_cache.get(key)
+    if data is None:
+        data = _single_flight.do(key, lambda: _extract_and_cache(key, timeout), timeout)
+    # Callers get their own copy, the cached one stays untouched
+    return copy.deepcopy(data)
+
+def _extract_and_cache(key, timeout=None):
+    data = recipe_cache.get(key)
+    if data is None:
+        response = gemini.getRecipeFromURL(key, timeout)
+        data = json.loads(response.candidates[0].content.parts[0].text)
+        recipe_cache.set(key, data)
+    return data
+
+async def aextract_recipe(url):
+    """extract_recipe() for the async views, awaits the upstream call instead of blocking"""
+    key = normalize_url(url)
+    data = recipe_cache.get(key)
+    if data is None:
+        data = await _async_single_flight.do(key, lambda: _aextract_and_cache(key))
+    return copy.deepcopy(data)
+
+async def _aextract_and_cache(key):
+    data = recipe_cache.get(key)
+    if data is None:
+        response = await gemini.agetRecipeFromURL(key)
+        data = json.loads(response.candidates[0].content.parts[0].text)
+        recipe_cache.set(key, data)
+    return data
+
+def extract_many(urls, max_workers=8, timeout=None):
+    """
+    Extract every URL concurrently, returns (url, recipe, error) in request order.
+    A URL that takes longer than timeout seconds fails with the TimeoutError message.
+    """
+    def extract(url):
+        try:
+            return url, extract_recipe(url, timeout), None
+        except Exception as error:
+            return url, None, str(error) or error.__class__.__name__
+
+    if not urls:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(urls)), thread_name_prefix='recipe-batch') as executor:
+        return list(executor.map(extract, urls))
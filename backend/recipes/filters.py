@@ -1,6 +1,6 @@
 import django_filters
-from .models import Recipe
-from django.db.models import Count, Q
+from .models import RecipeIngredient
+from django.db.models import Count, ExpressionWrapper, F, IntegerField, OuterRef, Subquery
 
 class RecipeFilter(django_filters.FilterSet):
     ingredients = django_filters.CharFilter(method='filter_by_ingredients')
@@ -8,15 +8,27 @@ class RecipeFilter(django_filters.FilterSet):
     def filter_by_ingredients(self, queryset, name, value):
         # Prevent bug by leaving an empty space before comma
         ingredient_names = [name.strip().lower() for name in value.split(',') if name.strip()]
+        # Posting lists: only the RecipeIngredient rows of the user's requested ingredients are touched
+        postings = RecipeIngredient.objects.filter(
+            ingredient__user_id=self.request.user.id, ingredient__name__in=ingredient_names
+        )
+        matched = (
+            postings.filter(recipe=OuterRef('pk'))
+            .values('recipe')
+            .annotate(matched=Count('ingredient', distinct=True))
+            .values('matched')
+        )
         # Return recipe rank on the most ingredient match with the request, excluding ones with no matched
-        queryset = queryset.annotate(
-            matched_count=Count(
-                "ingredients",
-                filter=Q(ingredients__name__in=ingredient_names),
-                distinct=True
-            ) * 100 / Count("ingredients")
+        queryset = queryset.filter(
+            id__in=postings.values('recipe')
+        ).annotate(
+            matched_count=ExpressionWrapper(
+                Subquery(matched) * 100 / F('ingredient_count'),
+                output_field=IntegerField()
+            )
         ).exclude( 
             matched_count=0   
-        ).order_by('-matched_count')
+        # id breaks ties, so offset pages don't overlap
+        ).order_by('-matched_count', '-id')
         return queryset
     
\ No newline at end of file
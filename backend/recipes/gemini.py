@@ -1,13 +1,35 @@
 from google import genai
 from google.genai import types
+import httpx
 import os
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def getRecipeFromURL(url):
-    gemini_key = os.getenv('GEMINI_API_KEY')
-    client = genai.Client(api_key=gemini_key)
+def default_client_factory():
+    return genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
+
+# Tests swap this for a local fake with set_client_factory()
+client_factory = default_client_factory
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    # One client per process, reused across calls
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = client_factory()
+        return _client
+
+def set_client_factory(factory):
+    global client_factory, _client
+    with _client_lock:
+        client_factory = factory
+        _client = None
+
+def _generate_request(url, timeout=None):
 
     RECIPE_JSON_SCHEMA = {
         "type": "object",
@@ -45,15 +67,26 @@ def getRecipeFromURL(url):
           - Include any extra note on what is the ingredient is, i.e dashi - japanese soup stock
           """
 
-    response = client.models.generate_content(
+    return dict(
         model="gemini-2.0-flash-lite",
         contents=prompt,
         config=types.GenerateContentConfig(
             temperature=0.7,
             system_instruction="You are an expert recipe extractor. Your task is to extract recipe details from the given URL and format them strictly follows the given JSON schema",
             response_mime_type="application/json",
-            response_schema=RECIPE_JSON_SCHEMA
+            response_schema=RECIPE_JSON_SCHEMA,
+            # In milliseconds, the HTTP request itself is aborted so no thread stays blocked on it
+            http_options=types.HttpOptions(timeout=int(timeout * 1000)) if timeout else None,
         ),
     )
 
-    return response
+def getRecipeFromURL(url, timeout=None):
+    """timeout in seconds, TimeoutError once it's over"""
+    try:
+        return get_client().models.generate_content(**_generate_request(url, timeout))
+    except httpx.TimeoutException as error:
+        raise TimeoutError(f"Extraction took longer than {timeout}s") from error
+
+async def agetRecipeFromURL(url):
+    # Same request through the client's asyncio transport, the event loop keeps serving while it waits
+    return await get_client().aio.models.generate_content(**_generate_request(url))
@@ -0,0 +1,164 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from django.core.cache import cache
+from google.genai import errors as genai_errors
+
+from .extraction import extract_recipe
+
+QUEUED = 'queued'
+RUNNING = 'running'
+RETRYING = 'retrying'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+class RateLimitExceeded(Exception):
+    pass
+
+class QueueFull(Exception):
+    pass
+
+def is_transient(error):
+    """Worth another attempt: timeouts, connection failures, and rate limits or 5xx from Gemini"""
+    if isinstance(error, (TimeoutError, ConnectionError, httpx.TransportError)):
+        return True
+    if isinstance(error, genai_errors.APIError):
+        return error.code == 429 or (error.code or 0) >= 500
+    return False
+
+
+class ExtractionJobQueue:
+    """
+    Runs recipe extractions on a bounded thread pool, no outside broker needed.
+    Job state and the rate limit live in the Django cache: any worker can answer status
+    polls only when that cache is shared between them, see the recipes.E001 check.
+    """
+
+    def __init__(self, extractor=extract_recipe, max_workers=4, max_pending=100,
+                 max_attempts=3, timeout=60, backoff=1.0,
+                 rate_limit=10, rate_window=60, job_ttl=60 * 60, sleep=time.sleep):
+        self.extractor = extractor
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.backoff = backoff
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.job_ttl = job_ttl
+        self.sleep = sleep
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='recipe-extraction')
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def submit(self, user_id, url):
+        self._check_rate_limit(user_id)
+        with self._lock:
+            if len(self._futures) >= self.max_pending:
+                raise QueueFull()
+            job = {
+                'id': uuid.uuid4().hex,
+                'user_id': user_id,
+                'url': url,
+                'status': QUEUED,
+                'attempts': 0,
+                'max_attempts': self.max_attempts,
+                'result': None,
+                'error': None,
+                'progress': None,
+            }
+            self._save(job)
+            future = self._futures[job['id']] = self._executor.submit(self._run, dict(job))
+        future.add_done_callback(lambda _: self._forget(job['id']))
+        return job
+
+    def get(self, job_id, user_id):
+        job = cache.get(self._key(job_id))
+        if job is None or job['user_id'] != user_id:
+            return None
+        return job
+
+    def wait(self, job_id, timeout=None):
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None:
+            future.result(timeout)
+
+    def _run(self, job):
+        while True:
+            job['attempts'] += 1
+            job['status'] = RUNNING
+            # Unix times for pollers: when the running attempt gives up, when the next one starts
+            job['progress'] = {'deadline': time.time() + self.timeout, 'retry_at': None}
+            self._save(job)
+            try:
+                job['result'] = self._attempt(job['url'])
+                job['status'] = SUCCEEDED
+                job['error'] = None
+                break
+            except Exception as error:
+                job['error'] = str(error) or error.__class__.__name__
+                # A bad page or a rejected request fails the same way next time
+                if job['attempts'] >= self.max_attempts or not is_transient(error):
+                    job['status'] = FAILED
+                    break
+                # Exponential backoff between attempts
+                delay = self.backoff * 2 ** (job['attempts'] - 1)
+                job['status'] = RETRYING
+                job['progress'] = {'deadline': None, 'retry_at': time.time() + delay}
+                self._save(job)
+                self.sleep(delay)
+        job['progress'] = None
+        self._save(job)
+
+    def _attempt(self, url):
+        # On the worker thread: the upstream call itself times out, so a hung extraction
+        # can't outlive its attempt and max_workers really bounds the calls in flight
+        return self.extractor(url, timeout=self.timeout)
+
+    def _check_rate_limit(self, user_id):
+        # Fixed window counter, shared between workers through the cache
+        window = int(time.time() // self.rate_window)
+        key = f"extraction-rate:{user_id}:{window}"
+        cache.add(key, 0, self.rate_window)
+        try:
+            count = cache.incr(key)
+        except ValueError:
+            count = 1
+        if count > self.rate_limit:
+            raise RateLimitExceeded()
+
+    def _save(self, job):
+        cache.set(self._key(job['id']), dict(job), self.job_ttl)
+
+    def _forget(self, job_id):
+        with self._lock:
+            self._futures.pop(job_id, None)
+
+    def _key(self, job_id):
+        return f"extraction-job:{job_id}"
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_job_queue():
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = ExtractionJobQueue(
+                max_workers=int(os.getenv('GEMINI_JOB_WORKERS', 4)),
+                max_attempts=int(os.getenv('GEMINI_JOB_ATTEMPTS', 3)),
+                timeout=int(os.getenv('GEMINI_JOB_TIMEOUT', 60)),
+                rate_limit=int(os.getenv('GEMINI_JOB_RATE_LIMIT', 10)),
+            )
+        return _queue
+
+def set_job_queue(queue):
+    # For tests: swap in a queue with a stubbed extractor
+    global _queue
+    with _queue_lock:
+        _queue = queue
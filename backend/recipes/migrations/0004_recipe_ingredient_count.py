@@ -0,0 +1,36 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:22
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+
+
+def backfill_ingredient_count(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    counts = (
+        RecipeIngredient.objects.filter(recipe=OuterRef('pk'))
+        .values('recipe')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    Recipe.objects.filter(recipeingredient__isnull=False).update(ingredient_count=Subquery(counts))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_alter_recipe_meat_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='recipeingredient',
+            index=models.Index(fields=['ingredient', 'recipe'], name='recipeingr_ingredient_recipe'),
+        ),
+        migrations.RunPython(backfill_ingredient_count, migrations.RunPython.noop),
+    ]
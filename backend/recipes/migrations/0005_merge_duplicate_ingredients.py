@@ -0,0 +1,34 @@
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    FridgeIngredient = apps.get_model('fridge', 'FridgeIngredient')
+
+    duplicates = (
+        Ingredient.objects.values('user', 'name')
+        .annotate(keep_id=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+    for duplicate in duplicates:
+        # Repoint every row to the oldest ingredient, then drop the others
+        others = Ingredient.objects.filter(
+            user=duplicate['user'], name=duplicate['name']
+        ).exclude(id=duplicate['keep_id'])
+        RecipeIngredient.objects.filter(ingredient__in=others).update(ingredient=duplicate['keep_id'])
+        FridgeIngredient.objects.filter(ingredient__in=others).update(ingredient=duplicate['keep_id'])
+        others.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_recipe_ingredient_count'),
+        ('fridge', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_ingredients, migrations.RunPython.noop),
+    ]
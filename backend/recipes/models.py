@@ -1,6 +1,17 @@
 from django.db import models
 from django.contrib.auth.models import User
 
+def ingredient_list_prefetch():
+    # Load every recipe's ingredient rows in one batched query (recipe -> recipeingredient -> ingredient)
+    return models.Prefetch(
+        "recipeingredient_set",
+        queryset=RecipeIngredient.objects.select_related("ingredient").order_by("id"),
+    )
+
+class RecipeQuerySet(models.QuerySet):
+    def with_ingredient_list(self):
+        return self.prefetch_related(ingredient_list_prefetch())
+
 class Recipe(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     name = models.CharField(max_length=100)
@@ -11,12 +22,34 @@ class Recipe(models.Model):
     state = models.CharField(max_length=10)
     ingredients = models.ManyToManyField("Ingredient", through="RecipeIngredient")
     added_date = models.DateTimeField(auto_now_add=True)
+    # Denormalized number of RecipeIngredient rows, kept in sync by recipes.bulk
+    ingredient_count = models.PositiveIntegerField(default=0)
+
+    objects = RecipeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "state"], name="recipe_user_state"),
+            models.Index(fields=["user", "-added_date", "-id"], name="recipe_user_added_date"),
+        ]
 
 class Ingredient(models.Model):
     name = models.CharField(max_length=50)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
 
+    class Meta:
+        # Also serves the (user, name) lookups of every get_or_create
+        constraints = [
+            models.UniqueConstraint(fields=["user", "name"], name="unique_ingredient_name_per_user"),
+        ]
+
 class RecipeIngredient(models.Model):
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
     ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE)
-    quantity = models.CharField(max_length=50, blank=True)
\ No newline at end of file
+    quantity = models.CharField(max_length=50, blank=True)
+
+    class Meta:
+        # Ingredient -> recipe posting lists for ingredient search
+        indexes = [
+            models.Index(fields=["ingredient", "recipe"], name="recipeingr_ingredient_recipe"),
+        ]
\ No newline at end of file
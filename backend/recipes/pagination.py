@@ -0,0 +1,32 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+
+class RecipeCursorPagination(CursorPagination):
+    # Newest first, backed by the (user, -added_date, -id) index
+    ordering = ('-added_date', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Opt-in, so existing clients keep getting a plain list
+        if self.cursor_query_param not in request.query_params and self.page_size_query_param not in request.query_params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class RecipeRankPagination(LimitOffsetPagination):
+    """
+    Offset pages for an ingredient search: the results are ordered by their rank, which the
+    date cursor can't follow. Same opt-in and page_size parameter as RecipeCursorPagination.
+    """
+    default_limit = RecipeCursorPagination.page_size
+    limit_query_param = RecipeCursorPagination.page_size_query_param
+    max_limit = RecipeCursorPagination.max_page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if RecipeCursorPagination.cursor_query_param in request.query_params:
+            raise ValidationError({"cursor": "Ranked ingredient searches are paged with offset, not cursor."})
+        if self.limit_query_param not in request.query_params and self.offset_query_param not in request.query_params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
@@ -1,11 +1,21 @@
 from rest_framework import serializers
-from .models import Recipe, Ingredient, RecipeIngredient
+from .models import Recipe
+from .bulk import create_recipes, update_recipe
 
 class IngredientInputSerializer(serializers.Serializer):
     name = serializers.CharField()
     quantity = serializers.CharField(required=False, allow_blank=True)
 
+class RecipeListSerializer(serializers.ListSerializer):
+    # Bulk create: every recipe in the list shares the same ingredient lookup and inserts
+    def create(self, validated_data):
+        user_id = validated_data[0]['user_id'] if validated_data else None
+        return create_recipes(user_id, validated_data)
+
 class RecipeSerializer(serializers.ModelSerializer):
+    # ?fields=name,meat_type,state on reads, 'id' is always kept
+    FIELDS_QUERY_PARAM = 'fields'
+
     ingredients = IngredientInputSerializer(many=True, write_only=True)
     ingredient_list = serializers.SerializerMethodField(read_only=True)
     # For when searching recipe by multiple ingredients
@@ -14,16 +24,38 @@ class RecipeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Recipe
         fields = ['id', 'name', 'meat_type', 'longevity', 'frequency', 'note', 'state', 'ingredients','ingredient_list', 'added_date', 'accuracy']
+        list_serializer_class = RecipeListSerializer
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.sparse_fields(self.context.get('request'))
+        if fields is not None:
+            for name in set(self.fields) - fields - {'id'}:
+                self.fields.pop(name)
+
+    @classmethod
+    def sparse_fields(cls, request):
+        """Requested field names for a read, None when the whole recipe is wanted"""
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return None
+        value = request.query_params.get(cls.FIELDS_QUERY_PARAM)
+        if not value:
+            return None
+        fields = {name.strip() for name in value.split(',') if name.strip()}
+        unknown = fields - set(cls.Meta.fields)
+        if unknown:
+            raise serializers.ValidationError({cls.FIELDS_QUERY_PARAM: f"Unknown fields: {', '.join(sorted(unknown))}"})
+        return fields
 
     def to_representation(self, instance):
         rep = super().to_representation(instance)
         if rep.get('accuracy') is None:
-            rep.pop('accuracy')
+            rep.pop('accuracy', None)
         return rep
 
     def get_ingredient_list(self, obj):
-        # Get all RecipeIngredient objects for this recipe
-        recipe_ingredients = RecipeIngredient.objects.filter(recipe=obj)
+        # Read from the prefetched rows when the queryset used with_ingredient_list()
+        recipe_ingredients = obj.recipeingredient_set.all()
         # Serialize as a list of dicts
         return [
             {
@@ -34,45 +66,35 @@ class RecipeSerializer(serializers.ModelSerializer):
         ]
 
     def create(self, validated_data):
-        ingredients_data = validated_data.pop('ingredients', [])
-        user = validated_data.pop('user')
-        recipe = Recipe.objects.create(user=user, **validated_data)
-
-        for ingredient_data in ingredients_data:
-            name = str(ingredient_data['name']).lower()
-            quantity = ingredient_data['quantity']
-            ingredient, created = Ingredient.objects.get_or_create(
-                name=name, user=user
-            )
-            RecipeIngredient.objects.create(
-                recipe=recipe, ingredient=ingredient, quantity=quantity
-            )
-
-        return recipe
+        user_id = validated_data.pop('user_id')
+        return create_recipes(user_id, [validated_data])[0]
     
     def update(self, instance, validated_data):
         ingredients_data = validated_data.pop('ingredients', None)
-        # Update the Recipe fields
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
-
-        if ingredients_data is not None:
-            # Remove old ingredients
-            instance.recipeingredient_set.all().delete()
-            user = instance.user
-            for ingredient_data in ingredients_data:
-                name = str(ingredient_data['name']).lower()
-                quantity = ingredient_data['quantity']
-                # Add new or reference created one
-                ingredient, created = Ingredient.objects.get_or_create(
-                    name=name, user=user
-                )
-                RecipeIngredient.objects.create(
-                    recipe=instance, ingredient=ingredient, quantity=quantity
-                )
-        return instance
+        return update_recipe(instance, validated_data, ingredients_data)
     
     def get_accuracy(self, obj):
         matched_count = getattr(obj, 'matched_count', None)
-        return matched_count #None
\ No newline at end of file
+        return matched_count #None
+
+class FridgeMatchRecipeSerializer(RecipeSerializer):
+    # Split of the recipe ingredients against the user's fridge, see RecipeFridgeMatchList
+    matched = serializers.SerializerMethodField(read_only=True)
+    missing = serializers.SerializerMethodField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ['matched', 'missing']
+
+    def get_matched(self, obj):
+        fridge_ids = self.context['fridge_ingredient_ids']
+        return [ri.ingredient.name for ri in obj.recipeingredient_set.all() if ri.ingredient_id in fridge_ids]
+
+    def get_missing(self, obj):
+        fridge_ids = self.context['fridge_ingredient_ids']
+        return [
+            {
+                "name": ri.ingredient.name,
+                "quantity": ri.quantity
+            }
+            for ri in obj.recipeingredient_set.all() if ri.ingredient_id not in fridge_ids
+        ]
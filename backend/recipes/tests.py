@@ -1,12 +1,33 @@
-from ocipe.tests import AuthenticatedAPITestCase
+from ocipe.tests import AuthenticatedAPITestCase, QueryBudgetTestCase, ReplicaTestCase
+from ocipe import routers
 from rest_framework.test import APIClient
 from django.urls import reverse
 from rest_framework import status
 from .test_data import recipes
-from .models import Recipe
+from .models import Recipe, Ingredient, RecipeIngredient
+from . import gemini, extraction, jobs
+from types import SimpleNamespace
+from unittest import mock
+from ocipe.asyncviews import AsyncAPIView
+from google.genai import errors as genai_errors
+from .checks import check_shared_job_cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from asgiref.sync import async_to_sync
+from django.test import override_settings
+import asyncio
+import httpx
+import json
+import threading
+import time
+from django.db import connection, connections, IntegrityError
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.test.utils import CaptureQueriesContext
 
 class RecipeTests(AuthenticatedAPITestCase):
     def setUp(self):
+        super().setUp()
         self.token = self.register_and_authenticate()
         self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.token)
         self.unauthenticated_user = APIClient()
@@ -37,6 +58,115 @@ class RecipeTests(AuthenticatedAPITestCase):
                 user__username=self.username,
             ).exists()
         )
+
+    def test_get_all_recipe_query_count_is_constant(self):
+        url = reverse('recipe-view-create-destroy')
+        self.postRecipes(0,1)
+        with CaptureQueriesContext(connection) as one_recipe:
+            self.client.get(url)
+
+        self.postRecipes(1,3)
+        with CaptureQueriesContext(connection) as three_recipes:
+            response = self.client.get(url)
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(len(one_recipe), len(three_recipes))
+
+        # Ingredient search goes through the same prefetch
+        with CaptureQueriesContext(connection) as search:
+            response = self.client.get(url, {'ingredients': 'egg'})
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual(len(search), len(three_recipes))
+        self.assertIn({'name': 'egg', 'quantity': '4'}, response.data[0]['ingredient_list'] + response.data[1]['ingredient_list'])
+
+    def test_bulk_create_recipes(self):
+        url = reverse('recipe-bulk-create')
+        # Warm the cached user check of the stateless JWT authentication
+        self.client.get(reverse('get-recipe-nerd-stats'))
+        with CaptureQueriesContext(connection) as one_recipe:
+            self.client.post(url, {'list': self.recipes[:1]}, format='json')
+        Recipe.objects.all().delete()
+        Ingredient.objects.all().delete()
+
+        with CaptureQueriesContext(connection) as three_recipes:
+            response = self.client.post(url, {'list': self.recipes[:3]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(one_recipe), len(three_recipes))
+        self.assertEqual(3, len(response.data))
+        self.assertEqual(self.recipes[2]['name'], response.data[2]['name'])
+        self.assertEqual(len(self.recipes[2]['ingredients']), len(response.data[2]['ingredient_list']))
+        # Shared ingredients resolve to one row per user
+        self.assertEqual(1, Ingredient.objects.filter(user__username=self.username, name='egg').count())
+        self.assertEqual(13, RecipeIngredient.objects.filter(recipe__user__username=self.username).count())
+
+    def test_bulk_create_recipes_invalid_item(self):
+        url = reverse('recipe-bulk-create')
+        invalid = dict(self.recipes[1])
+        invalid.pop('name')
+        response = self.client.post(url, {'list': [self.recipes[0], invalid]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('name', str(response.data))
+        self.assertFalse(Recipe.objects.filter(user__username=self.username).exists())
+
+    def test_ingredient_name_is_unique_per_user(self):
+        self.postRecipes(0,1)
+        ingredient = Ingredient.objects.get(user__username=self.username, name='egg')
+        with self.assertRaises(IntegrityError):
+            Ingredient.objects.create(user=ingredient.user, name='egg')
+
+    def test_get_recipes_cursor_pagination(self):
+        self.postRecipes(0,3)
+        url = reverse('recipe-view-create-destroy')
+        response = self.client.get(url, {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Newest first
+        self.assertEqual(['Oyakodon', 'Soy Chicken'], [r['name'] for r in response.data['results']])
+        self.assertIsNotNone(response.data['next'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(['Trung duc thit'], [r['name'] for r in response.data['results']])
+        self.assertIsNone(response.data['next'])
+
+    def test_get_recipes_sparse_fields(self):
+        self.postRecipes(0,3)
+        url = reverse('recipe-view-create-destroy')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'fields': 'name,meat_type,state'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual({'id', 'name', 'meat_type', 'state'}, set(response.data[0]))
+        # Deferred in SQL, not dropped after loading
+        recipe_queries = [q['sql'] for q in queries if 'FROM "recipes_recipe"' in q['sql']]
+        self.assertEqual(1, len(recipe_queries))
+        self.assertNotIn('"note"', recipe_queries[0])
+        self.assertFalse([q for q in queries if 'recipes_recipeingredient' in q['sql']])
+
+        response = self.client.get(url, {'fields': 'name,ingredient_list'})
+        self.assertEqual({'id', 'name', 'ingredient_list'}, set(response.data[0]))
+
+        response = self.client.get(url, {'fields': 'name,password'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_all_recipe_conditional(self):
+        self.postRecipes(0,2)
+        url = reverse('recipe-view-create-destroy')
+        response = self.client.get(url)
+        etag = response['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(etag, response['ETag'])
+        self.assertFalse([q for q in queries if 'recipes_' in q['sql']])
+
+        # Different query string, different representation
+        response = self.client.get(url, {'fields': 'name'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.postRecipes(2,3)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(etag, response['ETag'])
+        self.assertEqual(3, len(response.data))
+
     def test_delete_all_recipe(self):
         self.postRecipes(0,2)
         url = reverse('recipe-view-create-destroy')
@@ -135,6 +265,30 @@ class RecipeTests(AuthenticatedAPITestCase):
         self.assertEqual(2, chicken['total'])
         self.assertEqual(1, chicken['active'])
         
+    def test_get_recipe_stats_cached_until_write(self):
+        self.postRecipes(0,3)
+        url = reverse('get-recipe-nerd-stats')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as cached:
+            response = self.client.get(url)
+        self.assertFalse([q for q in cached if 'recipes_recipe' in q['sql']])
+        self.assertEqual(2, response.data['meat_type_stats'][0]['active'])
+
+        # Bulk state flips bump the version
+        self.client.post(reverse('grocery-ingredient-retrieve'), {'recipe_ids': [Recipe.objects.filter(name='Oyakodon').get().id]}, format='json')
+        response = self.client.get(url)
+        chicken = [s for s in response.data['meat_type_stats'] if s['meat_type'] == 'Chicken thighs'][0]
+        self.assertEqual(1, chicken['active'])
+
+        self.client.post(reverse('refresh-all-recipes-state'))
+        response = self.client.get(url)
+        chicken = [s for s in response.data['meat_type_stats'] if s['meat_type'] == 'Chicken thighs'][0]
+        self.assertEqual(2, chicken['active'])
+
+        self.client.delete(reverse('recipe-view-create-destroy'))
+        response = self.client.get(url)
+        self.assertEqual([], response.data['meat_type_stats'])
+
     def test_get_generated_recipe_by_url_valid_link(self):
         data = {
             "url": 'https://www.justonecookbook.com/gyudon/'
@@ -162,7 +316,61 @@ class RecipeTests(AuthenticatedAPITestCase):
         self.assertEqual(first['name'], 'Soy Chicken')
         self.assertIn('accuracy', first)
         self.assertEqual(first['accuracy'], 100)
+
+        # Ranked results are paged by offset, in rank order
+        paged = self.client.get(url, {'ingredients': 'chicken thighs, soy sauce', 'page_size': 1})
+        self.assertEqual(2, paged.data['count'])
+        self.assertEqual(response.data[:1], paged.data['results'])
+        paged = self.client.get(paged.data['next'])
+        self.assertEqual(response.data[1:], paged.data['results'])
+        self.assertIsNone(paged.data['next'])
+        # A date cursor can't continue a ranked search
+        paged = self.client.get(url, {'ingredients': 'chicken thighs, soy sauce', 'cursor': 'cD0yMDI1'})
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, paged.status_code)
     
+    def test_get_recipe_by_ingredients_matches_join_ranking(self):
+        post_response = self.postRecipes(0,3)
+        # Drop one ingredient so the denormalized count has to follow updates
+        update_data = dict(self.recipes[2])
+        update_data['ingredients'] = self.recipes[2]['ingredients'][:4]
+        self.client.put(reverse('recipe-view-retrieve-update-destroy', args=[post_response.data['id']]), update_data, format='json')
+
+        url = reverse('recipe-view-create-destroy')
+        for search in ['egg', 'egg, mirin', 'chicken thighs, soy sauce, sugar', 'nothing']:
+            names = [name.strip() for name in search.split(',')]
+            expected = Recipe.objects.filter(user__username=self.username).annotate(
+                matched_count=Count("ingredients", filter=Q(ingredients__name__in=names), distinct=True) * 100 / Count("ingredients")
+            ).exclude(matched_count=0)
+            response = self.client.get(url, {'ingredients': search})
+            self.assertEqual(
+                sorted((r.id, r.matched_count) for r in expected),
+                sorted((r['id'], r['accuracy']) for r in response.data)
+            )
+            accuracies = [r['accuracy'] for r in response.data]
+            self.assertEqual(sorted(accuracies, reverse=True), accuracies)
+
+    def test_get_recipes_ranked_by_fridge(self):
+        self.postRecipes(0,3)
+        fridge_url = reverse('create-fridge-ingredient')
+        for name in ['chicken thighs', 'soy sauce', 'egg']:
+            self.client.post(fridge_url, {'name': name, 'group': 'any'})
+
+        url = reverse('recipe-fridge-match')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(['Soy Chicken', 'Oyakodon', 'Trung duc thit'], [r['name'] for r in response.data])
+        first = response.data[0]
+        self.assertEqual(100, first['accuracy'])
+        self.assertEqual(['chicken thighs', 'soy sauce'], first['matched'])
+        self.assertEqual([], first['missing'])
+        self.assertEqual(42, response.data[1]['accuracy'])
+        self.assertIn({'name': 'mirin', 'quantity': '2 tbsp'}, response.data[1]['missing'])
+
+        response = self.client.get(url, {'limit': 1})
+        self.assertEqual(1, len(response.data))
+        response = self.client.get(url, {'limit': 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_get_recipe_by_search_and_order_filter(self):
         self.postRecipes(0,3)
         url = reverse('recipe-view-create-destroy')
@@ -173,4 +381,488 @@ class RecipeTests(AuthenticatedAPITestCase):
         self.assertEqual(first['name'], 'Oyakodon')
         self.assertEqual(response.data[1]['name'], 'Soy Chicken')
 
-                
\ No newline at end of file
+                
+
+class FakeGeminiClient:
+    """Stands in for genai.Client, answers every call with the same recipe"""
+    def __init__(self, recipe=None, delay=0):
+        self.recipe = recipe or {"name": "Gyudon", "meat_type": "Beef", "ingredients": []}
+        self.delay = delay
+        self.calls = []
+        self.models = self
+        self.aio = SimpleNamespace(models=SimpleNamespace(generate_content=self.agenerate_content))
+
+    def response(self):
+        part = SimpleNamespace(text=json.dumps(self.recipe))
+        return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+    def delay_for(self, contents):
+        return self.delay
+
+    def generate_content(self, model, contents, config):
+        self.calls.append(contents)
+        delay = self.delay_for(contents)
+        timeout = config.http_options.timeout / 1000 if config and config.http_options else None
+        if timeout is not None and delay > timeout:
+            # What the SDK's httpx transport does once the request timeout is over
+            time.sleep(timeout)
+            raise httpx.ReadTimeout("timed out")
+        time.sleep(delay)
+        return self.response()
+
+    async def agenerate_content(self, model, contents, config):
+        self.calls.append(contents)
+        await asyncio.sleep(self.delay)
+        return self.response()
+
+
+class GeminiExtractionTests(AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.token = self.register_and_authenticate()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.token)
+        self.fake = FakeGeminiClient()
+        gemini.set_client_factory(lambda: self.fake)
+        extraction.recipe_cache.clear()
+        self.addCleanup(gemini.set_client_factory, gemini.default_client_factory)
+
+    def test_normalize_url(self):
+        self.assertEqual(
+            'https://www.justonecookbook.com/gyudon/?page=2',
+            extraction.normalize_url('HTTPS://www.JustOneCookbook.com:443/gyudon/?utm_source=x&page=2&fbclid=abc#recipe')
+        )
+        self.assertEqual('http://example.com/', extraction.normalize_url('http://example.com'))
+        with self.assertRaises(extraction.InvalidURL):
+            extraction.normalize_url('https://example.com:99999/pho')
+
+    def test_invalid_port_is_a_bad_request(self):
+        response = self.client.post(reverse('generate-recipe-from-url'), {'url': 'https://example.com:port/pho'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(reverse('generate-recipe-job-create'), {'url': 'https://example.com:99999/pho'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(reverse('generate-recipe-batch-import'), {'urls': ['https://example.com:99999/pho']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual('failed', response.data['results'][0]['status'])
+        self.assertIn('Invalid url', response.data['results'][0]['error'])
+        self.assertEqual([], self.fake.calls)
+
+    def test_generated_recipe_is_cached_by_normalized_url(self):
+        url = reverse('generate-recipe-from-url')
+        response = self.client.post(url, {'url': 'https://www.justonecookbook.com/gyudon/?utm_source=pinterest'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual('Gyudon', response.data['name'])
+
+        response = self.client.post(url, {'url': 'https://www.justonecookbook.com/gyudon/'})
+        self.assertEqual('Gyudon', response.data['name'])
+        self.assertEqual(1, len(self.fake.calls))
+
+    def test_extraction_cache_expires_and_evicts(self):
+        now = [0]
+        cache = extraction.ExtractionCache(maxsize=2, ttl=10, timer=lambda: now[0])
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        # b was the least recently used
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(1, cache.get('a'))
+        now[0] = 11
+        self.assertIsNone(cache.get('a'))
+
+    def test_batch_import_creates_recipes(self):
+        self.fake.recipe = dict(recipes[1], name="Gyudon")
+        self.fake.delay = 0.3
+        broken = FakeGeminiClient(recipe={"name": "Broken"})
+        urls = [f'https://example.com/recipe-{i}' for i in range(5)]
+
+        original_extract = gemini.getRecipeFromURL
+        def getRecipeFromURL(url, timeout=None):
+            if url.endswith('broken'):
+                return broken.generate_content(None, url, None)
+            return original_extract(url, timeout)
+        gemini.getRecipeFromURL = getRecipeFromURL
+        self.addCleanup(setattr, gemini, 'getRecipeFromURL', original_extract)
+
+        started = time.monotonic()
+        response = self.client.post(reverse('generate-recipe-batch-import'), {'urls': urls + ['https://example.com/broken']}, format='json')
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual(['created'] * 5 + ['failed'], [r['status'] for r in results])
+        self.assertIn('longevity', results[-1]['error'])
+        self.assertEqual('Gyudon', results[0]['recipe']['name'])
+        self.assertEqual(5, Recipe.objects.filter(user__username=self.username, name='Gyudon').count())
+        # Extractions overlap, so the batch costs about one upstream call
+        self.assertLess(elapsed, 0.3 * 3)
+
+    def test_batch_import_reports_timed_out_urls(self):
+        class SlowPage(FakeGeminiClient):
+            def delay_for(self, contents):
+                return 5 if 'example.com/slow' in str(contents) else 0
+
+        fake = SlowPage(recipe=dict(recipes[1], name="Gyudon"))
+        gemini.set_client_factory(lambda: fake)
+        started = time.monotonic()
+        with mock.patch('recipes.views.GeminiBatchImport.timeout', 0.2):
+            response = self.client.post(
+                reverse('generate-recipe-batch-import'),
+                {'urls': ['https://example.com/recipe', 'https://example.com/slow']}, format='json'
+            )
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual(['created', 'failed'], [r['status'] for r in results])
+        self.assertIn('took longer than 0.2s', results[1]['error'])
+        # The slow page doesn't hold the batch for its full 5s
+        self.assertLess(elapsed, 2)
+
+    def test_batch_import_rejects_bad_payload(self):
+        url = reverse('generate-recipe-batch-import')
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, self.client.post(url, {}, format='json').status_code)
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, self.client.post(url, {'urls': 'https://example.com'}, format='json').status_code)
+
+    def test_concurrent_extractions_share_one_upstream_call(self):
+        self.fake.delay = 0.2
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(extraction.extract_recipe('https://example.com/pho')))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(5, len(results))
+        self.assertEqual(1, len(self.fake.calls))
+
+
+class GeminiJobTests(AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.token = self.register_and_authenticate()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.token)
+        self.calls = []
+        self.failures = 0
+        self.queue = jobs.ExtractionJobQueue(
+            extractor=self.stub_extractor, max_attempts=3, timeout=1, backoff=0,
+            rate_limit=3, sleep=lambda seconds: None
+        )
+        jobs.set_job_queue(self.queue)
+        self.addCleanup(jobs.set_job_queue, None)
+
+    def stub_extractor(self, url, timeout=None):
+        self.calls.append(url)
+        if len(self.calls) <= self.failures:
+            raise ConnectionError("upstream down")
+        return {"name": "Pho", "url": url}
+
+    def submit(self, url='https://example.com/pho'):
+        response = self.client.post(reverse('generate-recipe-job-create'), {'url': url})
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.queue.wait(response.data['id'], timeout=5)
+        return self.client.get(reverse('generate-recipe-job-retrieve', args=[response.data['id']]))
+
+    def test_job_returns_recipe(self):
+        response = self.submit()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual('succeeded', response.data['status'])
+        self.assertEqual('Pho', response.data['result']['name'])
+
+    def test_job_retries_with_backoff(self):
+        self.failures = 2
+        saved = []
+        save = self.queue._save
+        self.queue._save = lambda job: (saved.append(dict(job)), save(job))
+        response = self.submit()
+        self.assertEqual('succeeded', response.data['status'])
+        self.assertEqual(3, response.data['attempts'])
+        self.assertNotIn('progress', response.data)
+
+        # Pollers see when the running attempt times out and when the next one starts
+        running = [job['progress'] for job in saved if job['status'] == 'running']
+        retrying = [job['progress'] for job in saved if job['status'] == 'retrying']
+        self.assertEqual(3, len(running))
+        self.assertTrue(all(progress['deadline'] is not None for progress in running))
+        self.assertEqual(2, len(retrying))
+        self.assertTrue(all(progress['retry_at'] is not None for progress in retrying))
+
+    def test_job_fails_after_max_attempts(self):
+        self.failures = 3
+        response = self.submit()
+        self.assertEqual('failed', response.data['status'])
+        self.assertEqual('upstream down', response.data['error'])
+        self.assertNotIn('result', response.data)
+
+    def test_job_retries_only_transient_errors(self):
+        errors = []
+        def extractor(url, timeout=None):
+            error = errors.pop(0) if errors else None
+            if error is not None:
+                raise error
+            return {"name": "Pho", "url": url}
+        self.queue.extractor = extractor
+
+        errors[:] = [genai_errors.ServerError(503, {"error": {"message": "overloaded", "status": "UNAVAILABLE"}}),
+                     genai_errors.ClientError(429, {"error": {"message": "quota", "status": "RESOURCE_EXHAUSTED"}})]
+        response = self.submit()
+        self.assertEqual('succeeded', response.data['status'])
+        self.assertEqual(3, response.data['attempts'])
+
+        # A rejected request or an unparseable page isn't retried
+        for error in [genai_errors.ClientError(400, {"error": {"message": "bad url", "status": "INVALID_ARGUMENT"}}),
+                      ValueError("Expecting value")]:
+            errors[:] = [error]
+            response = self.submit()
+            self.assertEqual('failed', response.data['status'])
+            self.assertEqual(1, response.data['attempts'])
+
+    def test_job_cache_must_be_shared_in_deployment(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache'}}
+        with self.settings(CACHES=locmem):
+            self.assertEqual(['recipes.E001'], [error.id for error in check_shared_job_cache(None)])
+        with self.settings(CACHES=redis):
+            self.assertEqual([], check_shared_job_cache(None))
+
+    def test_job_times_out(self):
+        fake = FakeGeminiClient(delay=0.5)
+        gemini.set_client_factory(lambda: fake)
+        self.addCleanup(gemini.set_client_factory, gemini.default_client_factory)
+        extraction.recipe_cache.clear()
+        self.queue.max_attempts = 2
+        self.queue.timeout = 0.05
+        self.queue.extractor = extraction.extract_recipe
+        started = time.monotonic()
+        response = self.submit()
+        self.assertEqual('failed', response.data['status'])
+        self.assertIn('longer than', response.data['error'])
+        # Each attempt's upstream call is aborted, the retry makes a new one
+        self.assertEqual(2, len(fake.calls))
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_single_flight_waiters_drop_a_hung_call(self):
+        flight = extraction.SingleFlight()
+        release = threading.Event()
+        leader = threading.Thread(target=lambda: flight.do('pho', lambda: release.wait(5)))
+        leader.start()
+        self.addCleanup(leader.join)
+        self.addCleanup(release.set)
+        while 'pho' not in flight._calls:
+            time.sleep(0.01)
+
+        with self.assertRaises(TimeoutError):
+            flight.do('pho', lambda: 'joined', timeout=0.05)
+        self.assertEqual('fresh', flight.do('pho', lambda: 'fresh', timeout=0.05))
+
+    def test_job_rate_limit(self):
+        for _ in range(3):
+            self.submit()
+        response = self.client.post(reverse('generate-recipe-job-create'), {'url': 'https://example.com/pho'})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_job_from_another_user(self):
+        job_id = self.submit().data['id']
+        second_token = self.register_and_authenticate(test_user_number=2)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + second_token)
+        response = self.client.get(reverse('generate-recipe-job-retrieve', args=[job_id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(ROOT_URLCONF='ocipe.urls_asgi')
+class AsyncRecipeViewTests(AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.token = self.register_and_authenticate()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.token)
+        self.headers = {'Authorization': 'Bearer ' + self.token}
+        self.fake = FakeGeminiClient(delay=0.2)
+        gemini.set_client_factory(lambda: self.fake)
+        extraction.recipe_cache.clear()
+        self.addCleanup(gemini.set_client_factory, gemini.default_client_factory)
+
+    async def test_extractions_wait_on_the_event_loop(self):
+        url = reverse('generate-recipe-from-url')
+        started = time.monotonic()
+        responses = await asyncio.gather(*[
+            self.async_client.post(url, {'url': f'https://example.com/recipe-{i % 4}'}, content_type='application/json', headers=self.headers)
+            for i in range(8)
+        ])
+        elapsed = time.monotonic() - started
+
+        self.assertEqual([status.HTTP_200_OK] * 8, [response.status_code for response in responses])
+        self.assertEqual('Gyudon', responses[0].json()['name'])
+        # Four distinct pages, each fetched once, all of them at the same time
+        self.assertEqual(4, len(self.fake.calls))
+        self.assertLess(elapsed, 0.2 * 3)
+
+        response = await self.async_client.post(url, {}, content_type='application/json', headers=self.headers)
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        response = await self.async_client.post(url, {'url': 'https://example.com/recipe-0'})
+        self.assertEqual(status.HTTP_401_UNAUTHORIZED, response.status_code)
+
+    def test_recipe_list_matches_sync_view(self):
+        for recipe in recipes[:2]:
+            self.client.post(reverse('recipe-view-create-destroy'), recipe, format='json')
+        url = reverse('recipe-view-create-destroy')
+        with self.settings(ROOT_URLCONF='ocipe.urls'):
+            expected = self.client.get(url)
+
+        response = async_to_sync(self.async_client.get)(url, headers=self.headers)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(json.loads(json.dumps(expected.data)), response.json())
+        self.assertEqual(expected['ETag'], response['ETag'])
+
+        response = async_to_sync(self.async_client.get)(url, headers={**self.headers, 'If-None-Match': response['ETag']})
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+        # Query strings and writes go through RecipeListCreate
+        response = async_to_sync(self.async_client.get)(url, {'fields': 'name'}, headers=self.headers)
+        self.assertEqual({'id', 'name'}, set(response.json()[0]))
+        response = self.client.post(url, recipes[2], format='json')
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+
+
+    def test_authentication_follows_drf_settings(self):
+        url = reverse('recipe-view-create-destroy')
+        # JWT_STATELESS=false: the User is loaded, as in the sync views
+        with mock.patch.object(AsyncAPIView, 'authentication_classes', [JWTAuthentication]):
+            with CaptureQueriesContext(connection) as queries:
+                response = async_to_sync(self.async_client.get)(url, headers=self.headers)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            self.assertTrue(any('"auth_user"' in query['sql'] for query in queries))
+
+            response = async_to_sync(self.async_client.get)(url)
+            self.assertEqual(status.HTTP_401_UNAUTHORIZED, response.status_code)
+            self.assertEqual('Bearer realm="api"', response['WWW-Authenticate'])
+
+
+class ReplicaRoutingTests(ReplicaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.token = self.register_and_authenticate()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.token)
+        self.user_id = User.objects.get(username=self.username).id
+
+    def test_reads_use_replica_unless_user_just_wrote(self):
+        url = reverse('recipe-view-create-destroy')
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            response = self.client.get(url)
+        self.assertEqual([], response.data)
+        self.assertGreater(len(replica_queries), 0)
+
+        # Read-your-writes: the replica hasn't got the recipe yet, the pinned user reads the primary
+        response = self.client.post(url, recipes[0], format='json')
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        self.assertTrue(routers.is_pinned(self.user_id))
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            self.assertEqual(1, len(self.client.get(url).data))
+        self.assertEqual(0, len(replica_queries))
+
+        # Once the pin expires reads go back to the replica, stale until it catches up
+        cache.delete(routers._pin_key(self.user_id))
+        self.assertEqual(0, len(self.client.get(url).data))
+        self.replicate(User, Ingredient, Recipe, RecipeIngredient)
+        self.assertEqual(recipes[0]['name'], self.client.get(url).data[0]['name'])
+
+    def test_versioned_results_are_not_read_from_a_lagging_replica(self):
+        url = reverse('recipe-view-create-destroy')
+        self.assertEqual(status.HTTP_201_CREATED, self.client.post(url, recipes[0], format='json').status_code)
+        # The pin expired before the replica caught up
+        cache.delete(routers._pin_key(self.user_id))
+
+        response = self.client.get(reverse('get-recipe-nerd-stats'))
+        self.assertEqual(1, sum(row['total'] for row in response.data['meat_type_stats']))
+        # The stale list is served, but without an ETag that would outlive the lag
+        response = self.client.get(url)
+        self.assertEqual(0, len(response.data))
+        self.assertNotIn('ETag', response)
+
+        self.replicate(User, Ingredient, Recipe, RecipeIngredient)
+        response = self.client.get(url)
+        self.assertEqual(1, len(response.data))
+        self.assertNotIn('ETag', response)
+        # The primary's answer is tagged, and revalidates without a query
+        routers.pin_to_primary(self.user_id)
+        etag = self.client.get(url)['ETag']
+        cache.delete(routers._pin_key(self.user_id))
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code)
+
+    def test_failed_authentication_does_not_pin(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.token[:-2] + 'xx')
+        response = self.client.post(reverse('recipe-view-create-destroy'), recipes[0], format='json')
+        self.assertEqual(status.HTTP_401_UNAUTHORIZED, response.status_code)
+        self.assertFalse(routers.is_pinned(self.user_id))
+
+
+class RecipeQueryBudgetTests(QueryBudgetTestCase):
+    urlconf = 'recipes.urls'
+
+    def setUp(self):
+        super().setUp()
+        self.fake = FakeGeminiClient(recipe=dict(recipes[2], name="Gyudon"))
+        gemini.set_client_factory(lambda: self.fake)
+        extraction.recipe_cache.clear()
+        self.addCleanup(gemini.set_client_factory, gemini.default_client_factory)
+        self.queue = jobs.ExtractionJobQueue(extractor=lambda url, timeout: {"name": "Pho", "url": url}, backoff=0)
+        jobs.set_job_queue(self.queue)
+        self.addCleanup(jobs.set_job_queue, None)
+
+    def test_every_route_has_a_budget(self):
+        self.assertEveryRouteBudgeted()
+
+    def test_budget_recipe_view_create_destroy(self):
+        url = reverse('recipe-view-create-destroy')
+        self.assertConstantQueries(lambda account: self.client.get(url))
+        self.assertConstantQueries(lambda account: self.client.get(url, {'ingredients': 'egg,mirin', 'ordering': '-added_date'}))
+        self.assertConstantQueries(lambda account: self.client.get(url, {'page_size': 20, 'fields': 'name,ingredient_list'}))
+        self.assertConstantQueries(lambda account: self.client.post(url, recipes[2], format='json'))
+        self.assertConstantQueries(lambda account: self.client.delete(url), batched=['DELETE FROM'])
+
+    def test_budget_recipe_bulk_create(self):
+        url = reverse('recipe-bulk-create')
+        self.assertConstantQueries(lambda account: self.client.post(url, {'list': recipes}, format='json'))
+
+    def test_budget_recipe_view_retrieve_update_destroy(self):
+        url = lambda account: reverse('recipe-view-retrieve-update-destroy', args=[account.recipe_ids[0]])
+        self.assertConstantQueries(lambda account: self.client.get(url(account)))
+        self.assertConstantQueries(lambda account: self.client.put(url(account), recipes[1], format='json'))
+        self.assertConstantQueries(lambda account: self.client.patch(url(account), {'state': 'used'}, format='json'))
+        self.assertConstantQueries(lambda account: self.client.delete(url(account)))
+
+    def test_budget_recipe_fridge_match(self):
+        url = reverse('recipe-fridge-match')
+        self.assertConstantQueries(lambda account: self.client.get(url))
+        self.assertConstantQueries(lambda account: self.client.get(url, {'limit': 5}))
+
+    def test_budget_get_recipe_nerd_stats(self):
+        url = reverse('get-recipe-nerd-stats')
+        self.assertConstantQueries(lambda account: self.client.get(url))
+
+    def test_budget_generate_recipe_from_url(self):
+        url = reverse('generate-recipe-from-url')
+        self.assertConstantQueries(lambda account: self.client.post(url, {'url': 'https://example.com/gyudon'}))
+
+    def test_budget_generate_recipe_batch_import(self):
+        url = reverse('generate-recipe-batch-import')
+        urls = [f'https://example.com/recipe-{i}' for i in range(3)]
+        self.assertConstantQueries(lambda account: self.client.post(url, {'urls': urls}, format='json'))
+
+    def test_budget_generate_recipe_job_create(self):
+        url = reverse('generate-recipe-job-create')
+        self.assertConstantQueries(lambda account: self.client.post(url, {'url': 'https://example.com/pho'}))
+
+    def test_budget_generate_recipe_job_retrieve(self):
+        def submit(account):
+            job = self.queue.submit(account.user.id, 'https://example.com/pho')
+            self.queue.wait(job['id'], timeout=5)
+            return job['id']
+        self.assertConstantQueries(
+            lambda account, job_id: self.client.get(reverse('generate-recipe-job-retrieve', args=[job_id])),
+            prepare=submit,
+        )
+
+    def test_budget_refresh_all_recipes_state(self):
+        url = reverse('refresh-all-recipes-state')
+        self.assertConstantQueries(lambda account: self.client.post(url))
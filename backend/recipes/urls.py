@@ -7,8 +7,13 @@ urlpatterns = [
     path('bulk/', views.RecipeBulkCreate.as_view(), name="recipe-bulk-create"),
     # Specific recipes
     path('<int:pk>/', views.SingleRecipeListRetrieveUpdateDestroy.as_view(), name="recipe-view-retrieve-update-destroy"),
+    # Active recipes ranked against the fridge
+    path('fridge/', views.RecipeFridgeMatchList.as_view(), name="recipe-fridge-match"),
     # Random any active recipe
     path('stats/', views.RecipeStatRetrieve.as_view(), name="get-recipe-nerd-stats"),
     path('genai/', views.GeminiURLAPIView.as_view(), name="generate-recipe-from-url"),
+    path('genai/batch/', views.GeminiBatchImport.as_view(), name="generate-recipe-batch-import"),
+    path('genai/jobs/', views.GeminiJobCreate.as_view(), name="generate-recipe-job-create"),
+    path('genai/jobs/<str:job_id>/', views.GeminiJobRetrieve.as_view(), name="generate-recipe-job-retrieve"),
     path('refresh/', views.RefreshRecipesView.as_view(), name="refresh-all-recipes-state")
 ]
\ No newline at end of file
@@ -6,13 +6,25 @@ from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
 
 from .models import Recipe
-from .serializers import RecipeSerializer
+from .serializers import RecipeSerializer, FridgeMatchRecipeSerializer
 from .filters import RecipeFilter
-from django.db.models import Count, Q
-from .gemini import getRecipeFromURL
+from .pagination import RecipeCursorPagination, RecipeRankPagination
+from fridge.models import FridgeIngredient
+from django.db.models import Count, Q, F, ExpressionWrapper, IntegerField
+from .extraction import extract_recipe, aextract_recipe, extract_many, normalize_url, InvalidURL
+from .bulk import create_recipes, delete_recipes
+from .jobs import get_job_queue, RateLimitExceeded, QueueFull
+from django.core.cache import cache
+from django.db import transaction
+from ocipe.cache import bump_version, versioned_key, conditional_get, async_conditional_get
+from ocipe.asyncviews import AsyncAPIView, request_data
+from ocipe.routers import primary_reads
+from django.http import JsonResponse
+from sync.changes import record_changes
+from sync.models import RECIPE
 
+import os
 import random
-import json
 
 from urllib.parse import urlparse
 from rest_framework.exceptions import ValidationError
@@ -28,16 +40,40 @@ class RecipeListCreate(generics.ListCreateAPIView):
         filters.OrderingFilter
     ]
     ordering_fields = ['added_date'] #Will have frequency..
+    pagination_class = RecipeCursorPagination
+    # Model columns a sparse fieldset can leave out of the SELECT
+    deferrable_fields = {'name', 'meat_type', 'longevity', 'frequency', 'note', 'state'}
 
     def get_queryset(self):
-        return Recipe.objects.filter(user=self.request.user)
+        queryset = Recipe.objects.filter(user_id=self.request.user.id)
+        fields = RecipeSerializer.sparse_fields(self.request)
+        if fields is None:
+            # Prefetch is kept through RecipeFilter's ingredient search annotation
+            return queryset.with_ingredient_list()
+
+        # added_date stays loaded for the pagination cursor
+        queryset = queryset.only('id', 'added_date', *(fields & self.deferrable_fields))
+        if 'ingredient_list' in fields:
+            queryset = queryset.with_ingredient_list()
+        return queryset
+
+    @property
+    def paginator(self):
+        # An ingredient search is ranked by matched_count, the cursor would re-sort it by date
+        if not hasattr(self, '_paginator') and self.request.query_params.get('ingredients'):
+            self._paginator = RecipeRankPagination()
+        return super().paginator
+
+    @conditional_get('recipes')
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
     
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        serializer.save(user_id=self.request.user.id)
 
     # DELETE
     def delete(self, request, *args, **kwargs):
-        Recipe.objects.filter(user=request.user).delete()
+        delete_recipes(request.user.id, Recipe.objects.filter(user_id=request.user.id))
         return Response(status=status.HTTP_204_NO_CONTENT)
     
 class RecipeBulkCreate(APIView):
@@ -56,7 +92,7 @@ class RecipeBulkCreate(APIView):
 
         serializer = RecipeSerializer(data=recipeList, many=True)
         if serializer.is_valid():
-            serializer.save(user=request.user)  # pass user to each recipe
+            serializer.save(user_id=request.user.id)  # pass user to each recipe
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -68,19 +104,84 @@ class SingleRecipeListRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIVie
     lookup_field = "pk"
 
     def get_queryset(self):
-        return Recipe.objects.filter(user=self.request.user)
+        return Recipe.objects.filter(user_id=self.request.user.id).with_ingredient_list()
+
+    def perform_destroy(self, instance):
+        delete_recipes(self.request.user.id, Recipe.objects.filter(pk=instance.pk))
+
+# GET active recipes ranked by how much of them is already in the fridge
+class RecipeFridgeMatchList(generics.ListAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = FridgeMatchRecipeSerializer
+
+    def get_limit(self):
+        limit = self.request.query_params.get('limit')
+        if limit is None:
+            return None
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValidationError({"limit": "Must be a positive integer."})
+        if limit < 1:
+            raise ValidationError({"limit": "Must be a positive integer."})
+        return limit
+
+    def get_fridge_ingredient_ids(self):
+        if not hasattr(self, '_fridge_ingredient_ids'):
+            self._fridge_ingredient_ids = set(
+                FridgeIngredient.objects.filter(fridge__user_id=self.request.user.id).values_list('ingredient_id', flat=True)
+            )
+        return self._fridge_ingredient_ids
+
+    def get_queryset(self):
+        in_fridge = FridgeIngredient.objects.filter(fridge__user_id=self.request.user.id).values('ingredient')
+        # Ranking happens in one aggregate query, only the top rows get their ingredients loaded
+        queryset = Recipe.objects.filter(
+            user_id=self.request.user.id, state='active', ingredient_count__gt=0
+        ).annotate(
+            fridge_matches=Count(
+                'recipeingredient__ingredient',
+                filter=Q(recipeingredient__ingredient__in=in_fridge),
+                distinct=True
+            )
+        ).annotate(
+            matched_count=ExpressionWrapper(
+                F('fridge_matches') * 100 / F('ingredient_count'),
+                output_field=IntegerField()
+            )
+        ).order_by('-matched_count', '-fridge_matches', 'id').with_ingredient_list()
+
+        limit = self.get_limit()
+        if limit is not None:
+            queryset = queryset[:limit]
+        return queryset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fridge_ingredient_ids'] = self.get_fridge_ingredient_ids()
+        return context
 
 # Get stats
+STATS_CACHE_TIMEOUT = 60 * 60 * 24
+
 class RecipeStatRetrieve(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = RecipeSerializer
 
     def get_queryset(self):
-        return Recipe.objects.filter(user=self.request.user)
+        return Recipe.objects.filter(user_id=self.request.user.id)
     
     def get(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
+        # Cached until the user's recipes version is bumped by a write
+        cache_key = versioned_key('recipes', request.user.id, 'stats')
+        stats = cache.get(cache_key)
+        if stats is None:
+            with primary_reads():
+                stats = self.compute_stats(self.get_queryset())
+            cache.set(cache_key, stats, STATS_CACHE_TIMEOUT)
+        return Response(stats)
 
+    def compute_stats(self, queryset):
         meat_stats = (
             queryset
             .values('meat_type')
@@ -99,10 +200,10 @@ class RecipeStatRetrieve(generics.RetrieveAPIView):
             )
         )
 
-        return Response({
+        return {
             "meat_type_stats": list(meat_stats),
             "frequency_stats": list(frequency_stats),
-        })
+        }
 
 
 class GeminiURLAPIView(APIView):
@@ -113,14 +214,134 @@ class GeminiURLAPIView(APIView):
         if not url:
             return Response({"error": "Missing url in request body"}, status=status.HTTP_400_BAD_REQUEST)
 
-        response = getRecipeFromURL(url)
-        json_data = json.loads(response.candidates[0].content.parts[0].text)
-        return Response(json_data)
+        try:
+            return Response(extract_recipe(url))
+        except InvalidURL as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+# POST many URLs: extract them concurrently, then create the valid recipes in one bulk write
+class GeminiBatchImport(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    max_urls = 50
+    max_workers = 8
+    # Per URL, a slow page fails on its own instead of holding the whole batch
+    timeout = int(os.getenv('GEMINI_BATCH_TIMEOUT', 30))
+
+    def post(self, request):
+        urls = request.data.get('urls')
+        if not urls:
+            return Response({"error": "Missing urls in request body"}, status=status.HTTP_400_BAD_REQUEST)
+        elif not isinstance(urls, list) or not all(isinstance(url, str) and url for url in urls):
+            return Response({"detail": "Expected a list of urls."}, status=status.HTTP_400_BAD_REQUEST)
+        elif len(urls) > self.max_urls:
+            return Response({"detail": f"At most {self.max_urls} urls per batch."}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = []
+        valid = []
+        for url, recipe_data, error in extract_many(urls, self.max_workers, self.timeout):
+            if error is not None:
+                results.append({"url": url, "status": "failed", "error": error})
+                continue
+            serializer = RecipeSerializer(data=recipe_data)
+            if not serializer.is_valid():
+                results.append({"url": url, "status": "failed", "error": serializer.errors})
+                continue
+            result = {"url": url, "status": "created"}
+            results.append(result)
+            valid.append((result, serializer.validated_data))
+
+        recipes = create_recipes(request.user.id, [data for _, data in valid]) if valid else []
+        for (result, _), recipe in zip(valid, recipes):
+            result['recipe'] = RecipeSerializer(recipe).data
+
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+
+def job_representation(job):
+    rep = {
+        "id": job['id'],
+        "url": job['url'],
+        "status": job['status'],
+        "attempts": job['attempts'],
+        "max_attempts": job['max_attempts'],
+    }
+    if job['result'] is not None:
+        rep['result'] = job['result']
+    if job['error'] is not None:
+        rep['error'] = job['error']
+    if job.get('progress') is not None:
+        rep['progress'] = job['progress']
+    return rep
+
+# POST an extraction job, answered right away with its id
+class GeminiJobCreate(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        url = request.data.get('url')
+        if not url:
+            return Response({"error": "Missing url in request body"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            normalize_url(url)
+        except InvalidURL as error:
+            # Rejected here, retrying it in the queue would fail the same way
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            job = get_job_queue().submit(request.user.id, url)
+        except RateLimitExceeded:
+            return Response({"error": "Too many extraction requests, try again later"}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+        except QueueFull:
+            return Response({"error": "Extraction queue is full, try again later"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(job_representation(job), status=status.HTTP_202_ACCEPTED)
+
+# GET job status and, once done, the recipe
+class GeminiJobRetrieve(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, job_id):
+        job = get_job_queue().get(job_id, request.user.id)
+        if job is None:
+            return Response({"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job_representation(job))
 
 
 class RefreshRecipesView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request):
-        updated = Recipe.objects.filter(user=request.user).update(state='active')
-        return Response({"updated_count": updated}, status=status.HTTP_200_OK)
\ No newline at end of file
+        with transaction.atomic():
+            recipe_ids = list(Recipe.objects.filter(user_id=request.user.id).values_list('id', flat=True))
+            updated = Recipe.objects.filter(id__in=recipe_ids).update(state='active')
+            record_changes(request.user.id, RECIPE, upserts=recipe_ids)
+            bump_version('recipes', request.user.id)
+        return Response({"updated_count": updated}, status=status.HTTP_200_OK)
+
+
+# ASGI mode (ocipe/urls_asgi.py): GET of the plain recipe list, filtered, ordered,
+# paginated and sparse reads stay on RecipeListCreate
+class AsyncRecipeList(AsyncAPIView):
+    sync_view = RecipeListCreate
+
+    def handles(self, request):
+        return not request.GET
+
+    @async_conditional_get('recipes')
+    async def get(self, request):
+        queryset = Recipe.objects.filter(user_id=request.user.id).with_ingredient_list()
+        recipes = [recipe async for recipe in queryset]
+        return JsonResponse(RecipeSerializer(recipes, many=True).data, safe=False)
+
+
+# ASGI mode: waits on Gemini without holding a worker
+class AsyncGeminiURLView(AsyncAPIView):
+    async def post(self, request):
+        url = request_data(request).get('url')
+        if not url:
+            return JsonResponse({"error": "Missing url in request body"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            return JsonResponse(await aextract_recipe(url))
+        except InvalidURL as error:
+            return JsonResponse({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
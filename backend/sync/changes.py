@@ -0,0 +1,65 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef
+from django.utils import timezone
+
+from .models import ChangeLogEntry, SyncHorizon
+
+TOMBSTONE_TTL = timedelta(days=30)
+
+def record_changes(user_id, model, upserts=(), deletes=()):
+    """
+    Append upserts and tombstones for one tracked model to the user's change log in one insert.
+    Call it in the transaction of the change: the user's SyncHorizon row stays locked until
+    it commits, so a later token can't become visible before an earlier one.
+    """
+    entries = [
+        ChangeLogEntry(user_id=user_id, model=model, object_id=object_id)
+        for object_id in dict.fromkeys(upserts)
+    ] + [
+        ChangeLogEntry(user_id=user_id, model=model, object_id=object_id, deleted=True)
+        for object_id in dict.fromkeys(deletes)
+    ]
+    if not entries:
+        return
+    with transaction.atomic():
+        state, _ = SyncHorizon.objects.select_for_update().get_or_create(user_id=user_id)
+        for seq, entry in enumerate(entries, start=state.last_seq + 1):
+            entry.seq = seq
+        SyncHorizon.objects.filter(pk=state.pk).update(last_seq=entries[-1].seq)
+        ChangeLogEntry.objects.bulk_create(entries)
+
+def horizon_token(user_id):
+    return SyncHorizon.objects.filter(user_id=user_id).values_list('token', flat=True).first() or 0
+
+@transaction.atomic
+def compact_change_log(tombstone_ttl=TOMBSTONE_TTL, now=None):
+    """
+    Keep only the latest entry per object, then drop tombstones older than tombstone_ttl.
+    Every live object keeps its upsert, so a full sync from 0 stays complete; clients
+    holding a token from before a dropped tombstone get a resync instead.
+    Returns (superseded, expired) row counts.
+    """
+    later = ChangeLogEntry.objects.filter(
+        user_id=OuterRef('user_id'), model=OuterRef('model'),
+        object_id=OuterRef('object_id'), seq__gt=OuterRef('seq'),
+    )
+    superseded, _ = ChangeLogEntry.objects.filter(Exists(later)).delete()
+
+    cutoff = (now or timezone.now()) - tombstone_ttl
+    expired = ChangeLogEntry.objects.filter(deleted=True, created_at__lt=cutoff)
+    horizons = dict(expired.values('user_id').annotate(token=Max('seq')).values_list('user_id', 'token'))
+    if not horizons:
+        return superseded, 0
+
+    existing = {horizon.user_id: horizon for horizon in SyncHorizon.objects.filter(user_id__in=horizons)}
+    for horizon in existing.values():
+        horizon.token = max(horizon.token, horizons[horizon.user_id])
+    SyncHorizon.objects.bulk_update(existing.values(), ['token'])
+    SyncHorizon.objects.bulk_create([
+        SyncHorizon(user_id=user_id, token=token)
+        for user_id, token in horizons.items() if user_id not in existing
+    ])
+    expired_count, _ = expired.delete()
+    return superseded, expired_count
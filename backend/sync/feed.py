@@ -0,0 +1,61 @@
+from recipes.models import Recipe, RecipeIngredient
+from recipes.serializers import RecipeSerializer
+from fridge.models import FridgeIngredient
+from grocery.models import GroceryListItem, History
+from .models import ChangeLogEntry, TRACKED_MODELS, RECIPE, RECIPE_INGREDIENT, FRIDGE_INGREDIENT, GROCERY_LIST_ITEM, HISTORY
+from .serializers import (
+    RecipeIngredientSyncSerializer, FridgeIngredientSyncSerializer,
+    GroceryListItemSyncSerializer, HistorySyncSerializer,
+)
+
+# Per tracked model: the user's rows and how a client receives them
+SOURCES = {
+    RECIPE: (lambda user_id: Recipe.objects.filter(user_id=user_id).with_ingredient_list(), RecipeSerializer),
+    RECIPE_INGREDIENT: (
+        lambda user_id: RecipeIngredient.objects.filter(recipe__user_id=user_id).select_related('ingredient'),
+        RecipeIngredientSyncSerializer,
+    ),
+    FRIDGE_INGREDIENT: (
+        lambda user_id: FridgeIngredient.objects.filter(fridge__user_id=user_id).select_related('ingredient'),
+        FridgeIngredientSyncSerializer,
+    ),
+    GROCERY_LIST_ITEM: (lambda user_id: GroceryListItem.objects.filter(grocery__user_id=user_id), GroceryListItemSyncSerializer),
+    HISTORY: (lambda user_id: History.objects.filter(user_id=user_id), HistorySyncSerializer),
+}
+
+def changes_since(user_id, since, limit):
+    """
+    Upserts and tombstones recorded after token since, at most limit log entries.
+    One query for the log plus one per model that has upserts.
+    """
+    entries = list(
+        ChangeLogEntry.objects.filter(user_id=user_id, seq__gt=since)
+        .order_by('seq')
+        .values_list('seq', 'model', 'object_id', 'deleted')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    # Later entries for the same object win
+    latest = {(model, object_id): deleted for _, model, object_id, deleted in entries}
+    upserts = {}
+    deletes = {}
+    for (model, object_id), deleted in latest.items():
+        (deletes if deleted else upserts).setdefault(model, []).append(object_id)
+
+    changes = {}
+    for model, _ in TRACKED_MODELS:
+        if model not in upserts and model not in deletes:
+            continue
+        rows = []
+        if model in upserts:
+            queryset, serializer_class = SOURCES[model]
+            # Rows deleted since come through as a tombstone on a later page
+            rows = serializer_class(queryset(user_id).filter(id__in=upserts[model]).order_by('id'), many=True).data
+        changes[model] = {"upserts": rows, "deletes": sorted(deletes.get(model, []))}
+
+    return {
+        "token": entries[-1][0] if entries else since,
+        "has_more": has_more,
+        "changes": changes,
+    }
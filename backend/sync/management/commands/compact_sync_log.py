@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from sync.changes import compact_change_log, TOMBSTONE_TTL
+
+
+class Command(BaseCommand):
+    # Nothing runs this on its own, the log grows until it does: schedule it once a day,
+    # e.g. a cron job running `python manage.py compact_sync_log` next to the web service
+    help = (
+        "Drop superseded change log entries and tombstones older than --days. "
+        "Run it daily from a scheduler (cron job), the change log is never compacted otherwise"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=TOMBSTONE_TTL.days, help="Tombstone retention in days")
+
+    def handle(self, *args, **options):
+        superseded, expired = compact_change_log(tombstone_ttl=timedelta(days=options['days']))
+        self.stdout.write(f"Removed {superseded} superseded entries and {expired} expired tombstones")
@@ -0,0 +1,43 @@
+from django.db import migrations
+
+
+def backfill_change_log(apps, schema_editor):
+    # Every existing row gets an upsert, so a sync from 0 returns the whole dataset
+    ChangeLogEntry = apps.get_model('sync', 'ChangeLogEntry')
+    SyncHorizon = apps.get_model('sync', 'SyncHorizon')
+    last_seqs = {}
+
+    def entry(model, object_id, user_id):
+        last_seqs[user_id] = last_seqs.get(user_id, 0) + 1
+        return ChangeLogEntry(user_id=user_id, seq=last_seqs[user_id], model=model, object_id=object_id)
+
+    sources = [
+        ('recipe', apps.get_model('recipes', 'Recipe').objects.values_list('id', 'user_id')),
+        ('recipe_ingredient', apps.get_model('recipes', 'RecipeIngredient').objects.values_list('id', 'recipe__user_id')),
+        ('fridge_ingredient', apps.get_model('fridge', 'FridgeIngredient').objects.values_list('id', 'fridge__user_id')),
+        ('grocery_list_item', apps.get_model('grocery', 'GroceryListItem').objects.values_list('id', 'grocery__user_id')),
+        ('history', apps.get_model('grocery', 'History').objects.values_list('id', 'user_id')),
+    ]
+    for model, rows in sources:
+        ChangeLogEntry.objects.bulk_create(
+            (entry(model, object_id, user_id) for object_id, user_id in rows.order_by('id').iterator()),
+            batch_size=1000,
+        )
+    SyncHorizon.objects.bulk_create(
+        [SyncHorizon(user_id=user_id, last_seq=last_seq) for user_id, last_seq in last_seqs.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sync', '0001_initial'),
+        ('recipes', '0007_recipe_user_added_date_index'),
+        ('fridge', '0002_indexes'),
+        ('grocery', '0004_grocery_list_batch_updates'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_change_log, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+from django.db import models
+from django.contrib.auth.models import User
+
+RECIPE = 'recipe'
+RECIPE_INGREDIENT = 'recipe_ingredient'
+FRIDGE_INGREDIENT = 'fridge_ingredient'
+GROCERY_LIST_ITEM = 'grocery_list_item'
+HISTORY = 'history'
+
+TRACKED_MODELS = [
+    (RECIPE, 'Recipe'),
+    (RECIPE_INGREDIENT, 'Recipe ingredient'),
+    (FRIDGE_INGREDIENT, 'Fridge ingredient'),
+    (GROCERY_LIST_ITEM, 'Grocery list item'),
+    (HISTORY, 'History'),
+]
+
+class ChangeLogEntry(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Sync token: per user, handed out under the SyncHorizon row lock, so entries
+    # commit in token order and a client never skips a late committing one
+    seq = models.BigIntegerField()
+    model = models.CharField(max_length=20, choices=TRACKED_MODELS)
+    object_id = models.BigIntegerField()
+    # Tombstone when True, upsert otherwise
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "model", "object_id"], name="changelog_user_object"),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["user", "seq"], name="changelog_user_seq"),
+        ]
+
+class SyncHorizon(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="sync_horizon")
+    # Highest token compacted away for the user, older tokens need a full resync
+    token = models.BigIntegerField(default=0)
+    # Last token handed out for the user
+    last_seq = models.BigIntegerField(default=0)
@@ -0,0 +1,26 @@
+from rest_framework import serializers
+from recipes.models import RecipeIngredient
+from fridge.models import FridgeIngredient
+from grocery.serializers import HistorySerializer, GroceryListItemSerializer
+
+class RecipeIngredientSyncSerializer(serializers.ModelSerializer):
+    name = serializers.CharField(source='ingredient.name')
+
+    class Meta:
+        model = RecipeIngredient
+        fields = ['id', 'recipe', 'name', 'quantity']
+
+class GroceryListItemSyncSerializer(GroceryListItemSerializer):
+    class Meta(GroceryListItemSerializer.Meta):
+        fields = GroceryListItemSerializer.Meta.fields + ['position']
+
+class HistorySyncSerializer(HistorySerializer):
+    class Meta(HistorySerializer.Meta):
+        fields = ['id'] + HistorySerializer.Meta.fields
+
+class FridgeIngredientSyncSerializer(serializers.ModelSerializer):
+    name = serializers.CharField(source='ingredient.name')
+
+    class Meta:
+        model = FridgeIngredient
+        fields = ['id', 'name', 'group']
@@ -0,0 +1,102 @@
+from datetime import timedelta
+from ocipe.tests import AuthenticatedAPITestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from recipes.test_data import recipes
+from recipes.models import RecipeIngredient
+from .changes import compact_change_log
+from .models import ChangeLogEntry
+from .views import SyncView
+
+class SyncTests(AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.token = self.register_and_authenticate()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.token)
+        self.url = reverse('sync')
+
+    def sync(self, since=0):
+        response = self.client.get(self.url, {'since': since})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_sync_returns_only_changes_since_token(self):
+        recipe_id = self.client.post(reverse('recipe-view-create-destroy'), recipes[0], format='json').data['id']
+        self.client.post(reverse('create-fridge-ingredient'), {'name': 'Chicken', 'group': 'meat'})
+        self.client.post(reverse('grocery-list'), {'items': 'milk\nbread'})
+
+        full = self.sync()
+        self.assertFalse(full['has_more'])
+        self.assertEqual([recipe_id], [r['id'] for r in full['changes']['recipe']['upserts']])
+        self.assertEqual(len(recipes[0]['ingredients']), len(full['changes']['recipe_ingredient']['upserts']))
+        self.assertEqual('Chicken', full['changes']['fridge_ingredient']['upserts'][0]['name'])
+        self.assertEqual(['milk', 'bread'], [i['item'] for i in full['changes']['grocery_list_item']['upserts']])
+
+        # Nothing new
+        self.assertEqual({}, self.sync(full['token'])['changes'])
+
+        ingredient_ids = list(RecipeIngredient.objects.filter(recipe_id=recipe_id).values_list('id', flat=True))
+        self.client.delete(reverse('recipe-view-retrieve-update-destroy', args=[recipe_id]))
+        delta = self.sync(full['token'])
+        self.assertEqual({'recipe', 'recipe_ingredient'}, set(delta['changes']))
+        self.assertEqual([recipe_id], delta['changes']['recipe']['deletes'])
+        self.assertEqual(sorted(ingredient_ids), delta['changes']['recipe_ingredient']['deletes'])
+        self.assertEqual([], delta['changes']['recipe']['upserts'])
+
+    def test_recipe_update_is_logged_once(self):
+        recipe_id = self.client.post(reverse('recipe-view-create-destroy'), recipes[0], format='json').data['id']
+        token = self.sync()['token']
+        self.client.put(reverse('recipe-view-retrieve-update-destroy', args=[recipe_id]), recipes[1], format='json')
+
+        self.assertEqual(1, ChangeLogEntry.objects.filter(model='recipe', object_id=recipe_id, seq__gt=token).count())
+        delta = self.sync(token)
+        self.assertEqual([recipe_id], [r['id'] for r in delta['changes']['recipe']['upserts']])
+        self.assertEqual(len(recipes[1]['ingredients']), len(delta['changes']['recipe_ingredient']['upserts']))
+
+    def test_tokens_are_per_user_sequences(self):
+        other = self.client_class()
+        other.credentials(HTTP_AUTHORIZATION='Bearer ' + self.register_and_authenticate(2))
+        self.client.post(reverse('grocery-list'), {'items': 'milk'})
+        other.post(reverse('grocery-list'), {'items': 'rice\nsalt'})
+        self.client.post(reverse('grocery-list'), {'items': 'bread'})
+
+        # Another user's writes don't take tokens from this one
+        self.assertEqual([1, 2], list(ChangeLogEntry.objects.filter(user__username='testuser1').order_by('seq').values_list('seq', flat=True)))
+        self.assertEqual(2, self.sync()['token'])
+
+    def test_sync_pages_through_the_log(self):
+        self.client.post(reverse('recipe-bulk-create'), {'list': recipes[:3]}, format='json')
+        page_size = SyncView.page_size
+        SyncView.page_size = 2
+        try:
+            first = self.sync()
+            self.assertTrue(first['has_more'])
+            second = self.sync(first['token'])
+        finally:
+            SyncView.page_size = page_size
+        self.assertEqual(2, len(first['changes']['recipe']['upserts']))
+        self.assertEqual(1, len(second['changes']['recipe']['upserts']))
+
+    def test_compaction_keeps_latest_entry_and_expires_old_tokens(self):
+        url = reverse('grocery-list')
+        self.client.post(url, {'items': 'milk\nbread'})
+        token = self.sync()['token']
+        item = self.client.get(url).data[0]
+        item_url = reverse('grocery-list-item-update-delete', args=[item['id']])
+        self.client.patch(item_url, {'isChecked': True})
+        self.client.delete(item_url)
+
+        self.assertEqual((2, 0), compact_change_log())
+        self.assertEqual(2, ChangeLogEntry.objects.count())
+        self.assertEqual([item['id']], self.sync(token)['changes']['grocery_list_item']['deletes'])
+
+        # Dropping the tombstone invalidates tokens from before it
+        compact_change_log(tombstone_ttl=timedelta(0), now=timezone.now() + timedelta(seconds=1))
+        response = self.client.get(self.url, {'since': token})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertEqual(1, len(self.sync()['changes']['grocery_list_item']['upserts']))
+
+    def test_sync_invalid_token(self):
+        response = self.client.get(self.url, {'since': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
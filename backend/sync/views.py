@@ -0,0 +1,29 @@
+from rest_framework.views import APIView
+from rest_framework import status, permissions
+from rest_framework.response import Response
+
+from .changes import horizon_token
+from .feed import changes_since
+
+# GET ?since=<token>: what changed since the client's last sync, 0 or nothing for everything
+class SyncView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    page_size = 500
+
+    def get(self, request):
+        try:
+            since = int(request.query_params.get('since') or 0)
+        except ValueError:
+            since = -1
+        if since < 0:
+            return Response({"error": "since must be a token returned by a previous sync"}, status=status.HTTP_400_BAD_REQUEST)
+
+        horizon = horizon_token(request.user.id)
+        if 0 < since < horizon:
+            # Tombstones the client has not seen were compacted away
+            return Response(
+                {"error": "Token expired, sync again from 0", "token": 0},
+                status=status.HTTP_410_GONE,
+            )
+
+        return Response(changes_since(request.user.id, since, self.page_size))
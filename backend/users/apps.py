@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_save, post_delete
 
 
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from django.contrib.auth import get_user_model
+        from ocipe.authentication import forget_user_state
+        post_save.connect(forget_user_state, sender=get_user_model(), dispatch_uid='forget_user_state_on_save')
+        post_delete.connect(forget_user_state, sender=get_user_model(), dispatch_uid='forget_user_state_on_delete')
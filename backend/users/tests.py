@@ -2,6 +2,10 @@ from rest_framework.test import APITestCase
 from django.urls import reverse
 from django.contrib.auth.models import User
 from rest_framework import status
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken
+from ocipe.tests import AuthenticatedAPITestCase
 
 class UserAuthTests(APITestCase):
     def test_user_registration(self):
@@ -61,3 +65,48 @@ class UserAuthTests(APITestCase):
         refresh_response = self.client.post(refresh_url, refresh_data)
         self.assertEqual(refresh_response.status_code, status.HTTP_200_OK)
         self.assertIn('access', refresh_response.data)
+
+
+class StatelessJWTAuthTests(AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.token = self.register_and_authenticate()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.token)
+        self.url = reverse('grocery-list')
+
+    def test_authenticated_requests_skip_user_lookup(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([query for query in queries if 'auth_user' in query['sql']])
+
+    def test_deactivated_user_is_refused(self):
+        self.client.get(self.url)
+        user = User.objects.get(username=self.username)
+        user.is_active = False
+        user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_revokes_tokens(self):
+        self.client.get(self.url)
+        user = User.objects.get(username=self.username)
+        user.set_password('newpass123')
+        user.save()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = self.client.post(reverse('token_obtain_pair'), {'username': self.username, 'password': 'newpass123'})
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + response.data['access'])
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+    def test_tokens_without_password_digest_are_accepted(self):
+        # Issued before tokens carried the claim
+        user = User.objects.get(username=self.username)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(AccessToken.for_user(user)))
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+    def test_deleted_user_is_refused(self):
+        User.objects.filter(username=self.username).delete()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
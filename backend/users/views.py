@@ -4,6 +4,7 @@ from rest_framework.views import APIView
 from .serializers import UserRegistrationSerializer
 from fridge.models import Fridge
 from grocery.models import GroceryList
+from sync.models import SyncHorizon
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.exceptions import TokenError
 from django.http import HttpResponse
@@ -19,6 +20,8 @@ class UserRegistrationView(APIView):
             # Each user is provided with ONE fridge object and ONE groceryList
             Fridge.objects.create(user=user)
             GroceryList.objects.create(user=user)
+            # Row the user's change log tokens are handed out from
+            SyncHorizon.objects.create(user=user)
             return Response({
               "message": "User registered successfully"
             }, status=status.HTTP_201_CREATED)